@@ -1,13 +1,28 @@
-from typing import Dict, Union, Optional
+import threading
+from collections import OrderedDict
+from itertools import count
+from time import monotonic
+from typing import Dict, Union, Optional, Iterable, Iterator
 from uuid import UUID
 
 import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
 from requests.auth import HTTPBasicAuth
 from yarl import URL
 
+from . import node_health
+from .helpers import cache_helpers
+
 
 class BaseAdapter:
-    """Default handlers for a given node connection. Methods should be overridden for each team, as needed."""
+    """Default handlers for a given node connection. Methods should be overridden for each team, as needed. Every request method accepts an optional `timeout` kwarg (in seconds) that is handed to requests."""
+
+    # Used when the caller doesn't pass a timeout, so that no request to a node can hang until the TCP timeout
+    timeout = 10
+
+    # How many authors are asked for at a time when listing a node's authors
+    authors_page_size = 100
 
     def __init__(self) -> None:
         super().__init__()
@@ -15,44 +30,172 @@ class BaseAdapter:
         self.session = requests.session()
         self.session.headers['Accept'] = 'application/json'
 
+        # Every node gets its own connection pool on the session, the first time it's requested
+        self._mounted = set()
+        self._mount_lock = threading.Lock()
+
+        self.responses = cache_helpers.ResponseCache(max_bytes = settings.NODE_RESPONSE_CACHE_BYTES)
+
+    def _mount(self, node):
+        prefix = URL(node.host).origin().human_repr()
+
+        if prefix in self._mounted:
+            return
+
+        with self._mount_lock:
+            if prefix in self._mounted:
+                return
+
+            # Other threads may be looking up an adapter on the session while this runs, so rather than mounting in place, the adapters are swapped for a new dict. Longest prefixes first, same as Session.mount.
+            adapters = OrderedDict(self.session.adapters)
+            adapters[prefix] = HTTPAdapter(pool_connections = 1, pool_maxsize = settings.NODE_POOL_MAXSIZE)
+
+            self.session.adapters = OrderedDict(sorted(adapters.items(), key = lambda item: len(item[0]), reverse = True))
+            self._mounted.add(prefix)
+
+    def request(self, node, method: str, url: str, **kwargs) -> requests.Response:
+        """
+        Makes a request to the node through the session, keeping track of the node's health. Fails fast with a CircuitOpenError when the node's circuit is open. Connection errors, timeouts and 5xx responses count against the node.
+
+        GETs go through the response cache: a fresh response is returned without asking the node, and a stale one is revalidated and returned if the node answers 304 Not Modified.
+        """
+
+        cached = None
+
+        if method == 'GET':
+            cache_key = requests.Request(method, url, params = kwargs.get('params')).prepare().url
+            cached = self.responses.get(cache_key)
+
+            if cached is not None:
+                if cached.fresh:
+                    return cached.response
+
+                kwargs['headers'] = { **(kwargs.get('headers') or {}), **cached.validators }
+
+        health = node_health.health_of(node)
+
+        if not health.allow_request():
+            raise node_health.CircuitOpenError(f'Circuit for node {node.host} is {health}, not sending {method} {url}')
+
+        start = monotonic()
+
+        # Anything at all that goes wrong from here counts as a failure, not just a RequestException, or a half-open circuit would be left waiting on its trial for good
+        try:
+            kwargs.setdefault('auth', HTTPBasicAuth(node.node_username, node.node_password))
+
+            if kwargs.get('timeout') is None:
+                kwargs['timeout'] = self.timeout
+
+            self._mount(node)
+
+            response = self.session.request(method, url, **kwargs)
+        except Exception:
+            health.record_failure(monotonic() - start)
+            raise
+
+        if response.status_code >= 500:
+            health.record_failure(monotonic() - start)
+        else:
+            health.record_success(monotonic() - start)
+
+        if method == 'GET':
+            if response.status_code == 304 and cached is not None:
+                self.responses.revalidated(cache_key, response)
+                return cached.response
+
+            self.responses.set(cache_key, response)
+
+        return response
+
     def post_inbox_item(self, request, *args, **kwargs):
         return request
 
     def send_to_inbox(self, node, author_uuid: Union[str, UUID], post_json: Dict, *args, **kwargs) -> requests.Response:
-        return self.session.post(
-            self.get_inbox_url(node, author_uuid),
-            auth = HTTPBasicAuth(node.node_username, node.node_password),
-            json = post_json
+        return self.request(
+            node, 'POST', self.get_inbox_url(node, author_uuid),
+            json = post_json,
+            timeout = kwargs.get('timeout')
         )
 
     def get_author(self, node, author_uuid: Union[str, UUID], *args, **kwargs) -> requests.Response:
-        return self.session.get(
-            self.get_author_url(node, author_uuid),
-            auth = HTTPBasicAuth(node.node_username, node.node_password)
+        return self.request(
+            node, 'GET', self.get_author_url(node, author_uuid),
+            timeout = kwargs.get('timeout')
         )
 
-    def get_authors(self, node, *args, **kwargs) -> requests.Response:
-        return self.session.get(
-            self.get_authors_url(node),
-            params = { 'size': 1000 },
+    def get_authors(self, node, *args, page: int = 1, size: Optional[int] = None, **kwargs) -> requests.Response:
+        return self.request(
+            node, 'GET', self.get_authors_url(node),
+            params = { 'page': page, 'size': size or self.authors_page_size },
             headers = { 'Accept': 'application/json' },
-            auth = HTTPBasicAuth(node.node_username, node.node_password)
+            timeout = kwargs.get('timeout')
         )
 
+    def iter_authors(self, node, *args, **kwargs) -> Iterator[Dict]:
+        """
+        Lazily yields every one of the node's authors, shaped, fetching and parsing a page at a time as they're consumed. Only one page is ever in memory.
+
+        Stops past the last page: a 404 after the first, or an empty page. A page that isn't full doesn't end it, since some nodes cap the page size below what we ask for. Others ignore paging altogether, so it also stops when a page comes back the same as the one before.
+
+        Any other error raises (requests.HTTPError for a bad status), so callers can tell a listing that ended from one that broke off.
+        """
+
+        previous_first_id = None
+
+        for page in count(1):
+            response = self.get_authors(node, page = page, timeout = kwargs.get('timeout'))
+
+            if response.status_code == 404 and page > 1:
+                return
+
+            response.raise_for_status()
+
+            items = response.json().get('items') or []
+
+            if not items:
+                return
+
+            first_id = items[0].get('id')
+
+            if page > 1 and first_id == previous_first_id:
+                return
+
+            yield from self.shape_author_items(node, items)
+
+            previous_first_id = first_id
+
+    # Shaping turns a response that has already been fetched into our format. It never makes requests of its own; teams override the shape_*_json transforms, not these.
+
     def shape_author(self, node, author_uuid: Union[str, UUID], response: requests.Response, *args, **kwargs) -> Optional[Dict]:
 
         if response.ok:
-            return response.json()
+            return self.shape_author_json(node, response.json())
         else:
             return None
 
     def shape_authors(self, node, response: requests.Response, *args, **kwargs) -> Optional[Dict]:
 
         if response.ok:
-            return response.json()
+            authors_json = response.json()
+            authors_json['items'] = list(self.shape_author_items(node, authors_json.get('items', [])))
+
+            return authors_json
         else:
             return None
 
+    def shape_author_json(self, node, author_json: Dict) -> Optional[Dict]:
+        """Shapes one of the node's authors into our format, or None if it isn't a valid author of the node"""
+        return author_json
+
+    def shape_author_items(self, node, items: Iterable[Dict]) -> Iterator[Dict]:
+        """Lazily shapes each of the node's authors, leaving out the invalid ones"""
+
+        for author_json in items:
+            shaped_json = self.shape_author_json(node, author_json)
+
+            if shaped_json:
+                yield shaped_json
+
     def get_author_url(self, node, author_uuid: Union[str, UUID], *args, **kwargs) -> str:
         if isinstance(author_uuid, UUID):
             author_uuid = str(author_uuid)
@@ -66,9 +209,9 @@ class BaseAdapter:
         if isinstance(author_uuid, UUID):
             author_uuid = str(author_uuid)
 
-        return self.session.get(
-            self.get_followers_url(node, author_uuid),
-            auth = HTTPBasicAuth(node.node_username, node.node_password)
+        return self.request(
+            node, 'GET', self.get_followers_url(node, author_uuid),
+            timeout = kwargs.get('timeout')
         )
 
     def get_followers_url(self, node, author_uuid: Union[str, UUID], *args, **kwargs) -> str:
@@ -78,10 +221,10 @@ class BaseAdapter:
         return (URL(node.host) / node.prefix / 'author' / author_uuid / 'followers' / '').human_repr()
 
     def send_friend_request(self, node, author_uuid: Union[str, UUID], follower_json: Dict, *args, **kwargs):
-        return self.session.post(
-            self.get_inbox_url(node, author_uuid),
-            auth = HTTPBasicAuth(node.node_username, node.node_password),
-            json = follower_json
+        return self.request(
+            node, 'POST', self.get_inbox_url(node, author_uuid),
+            json = follower_json,
+            timeout = kwargs.get('timeout')
         )
 
     def get_inbox_url(self, node, author_uuid: Union[str, UUID], *args, **kwargs):
@@ -91,9 +234,9 @@ class BaseAdapter:
         return (URL(node.host) / node.prefix / 'author' / author_uuid / 'inbox' / '').human_repr()
 
     def remove_follower(self, node, author_uuid: Union[str, UUID], user_uuid: Union[str, UUID], *args, **kwargs):
-        return self.session.delete(
-            self.get_follower_url(node, author_uuid, user_uuid),
-            auth = HTTPBasicAuth(node.node_username, node.node_password)
+        return self.request(
+            node, 'DELETE', self.get_follower_url(node, author_uuid, user_uuid),
+            timeout = kwargs.get('timeout')
         )
 
     def get_follower_url(self, node, author_uuid: Union[str, UUID], user_uuid: Union[str, UUID], *args, **kwargs) -> str:
@@ -105,14 +248,37 @@ class BaseAdapter:
 
         return (URL(node.host) / node.prefix / 'author' / author_uuid / 'follower' / user_uuid / '').human_repr()
 
+    def check_post(self, node, url: str, *args, **kwargs) -> requests.Response:
+        """A HEAD of the post, to see whether it still exists"""
+        return self.request(
+            node, 'HEAD', url,
+            timeout = kwargs.get('timeout')
+        )
+
+    def get_post(self, node, url: str, *args, **kwargs) -> requests.Response:
+        return self.request(
+            node, 'GET', url,
+            headers = { 'Accept': 'application/json' },
+            timeout = kwargs.get('timeout')
+        )
+
+    def get_comments(self, node, url: str, *args, size: int = 100, **kwargs) -> requests.Response:
+        """The first `size` comments at the post's comments URL"""
+        return self.request(
+            node, 'GET', url,
+            params = { 'size': size },
+            headers = { 'Accept': 'application/json' },
+            timeout = kwargs.get('timeout')
+        )
+
     def get_posts(self, node, author_uuid: Union[str, UUID], *args, **kwargs):
         if isinstance(author_uuid, UUID):
             author_uuid = str(author_uuid)
 
-        return requests.get(
-            self.get_posts_url(node, author_uuid, include_slash = True),
+        return self.request(
+            node, 'GET', self.get_posts_url(node, author_uuid, include_slash = True),
             headers = { 'Accept': 'application/json' },
-            auth = HTTPBasicAuth(node.node_username, node.node_password)  # Shouldn't need but in case
+            timeout = kwargs.get('timeout')
         )
 
     def get_posts_url(self, node, author_uuid: Union[str, UUID], *args, **kwargs):
@@ -163,30 +329,12 @@ class Team4Adapter(BaseAdapter):
 
 class Team7Adapter(BaseAdapter):
 
-    def shape_author(self, node, author_uuid: Union[str, UUID], *args, **kwargs) -> Optional[Dict]:
-        response = super().get_author(node, author_uuid, *args, **kwargs)
-
-        if response.ok:
-            if node.host in response.json()['id']:
-                return response.json()
-            else:
-                return None
-
-    def shape_authors(self, node, *args, **kwargs) -> Optional[Dict]:
-        response = super().get_authors(node, *args, **kwargs)
-
-        if response.ok:
-            output_json = response.json()
-
-            new_items = list()
-
-            for item in output_json['items']:
-                if node.host in item['id']:
-                    new_items.append(item)
-
-            output_json['items'] = new_items
-
-            return output_json
+    def shape_author_json(self, node, author_json: Dict) -> Optional[Dict]:
+        # Team 7 lists authors from other nodes too
+        if node.host in author_json.get('id', ''):
+            return author_json
+        else:
+            return None
 
 
 # A global list of adapters that are tied to nodes via the database.
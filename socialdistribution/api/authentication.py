@@ -1,7 +1,10 @@
+import hmac
+
 from django.utils.translation import gettext_lazy as _
 from rest_framework import authentication
 from rest_framework import exceptions
 
+from api.helpers import cache_helpers
 from bettersocial.models import Node
 
 
@@ -10,11 +13,24 @@ class NodeAuthentication(authentication.BasicAuthentication):
 
     def authenticate_credentials(self, userid, password, request = None):
 
-        node = Node.objects.filter(auth_username = userid, auth_password = password).first()
+        # Nodes authenticate on nearly every federated request, so they're looked up by username once and then served from memory
+        credentials = cache_helpers.get_node_credentials(userid)
+
+        if credentials is None:
+            credentials = [(cache_helpers.credential_digest(node.auth_username, node.auth_password), node) for node in Node.objects.filter(auth_username = userid)]
+
+            # Unknown usernames aren't cached, so nobody can fill the cache up with made-up ones
+            if credentials:
+                cache_helpers.cache_node_credentials(userid, credentials)
+
+        digest = cache_helpers.credential_digest(userid, password)
+
+        # Compare against every one in constant time, so how long this takes gives nothing away about the password
+        matches = [node for node_digest, node in credentials if hmac.compare_digest(node_digest, digest)]
 
-        if node is None:
+        if not matches:
             raise exceptions.AuthenticationFailed(_('Invalid username/password.'))
 
         # I know we should really be returning a more complete User-like object here, but since this is used only really for DRF, it doesn't really matter. This middleware will not be active for the regular app.
         # A benefit of this approach (albeit a less than ideal one) is that any view can test the type of `request.user` to see if a node or regular user has logged in, enabling different behaviour for each type.
-        return node, None
+        return matches[0], None
@@ -0,0 +1,122 @@
+import hashlib
+import json
+from datetime import datetime
+from typing import Optional, NamedTuple
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import Count, Max
+from django.utils.http import http_date, parse_etags, parse_http_date_safe, quote_etag
+from rest_framework.exceptions import APIException
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+
+
+class Validator(NamedTuple):
+    # Anything that changes whenever the response body would, like a row's version
+    version: str
+    last_modified: Optional[datetime] = None
+
+
+class NotModified(APIException):
+    status_code = 304
+
+
+def validator_of_row(queryset) -> Optional[Validator]:
+    """The validator of the one row in `queryset`, from its version and modified fields, or None when there's no such row (the view will 404 on its own)"""
+
+    try:
+        row = queryset.values_list('version', 'modified').first()
+    except (ValueError, DjangoValidationError):
+        # A pk that doesn't fit the model's primary key
+        return None
+
+    return Validator(str(row[0]), row[1]) if row else None
+
+
+def validator_of_rows(queryset) -> Validator:
+    """
+    The validator of every row in `queryset`. Edits move the newest modified time along, and deletes change the count.
+
+    ETag only: a row leaving the list (deleted, or no longer visible) doesn't move the newest modified time, so it can't be a Last-Modified.
+    """
+
+    rows = queryset.aggregate(count = Count('pk'), modified = Max('modified'))
+
+    return Validator(f'{rows["count"]}:{rows["modified"] and rows["modified"].isoformat()}')
+
+
+def _opaque(etag: str) -> str:
+    return etag[2:] if etag.startswith('W/') else etag
+
+
+class ConditionalGetMixin:
+    """
+    Conditional GET for viewsets: every successful GET gets a weak ETag, and a request whose If-None-Match (or If-Modified-Since) still matches gets an empty 304 instead.
+
+    Views that can tell cheaply whether anything changed override `get_validator`, which is checked before the view does any work. For the rest, the ETag is a hash of the body, which still saves the bandwidth, if not the work.
+    """
+
+    conditional_actions = ('list', 'retrieve')
+
+    validator: Optional[Validator] = None
+
+    def get_validator(self, request) -> Optional[Validator]:
+        return None
+
+    def _is_conditional(self, request) -> bool:
+        return request.method in ('GET', 'HEAD') and getattr(self, 'action', None) in self.conditional_actions
+
+    def _etag(self, request, version: str) -> str:
+        # The same rows give a different body per page, per host (every link has it) and per format
+        source = f'{request.build_absolute_uri()}|{request.accepted_renderer.format}|{version}'
+
+        return 'W/' + quote_etag(hashlib.sha1(source.encode()).hexdigest())
+
+    def _not_modified(self, request, etag: str, last_modified: Optional[datetime]) -> bool:
+        if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+
+        # ETags are weak, so they're compared weakly, i.e. without the W/
+        if if_none_match:
+            return '*' in if_none_match or _opaque(etag) in [_opaque(tag) for tag in parse_etags(if_none_match)]
+
+        if_modified_since = parse_http_date_safe(request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+
+        return last_modified is not None and if_modified_since is not None and int(last_modified.timestamp()) <= if_modified_since
+
+    def _set_headers(self, response, etag: str, last_modified: Optional[datetime]):
+        response['ETag'] = etag
+
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified.timestamp())
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+
+        if self._is_conditional(request):
+            self.validator = self.get_validator(request)
+
+            if self.validator is not None and self._not_modified(request, self._etag(request, self.validator.version), self.validator.last_modified):
+                raise NotModified()
+
+    def handle_exception(self, exc):
+        if isinstance(exc, NotModified):
+            response = Response(status = NotModified.status_code)
+            self._set_headers(response, self._etag(self.request, self.validator.version), self.validator.last_modified)
+
+            return response
+
+        return super().handle_exception(exc)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        if self._is_conditional(request) and response.status_code == 200 and isinstance(response, Response):
+            if self.validator is not None:
+                etag, last_modified = self._etag(request, self.validator.version), self.validator.last_modified
+            else:
+                etag, last_modified = self._etag(request, hashlib.sha1(json.dumps(response.data, cls = JSONEncoder).encode()).hexdigest()), None
+
+                if self._not_modified(request, etag, None):
+                    response = Response(status = NotModified.status_code)
+
+            self._set_headers(response, etag, last_modified)
+
+        return super().finalize_response(request, response, *args, **kwargs)
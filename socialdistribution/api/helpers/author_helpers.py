@@ -1,70 +1,63 @@
-from typing import Set, List
+from typing import Set, List, Tuple
 from uuid import UUID
 
+from django.db.models import Exists, OuterRef
 from rest_framework.request import Request
 
 from api import serializers
-from bettersocial.models import Author
+from bettersocial.models import Author, Follower
 from . import remote_helpers
 
 
-def get_author_friends(request: Request, author: Author) -> List:
-    """Get all the author's friends, including remote ones"""
+def _resolve_friends(author: Author) -> Tuple[List[Author], Set[UUID]]:
+    """Resolves the author's friends as local Author objects (with their users loaded) and the UUIDs of remote friends. Local friends take two queries no matter how many there are."""
 
-    following = { f.following_uuid for f in author.following_set.all() }
-    followers = { f.follower_uuid for f in author.follower_set.all() }
+    # APPROVED followers that you've also followed
+    uuid_set: Set[UUID] = set(author.friendship_set.values_list('friend_uuid', flat = True))
 
-    # Set intersection of APPROVED followers and people you've followed
-    uuid_set: Set[UUID] = followers & following
+    if not uuid_set:
+        return list(), set()
 
-    # This will hold local and remote author objects, as JSON
-    friends = list()
+    # IFF the author we're trying to verify friendship with has APPROVED our request (meaning there would be an entry in local_author FOLLOWERS), they're a friend. Any UUID that doesn't come back must be remote.
+    local_authors = Author.objects.filter(uuid__in = uuid_set).annotate(
+        approved = Exists(Follower.objects.filter(author = OuterRef('pk'), follower_uuid = author.uuid))
+    ).select_related('user')
 
-    for uuid_item in uuid_set:
-        try:
-            local_author: Author = Author.objects.filter(uuid = uuid_item).get()
+    local_friends = list()
+    local_uuids = set()
 
-            # IFF the author we're trying to verify friendship with has APPROVED our request (meaning there would be an entry in local_author FOLLOWERS), proceed.
-            if local_author.follower_set.filter(follower_uuid = author.uuid):
-                friends.append(serializers.AuthorSerializer(local_author, context = { 'request': request }).data)
+    for local_author in local_authors:
+        local_uuids.add(local_author.uuid)
 
-        except Author.DoesNotExist:
-            # If the author does not exist locally, find it remotely
-            remote_author_json = remote_helpers.find_remote_author(uuid_item)
+        if local_author.approved:
+            local_friends.append(local_author)
 
-            # If found AND the remote author has approved our follow, add, if not, ignore
-            if remote_author_json and remote_helpers.approved_follow(uuid_item, author.uuid):
-                friends.append(remote_author_json)
+    # Only keep remote authors who have approved our follow
+    remote_friends = remote_helpers.approved_follows(uuid_set - local_uuids, author.uuid)
 
-    return friends
+    return local_friends, remote_friends
 
 
-def get_author_friends_as_uuid(author: Author) -> List[UUID]:
-    """Get all the author's friends, including remote ones, as UUIDs (i.e. does not need request)"""
+def get_author_friends(request: Request, author: Author) -> List:
+    """Get all the author's friends, including remote ones"""
 
-    following = { f.following_uuid for f in author.following_set.all() }
-    followers = { f.follower_uuid for f in author.follower_set.all() }
+    local_friends, remote_friends = _resolve_friends(author)
 
-    # Set intersection of APPROVED followers and people you've followed
-    uuid_set: Set[UUID] = followers & following
+    # This will hold local and remote author objects, as JSON
+    friends = list(serializers.AuthorSerializer(local_friends, many = True, context = { 'request': request }).data)
 
-    # This will hold local and remote author objects, as uuids
-    friends = list()
+    for uuid_item in remote_friends:
+        remote_author_json = remote_helpers.find_remote_author(uuid_item)
 
-    for uuid_item in uuid_set:
-        try:
-            local_author: Author = Author.objects.filter(uuid = uuid_item).get()
+        if remote_author_json:
+            friends.append(remote_author_json)
 
-            # IFF the author we're trying to verify friendship with has APPROVED our request (meaning there would be an entry in local_author FOLLOWERS), proceed.
-            if local_author.follower_set.filter(follower_uuid = author.uuid):
-                friends.append(uuid_item)
+    return friends
 
-        except Author.DoesNotExist:
-            # If the author does not exist locally, find it remotely
-            remote_author_json = remote_helpers.find_remote_author(uuid_item)
 
-            # If found AND the remote author has approved our follow, add, if not, ignore
-            if remote_author_json and remote_helpers.approved_follow(uuid_item, author.uuid):
-                friends.append(remote_author_json)
+def get_author_friends_as_uuid(author: Author) -> List[UUID]:
+    """Get all the author's friends, including remote ones, as UUIDs (i.e. does not need request)"""
 
-    return friends
+    local_friends, remote_friends = _resolve_friends(author)
+
+    return [local_author.uuid for local_author in local_friends] + list(remote_friends)
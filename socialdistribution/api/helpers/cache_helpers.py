@@ -0,0 +1,428 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from copy import copy
+from sys import stderr
+from time import time
+from typing import Optional, Union, Dict, Callable, NamedTuple, Iterable, Tuple, List
+from uuid import UUID
+
+import requests
+from django.conf import settings
+from django.core.cache import caches
+
+
+# -- Remote authors -- #
+
+class CachedAuthor(NamedTuple):
+    author_json: Dict
+    stale: bool
+
+
+# Background refreshes of stale authors. Only ever does HTTP, never touches the database.
+_revalidate_executor = ThreadPoolExecutor(max_workers = 4, thread_name_prefix = 'author-revalidate')
+
+# UUIDs currently being refreshed, so that a popular stale author is only refreshed once at a time
+_revalidating = set()
+_revalidating_lock = threading.Lock()
+
+
+def _remote_author_key(author_uuid: UUID) -> str:
+    return f'remote-author:{author_uuid.hex}'
+
+
+def get_remote_author(author_uuid: Union[str, UUID]) -> Optional[CachedAuthor]:
+    """Gets the shaped JSON of a remote author from the cache, if it's there. It is flagged as stale once it's older than REMOTE_AUTHOR_CACHE_TTL, in which case it's still usable but should be revalidated."""
+    if isinstance(author_uuid, str):
+        author_uuid = UUID(author_uuid)
+
+    entry = caches['remote_authors'].get(_remote_author_key(author_uuid))
+
+    if entry is None:
+        return None
+
+    fetched_at, author_json = entry
+
+    return CachedAuthor(author_json, time() - fetched_at > settings.REMOTE_AUTHOR_CACHE_TTL)
+
+
+def cache_remote_author(author_uuid: Union[str, UUID], author_json: Dict):
+    if isinstance(author_uuid, str):
+        author_uuid = UUID(author_uuid)
+
+    caches['remote_authors'].set(_remote_author_key(author_uuid), (time(), author_json))
+
+
+def invalidate_remote_author(author_uuid: Union[str, UUID]):
+    if isinstance(author_uuid, str):
+        author_uuid = UUID(author_uuid)
+
+    caches['remote_authors'].delete(_remote_author_key(author_uuid))
+
+
+def revalidate_remote_author(author_uuid: Union[str, UUID], fetch: Callable[[], Optional[Dict]]):
+    """Refreshes the cached author in the background with `fetch`, which must not touch the database. If `fetch` comes back empty, the author is dropped from the cache; if it errors, the stale copy is kept."""
+    if isinstance(author_uuid, str):
+        author_uuid = UUID(author_uuid)
+
+    with _revalidating_lock:
+        if author_uuid in _revalidating:
+            return
+
+        _revalidating.add(author_uuid)
+
+    def revalidate():
+        try:
+            author_json = fetch()
+
+            if author_json:
+                cache_remote_author(author_uuid, author_json)
+            else:
+                invalidate_remote_author(author_uuid)
+
+        except (requests.RequestException, ValueError) as e:
+            print(f'Could not revalidate remote author {author_uuid}: {e}', file = stderr)
+
+        finally:
+            with _revalidating_lock:
+                _revalidating.discard(author_uuid)
+
+    _revalidate_executor.submit(revalidate)
+
+
+# -- Follow approvals -- #
+
+def _follow_approval_key(remote_uuid: UUID, author_uuid: UUID) -> str:
+    return f'follow-approval:{remote_uuid.hex}:{author_uuid.hex}'
+
+
+def get_follow_approvals(remote_uuids: Iterable[UUID], author_uuid: UUID) -> Dict[UUID, bool]:
+    """Gets the memoized answers to "has this remote author approved `author_uuid`'s follow?". Authors without a memoized answer are left out."""
+
+    keys = { _follow_approval_key(remote_uuid, author_uuid): remote_uuid for remote_uuid in remote_uuids }
+
+    return { keys[key]: approved for key, approved in caches['default'].get_many(keys.keys()).items() }
+
+
+def cache_follow_approvals(approvals: Dict[UUID, bool], author_uuid: UUID):
+    caches['default'].set_many(
+        { _follow_approval_key(remote_uuid, author_uuid): approved for remote_uuid, approved in approvals.items() },
+        timeout = settings.FOLLOW_APPROVAL_CACHE_TTL
+    )
+
+
+def invalidate_follow_approval(remote_uuid: Union[str, UUID], author_uuid: Union[str, UUID]):
+    caches['default'].delete(_follow_approval_key(UUID(str(remote_uuid)), UUID(str(author_uuid))))
+
+
+# -- Remote post liveness -- #
+
+def _post_liveness_key(url: str) -> str:
+    return f'post-alive:{hashlib.sha1(url.encode()).hexdigest()}'
+
+
+def get_post_liveness(urls: Iterable[str]) -> Dict[str, bool]:
+    """Gets the memoized answers to "is this remote post still there?". Posts without a memoized answer are left out."""
+
+    keys = { _post_liveness_key(url): url for url in urls }
+
+    return { keys[key]: alive for key, alive in caches['default'].get_many(keys.keys()).items() }
+
+
+def cache_post_liveness(liveness: Dict[str, bool]):
+    caches['default'].set_many({ _post_liveness_key(url): alive for url, alive in liveness.items() }, timeout = settings.POST_LIVENESS_CACHE_TTL)
+
+
+# -- Remote posts -- #
+
+def _remote_post_key(post_uuid: UUID) -> str:
+    return f'remote-post:{post_uuid.hex}'
+
+
+def get_remote_post(post_uuid: Union[str, UUID]) -> Optional[Tuple[Dict, List[Dict]]]:
+    """Gets the (post JSON, comments JSON) of a remote post, if it was fetched in the last REMOTE_POST_CACHE_TTL seconds"""
+    return caches['default'].get(_remote_post_key(UUID(str(post_uuid))))
+
+
+def cache_remote_post(post_uuid: Union[str, UUID], post_json: Dict, comments: List[Dict]):
+    caches['default'].set(_remote_post_key(UUID(str(post_uuid))), (post_json, comments), timeout = settings.REMOTE_POST_CACHE_TTL)
+
+
+# -- Serialized posts -- #
+
+def _post_json_key(post_uuid: UUID, version: int) -> str:
+    return f'post-json:{post_uuid.hex}:{version}'
+
+
+# The only fields that hold links to this server. Everything else, like the title and content, is the author's own text and is left alone, even if it's a link here.
+_POST_LINKS = ('id', 'url', 'host', 'source', 'origin', 'comments')
+_AUTHOR_LINKS = ('id', 'url', 'host', 'github', 'posts')
+_COMMENTS_LINKS = ('id', 'post')
+_COMMENT_LINKS = ('id',)
+
+
+def _rehost_link(value, old_origin: str, new_origin: str):
+    return new_origin + value[len(old_origin):] if isinstance(value, str) and value.startswith(old_origin + '/') else value
+
+
+def _rehost_fields(json: Dict, fields: Tuple[str, ...], old_origin: str, new_origin: str) -> Dict:
+    json = OrderedDict(json)
+
+    for field in fields:
+        if field in json:
+            json[field] = _rehost_link(json[field], old_origin, new_origin)
+
+    if isinstance(json.get('author'), dict):
+        json['author'] = _rehost_fields(json['author'], _AUTHOR_LINKS, old_origin, new_origin)
+
+    return json
+
+
+def _rehost(post_json: Dict, old_origin: str, new_origin: str) -> Dict:
+    """Points every link field of the post JSON that starts with old_origin at new_origin instead"""
+
+    post_json = _rehost_fields(post_json, _POST_LINKS, old_origin, new_origin)
+
+    if isinstance(post_json.get('commentsSrc'), dict):
+        comments = post_json['commentsSrc'] = _rehost_fields(post_json['commentsSrc'], _COMMENTS_LINKS, old_origin, new_origin)
+        comments['comments'] = [_rehost_fields(comment, _COMMENT_LINKS, old_origin, new_origin) for comment in comments.get('comments') or []]
+
+    return post_json
+
+
+def get_post_jsons(posts: Iterable, origin: str) -> Dict[UUID, Dict]:
+    """
+    Gets the cached JSON of each post at its current version, by post uuid. Posts that aren't cached are left out.
+
+    The only part of the JSON that depends on the request is the scheme and host (`origin`) its links start with, so a copy cached for one origin is patched for another rather than serialized again.
+    """
+
+    keys = { _post_json_key(post.pk, post.version): post.pk for post in posts }
+
+    post_jsons = dict()
+
+    for key, (cached_origin, post_json) in caches['serialized_posts'].get_many(keys.keys()).items():
+        post_jsons[keys[key]] = post_json if cached_origin == origin else _rehost(post_json, cached_origin, origin)
+
+    return post_jsons
+
+
+def cache_post_jsons(post_jsons: Iterable[Tuple], origin: str):
+    """Caches each (post, JSON) under the post's current version. Nothing needs invalidating on edits, since they bump the version."""
+
+    caches['serialized_posts'].set_many({ _post_json_key(post.pk, post.version): (origin, post_json) for post, post_json in post_jsons })
+
+
+def invalidate_post_json(post_uuid: UUID, version: int):
+    caches['serialized_posts'].delete(_post_json_key(post_uuid, version))
+
+
+# -- Node credentials -- #
+
+# Kept in process rather than in a Django cache, since the nodes themselves are cached. auth_username -> (cached at, [(credential digest, node)])
+_node_credentials: Dict[str, Tuple[float, List[Tuple[bytes, object]]]] = dict()
+_node_credentials_lock = threading.Lock()
+
+
+def credential_digest(username: str, password: str) -> bytes:
+    """The SHA-256 of a username and password, which is what gets compared instead of the plaintext"""
+    return hashlib.sha256(f'{len(username)}:{username}:{password}'.encode()).digest()
+
+
+def get_node_credentials(username: str) -> Optional[List[Tuple[bytes, object]]]:
+    """Gets the (credential digest, node) of every node with this auth_username, if they're cached and younger than NODE_AUTH_CACHE_TTL"""
+
+    with _node_credentials_lock:
+        entry = _node_credentials.get(username)
+
+    if entry is None or time() - entry[0] > settings.NODE_AUTH_CACHE_TTL:
+        return None
+
+    return entry[1]
+
+
+def cache_node_credentials(username: str, credentials: List[Tuple[bytes, object]]):
+    with _node_credentials_lock:
+        _node_credentials[username] = (time(), credentials)
+
+
+def invalidate_node_credentials():
+    """Drops every cached node. Nodes are hardly ever changed, and a change may move a node from one username to another, so it's simplest to drop them all."""
+
+    with _node_credentials_lock:
+        _node_credentials.clear()
+
+
+# -- Where remote objects live -- #
+
+# A read-through memo of UUIDRemoteCache, uuid -> (memoized at, node id), least recently used first. Node ids rather than nodes, since the nodes come from the node registry. Other processes (the sync worker, other web workers) rewrite rows without this process hearing of it, so answers are only trusted for UUID_NODE_MEMO_TTL seconds.
+_node_ids: Dict[UUID, Tuple[float, int]] = OrderedDict()
+_node_ids_lock = threading.Lock()
+_node_id_stats = { 'hits': 0, 'misses': 0 }
+
+
+def get_memoized_node_ids(uuids: Iterable[UUID]) -> Dict[UUID, int]:
+    """Gets the node id of each uuid that's memoized and younger than UUID_NODE_MEMO_TTL, leaving out the rest, and counts the hits and misses"""
+
+    found = dict()
+    now = time()
+
+    with _node_ids_lock:
+        for uuid in uuids:
+            entry = _node_ids.get(uuid)
+
+            if entry is not None and now - entry[0] > settings.UUID_NODE_MEMO_TTL:
+                del _node_ids[uuid]
+                entry = None
+
+            if entry is None:
+                _node_id_stats['misses'] += 1
+                continue
+
+            _node_ids.move_to_end(uuid)
+            _node_id_stats['hits'] += 1
+            found[uuid] = entry[1]
+
+    return found
+
+
+def memoize_node_ids(node_ids: Dict[UUID, int]):
+    now = time()
+
+    with _node_ids_lock:
+        for uuid, node_id in node_ids.items():
+            _node_ids[uuid] = (now, node_id)
+            _node_ids.move_to_end(uuid)
+
+        while len(_node_ids) > settings.UUID_NODE_MEMO_SIZE:
+            _node_ids.popitem(last = False)
+
+
+def invalidate_node_ids():
+    """Forgets every memoized node id, but keeps counting"""
+
+    with _node_ids_lock:
+        _node_ids.clear()
+
+
+def node_id_memo_stats() -> Dict[str, float]:
+    """How well the memo is doing, to size UUID_NODE_MEMO_SIZE by: hits, misses, their ratio, and how full it is"""
+
+    with _node_ids_lock:
+        hits, misses, size = _node_id_stats['hits'], _node_id_stats['misses'], len(_node_ids)
+
+    return { 'hits': hits, 'misses': misses, 'hit_ratio': hits / (hits + misses) if hits + misses else 0.0, 'size': size, 'max_size': settings.UUID_NODE_MEMO_SIZE }
+
+
+# -- Responses from other nodes -- #
+
+class CachedResponse(NamedTuple):
+    response: requests.Response
+    # Fresh responses can be used without asking the node at all. Stale ones have to be revalidated first, with `validators`.
+    fresh: bool
+    validators: Dict[str, str]
+
+
+def _max_age(response: requests.Response) -> Optional[int]:
+    """How many seconds the response's Cache-Control says it can be used without revalidating, 0 when it always has to be, or None when it must not be kept at all"""
+
+    directives = dict()
+
+    for directive in response.headers.get('Cache-Control', '').split(','):
+        name, _, value = directive.strip().partition('=')
+        directives[name.lower()] = value.strip('"')
+
+    if 'no-store' in directives:
+        return None
+
+    if 'no-cache' in directives:
+        return 0
+
+    try:
+        return max(int(directives.get('max-age', 0)), 0)
+    except ValueError:
+        return 0
+
+
+class ResponseCache:
+    """
+    The last response to each GET URL, honouring its Cache-Control, so that it can be reused while it's fresh and revalidated with its ETag or Last-Modified once it's stale. Responses that can be neither are not kept.
+
+    Thread-safe. Bounded by the total size of the kept bodies: the least recently used URLs are dropped past `max_bytes`.
+    """
+
+    def __init__(self, max_bytes: int = 32 * 1024 * 1024) -> None:
+        super().__init__()
+
+        self.max_bytes = max_bytes
+        self.size = 0
+
+        # url -> (response, stored at, max age, size)
+        self._responses: Dict[str, Tuple[requests.Response, float, int, int]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, url: str) -> Optional[CachedResponse]:
+        with self._lock:
+            entry = self._responses.get(url)
+
+            if entry is None:
+                return None
+
+            self._responses.move_to_end(url)
+
+        response, stored_at, max_age, _ = entry
+
+        validators = dict()
+
+        if 'ETag' in response.headers:
+            validators['If-None-Match'] = response.headers['ETag']
+
+        if 'Last-Modified' in response.headers:
+            validators['If-Modified-Since'] = response.headers['Last-Modified']
+
+        # Callers get their own copy, though the body is shared
+        return CachedResponse(copy(response), time() - stored_at < max_age, validators)
+
+    def set(self, url: str, response: requests.Response):
+        """Keeps the response if it can ever be reused, and otherwise forgets the URL"""
+
+        max_age = _max_age(response)
+        size = len(response.content) + sum(len(name) + len(value) for name, value in response.headers.items())
+
+        if not response.ok or max_age is None or size > self.max_bytes or not (max_age or 'ETag' in response.headers or 'Last-Modified' in response.headers):
+            self.delete(url)
+            return
+
+        with self._lock:
+            self._pop(url)
+
+            self._responses[url] = (response, time(), max_age, size)
+            self.size += size
+
+            while self.size > self.max_bytes:
+                self._pop(next(iter(self._responses)))
+
+    def revalidated(self, url: str, not_modified: requests.Response):
+        """The node said the kept response is still good (304), so it's fresh again, for as long as the 304 says"""
+
+        with self._lock:
+            entry = self._responses.get(url)
+
+            if entry is not None:
+                response, _, max_age, size = entry
+
+                if 'Cache-Control' in not_modified.headers:
+                    max_age = _max_age(not_modified) or 0
+
+                self._responses[url] = (response, time(), max_age, size)
+
+    def delete(self, url: str):
+        with self._lock:
+            self._pop(url)
+
+    def _pop(self, url: str):
+        entry = self._responses.pop(url, None)
+
+        if entry is not None:
+            self.size -= entry[3]
@@ -0,0 +1,88 @@
+from datetime import datetime
+from typing import Dict, Optional
+from uuid import UUID
+
+import yarl
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import uuid_helpers
+
+# Note: this module must not import any models, since bettersocial.models uses it. Migration 0016 backfilled with its own frozen copy of derived_fields.
+
+ITEM_TYPES = ('post', 'comment', 'like', 'follow')
+
+
+def _origin(url: Optional[str]) -> str:
+    if not url or not isinstance(url, str):
+        return ''
+
+    try:
+        # Some versions of yarl leave a trailing slash on the origin
+        return yarl.URL(url).origin().human_repr().rstrip('/')
+    except ValueError:
+        return ''
+
+
+def _published(value) -> Optional[datetime]:
+    try:
+        published = parse_datetime(value) if isinstance(value, str) else None
+    except ValueError:
+        return None
+
+    if published is None:
+        return None
+
+    if timezone.is_naive(published):
+        published = timezone.make_aware(published, timezone.utc)
+
+    return published
+
+
+def _object_uuid(item_type: str, inbox_object: Dict) -> Optional[UUID]:
+    try:
+        if item_type == 'post':
+            return uuid_helpers.extract_post_uuid_from_id(inbox_object['id'])
+
+        if item_type == 'comment':
+            return uuid_helpers.extract_last_uuid(inbox_object['id'])
+
+        if item_type == 'like':
+            return uuid_helpers.extract_last_uuid(inbox_object['object'])
+
+        if item_type == 'follow':
+            return uuid_helpers.extract_author_uuid_from_id(inbox_object['actor']['id'])
+
+    except (KeyError, TypeError):
+        pass
+
+    return None
+
+
+def derived_fields(inbox_object: Dict) -> Dict:
+    """
+    Works out the indexed columns of an InboxItem from its raw object:
+
+    - item_type: the lowercased `type` (post, comment, like or follow), or blank for anything else
+    - object_uuid: the UUID of the post or comment for posts and comments, of the liked object for likes, and of the follower (the actor) for follows
+    - origin_host: the origin of the node the item came from, taken from the author's (or actor's) host
+    - published: the item's own `published` if it has a valid one, otherwise None, in which case the column's default (the time it was received) should be kept
+    """
+
+    if not isinstance(inbox_object, dict):
+        inbox_object = dict()
+
+    item_type = str(inbox_object.get('type', '')).strip().lower()
+
+    if item_type not in ITEM_TYPES:
+        item_type = ''
+
+    sender = inbox_object.get('actor') if item_type == 'follow' else inbox_object.get('author')
+    sender = sender if isinstance(sender, dict) else dict()
+
+    return {
+        'item_type': item_type,
+        'object_uuid': _object_uuid(item_type, inbox_object),
+        'origin_host': _origin(sender.get('host')) or _origin(sender.get('id')) or _origin(inbox_object.get('id')),
+        'published': _published(inbox_object.get('published')),
+    }
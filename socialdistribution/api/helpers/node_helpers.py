@@ -0,0 +1,121 @@
+import threading
+from time import time
+from typing import Dict, List, Optional, Tuple, Union, NamedTuple
+
+import yarl
+from django.conf import settings
+
+from bettersocial.models import Node
+
+
+class _Registry(NamedTuple):
+    loaded_at: float
+    nodes: List[Node]
+    by_id: Dict[int, Node]
+    # origin -> [(path, node)], longest path first
+    by_origin: Dict[str, List[Tuple[str, Node]]]
+
+
+# Every node, loaded all at once and kept in process. Node saves and deletes drop it (see api.signals), and since those only reach this process, it's reloaded every NODE_REGISTRY_TTL seconds regardless.
+_registry: Optional[_Registry] = None
+_registry_lock = threading.Lock()
+
+
+def normalize_origin(url: Union[str, yarl.URL]) -> Optional[str]:
+    """The scheme, host and (non-default) port of the URL, lowercased, or None if it isn't an absolute URL"""
+
+    try:
+        url = yarl.URL(str(url))
+    except (TypeError, ValueError):
+        return None
+
+    if not url.is_absolute() or not url.host:
+        return None
+
+    origin = f'{url.scheme.lower()}://{url.host.lower()}'
+
+    return origin if url.is_default_port() else f'{origin}:{url.port}'
+
+
+def _load() -> _Registry:
+    nodes = list(Node.objects.order_by('pk'))
+    by_origin: Dict[str, List[Tuple[str, Node]]] = dict()
+
+    for node in nodes:
+        origin = normalize_origin(node.host)
+
+        if origin is not None:
+            url = yarl.URL(node.host) / node.prefix if node.prefix else yarl.URL(node.host)
+            by_origin.setdefault(origin, list()).append((url.path.rstrip('/') + '/', node))
+
+    for candidates in by_origin.values():
+        candidates.sort(key = lambda candidate: len(candidate[0]), reverse = True)
+
+    return _Registry(time(), nodes, { node.pk: node for node in nodes }, by_origin)
+
+
+def _get_registry() -> _Registry:
+    global _registry
+
+    with _registry_lock:
+        registry = _registry
+
+    if registry is not None and time() - registry.loaded_at <= settings.NODE_REGISTRY_TTL:
+        return registry
+
+    # Loaded outside the lock, so a slow query doesn't hold up lookups on other threads. At worst two threads both load it.
+    registry = _load()
+
+    with _registry_lock:
+        _registry = registry
+
+    return registry
+
+
+def all_nodes() -> List[Node]:
+    """Every node, oldest first"""
+    return list(_get_registry().nodes)
+
+
+def node_by_id(node_id: int) -> Optional[Node]:
+    return _get_registry().by_id.get(node_id)
+
+
+def node_for_url(url: Union[str, yarl.URL, None]) -> Optional[Node]:
+    """
+    The node that the URL (of an author, post, comment...) or host belongs to, or None if it isn't one of ours.
+
+    Nodes are looked up by origin, so that http://a.example.com doesn't also match http://a.example.com.evil.org. Where nodes share an origin, the one whose host and prefix is the longest match for the URL's path wins.
+    """
+
+    if not url:
+        return None
+
+    origin = normalize_origin(url)
+
+    if origin is None:
+        return None
+
+    candidates = _get_registry().by_origin.get(origin)
+
+    if not candidates:
+        return None
+
+    if len(candidates) == 1:
+        return candidates[0][1]
+
+    path = yarl.URL(str(url)).path.rstrip('/') + '/'
+
+    for node_path, node in candidates:
+        if path.startswith(node_path):
+            return node
+
+    # Just the host, like an author's, so fall back to the node at the root
+    return candidates[-1][1]
+
+
+def invalidate_nodes():
+    global _registry
+
+    with _registry_lock:
+        _registry = None
@@ -0,0 +1,220 @@
+import random
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from typing import Dict, Iterable, List, Optional, Set, Tuple, Union
+from uuid import UUID
+
+import requests
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType as DjangoContentType
+from django.db import transaction
+from django.utils import timezone
+
+from api.helpers import remote_helpers, author_helpers
+from bettersocial.models import Author, InboxItem, Node, OutboxItem, Post
+
+# Nodes are delivered to concurrently, but each node's items go one after the other so a single node is never flooded
+_delivery_executor = ThreadPoolExecutor(max_workers = 8, thread_name_prefix = 'outbox-delivery')
+
+
+def enqueue_post(post: Post, post_json: Dict, recipient_uuids: Iterable[Union[str, UUID]]) -> List[OutboxItem]:
+    """Queues the post for delivery to each recipient, all or nothing. Once this returns, the deliver_outbox worker will take it from there."""
+
+    recipient_uuids = {UUID(str(recipient_uuid)) for recipient_uuid in recipient_uuids if recipient_uuid}
+
+    with transaction.atomic():
+        return OutboxItem.objects.bulk_create([
+            OutboxItem(post = post, recipient_uuid = recipient_uuid, post_json = post_json)
+            for recipient_uuid in recipient_uuids
+        ])
+
+
+def enqueue_post_to_friends(post: Post, post_json: Dict) -> OutboxItem:
+    """Queues the post for delivery to every friend of its author. Who they are is only worked out by the deliver_outbox worker, since remote friends take requests to their nodes."""
+    return OutboxItem.objects.create(post = post, to_friends = True, post_json = post_json)
+
+
+def deliver_due(batch_size: Optional[int] = None) -> Tuple[int, int]:
+    """Delivers one batch of outbox items that are due. Returns how many were delivered, and how many failed (and will be retried, unless they're out of attempts)."""
+
+    items = _claim_due(batch_size or settings.OUTBOX_BATCH_SIZE)
+
+    if not items:
+        return 0, 0
+
+    items = [item for item in items if not item.to_friends] + _expand_friends([item for item in items if item.to_friends])
+
+    if not items:
+        return 0, 0
+
+    remote_items = _deliver_locally(items)
+    failures = _deliver_remotely(remote_items)
+
+    _record_failures(failures)
+
+    return len(items) - len(failures), len(failures)
+
+
+def _claim_due(batch_size: int) -> List[OutboxItem]:
+    """Takes a lease on a batch of due items, so that other workers skip them while they are being delivered"""
+
+    now = timezone.now()
+
+    with transaction.atomic():
+        items = list(
+            OutboxItem.objects
+            .select_for_update(skip_locked = True)
+            .filter(status = OutboxItem.Status.PENDING, next_attempt_at__lte = now)
+            .order_by('next_attempt_at')[:batch_size]
+        )
+
+        OutboxItem.objects.filter(pk__in = [item.pk for item in items]).update(next_attempt_at = now + timedelta(seconds = settings.OUTBOX_LEASE))
+
+    return items
+
+
+def _expand_friends(items: List[OutboxItem]) -> List[OutboxItem]:
+    """Replaces each to_friends item with one item per friend of the post's author, and returns those. They're written already leased, so they go out with this batch rather than to another worker."""
+
+    expanded = list()
+    leased_until = timezone.now() + timedelta(seconds = settings.OUTBOX_LEASE)
+
+    for item in items:
+        recipient_uuids = set(author_helpers.get_author_friends_as_uuid(item.post.author))
+
+        with transaction.atomic():
+            # One at a time rather than bulk_create, which doesn't give back primary keys on SQLite, and delivery needs them
+            expanded += [
+                OutboxItem.objects.create(post_id = item.post_id, recipient_uuid = recipient_uuid, post_json = item.post_json, next_attempt_at = leased_until)
+                for recipient_uuid in recipient_uuids
+            ]
+
+            item.delete()
+
+    return expanded
+
+
+def split_recipients(recipient_uuids: Iterable[Union[str, UUID]]) -> Tuple[Set[UUID], Set[UUID]]:
+    """Splits the recipients into those that are authors on this server and those that aren't, in one query"""
+
+    recipient_uuids = {UUID(str(recipient_uuid)) for recipient_uuid in recipient_uuids if recipient_uuid}
+
+    local_uuids = set(Author.objects.filter(uuid__in = recipient_uuids).values_list('uuid', flat = True))
+
+    return local_uuids, recipient_uuids - local_uuids
+
+
+def insert_into_local_inboxes(deliveries: Iterable[Tuple[UUID, Dict]]) -> List[InboxItem]:
+    """Puts each (local author uuid, post json) into that author's inbox with a single insert. Wrap it in a transaction along with whatever marks the deliveries as done."""
+
+    post_content_type = DjangoContentType.objects.get_for_model(Post)
+    inbox_items = [InboxItem(author_id = author_uuid, dj_content_type = post_content_type, inbox_object = post_json) for author_uuid, post_json in deliveries]
+
+    # bulk_create skips save(), which is what normally fills these in
+    for inbox_item in inbox_items:
+        inbox_item.fill_derived_fields()
+
+    return InboxItem.objects.bulk_create(inbox_items)
+
+
+def _deliver_locally(items: List[OutboxItem]) -> List[OutboxItem]:
+    """Writes every item addressed to a local author into their inbox, and returns the rest (the remote ones)"""
+
+    local_uuids, _ = split_recipients(item.recipient_uuid for item in items)
+
+    local_items = [item for item in items if item.recipient_uuid in local_uuids]
+
+    if local_items:
+        with transaction.atomic():
+            insert_into_local_inboxes((item.recipient_uuid, item.post_json) for item in local_items)
+            OutboxItem.objects.filter(pk__in = [item.pk for item in local_items]).delete()
+
+    return [item for item in items if item.recipient_uuid not in local_uuids]
+
+
+def _nodes_of_authors(author_uuids: Iterable[UUID]) -> Dict[UUID, Node]:
+    """Which node hosts each author: one lookup for the ones we've seen before, and discovery (asking every node) for the rest"""
+
+    author_uuids = set(author_uuids)
+
+    nodes = remote_helpers.get_nodes_of_uuids(author_uuids)
+
+    for author_uuid in author_uuids - nodes.keys():
+        found = remote_helpers.discover_remote_author(author_uuid)
+
+        if found:
+            nodes[author_uuid] = found[0]
+
+    return nodes
+
+
+def _send_to_node(node: Node, items: List[OutboxItem]) -> List[Tuple[OutboxItem, str]]:
+    """Runs on the delivery executor. Only does HTTP, never touches the database. Returns the items that failed along with why."""
+
+    failures = list()
+
+    for item in items:
+        try:
+            response = node.adapter.send_to_inbox(node, item.recipient_uuid, post_json = item.post_json, timeout = remote_helpers.NODE_TIMEOUT)
+
+            if not response.ok:
+                failures.append((item, f'{response.status_code} from {node.host}: {response.text[:500]}'))
+
+        except requests.RequestException as e:
+            failures.append((item, f'{type(e).__name__} from {node.host}: {e}'))
+
+    return failures
+
+
+def _deliver_remotely(items: List[OutboxItem]) -> List[Tuple[OutboxItem, str]]:
+    """Sends every item to its recipient's node, deleting the delivered ones. Returns the items that failed along with why."""
+
+    if not items:
+        return list()
+
+    nodes = _nodes_of_authors(item.recipient_uuid for item in items)
+
+    failures = list()
+    items_by_node: Dict[Node, List[OutboxItem]] = defaultdict(list)
+
+    for item in items:
+        node = nodes.get(item.recipient_uuid)
+
+        if node:
+            items_by_node[node].append(item)
+        else:
+            failures.append((item, 'Could not find the node hosting the recipient'))
+
+    futures = [_delivery_executor.submit(_send_to_node, node, node_items) for node, node_items in items_by_node.items()]
+
+    for future in futures:
+        failures.extend(future.result())
+
+    failed_pks = {item.pk for item, _ in failures}
+
+    OutboxItem.objects.filter(pk__in = [item.pk for item in items if item.pk not in failed_pks]).delete()
+
+    return failures
+
+
+def retry_delay(attempts: int) -> timedelta:
+    """Exponential backoff with jitter, so that everything that failed together doesn't retry together"""
+
+    delay = min(settings.OUTBOX_RETRY_BASE * 2 ** (attempts - 1), settings.OUTBOX_RETRY_MAX)
+
+    return timedelta(seconds = delay * random.uniform(0.5, 1))
+
+
+def _record_failures(failures: List[Tuple[OutboxItem, str]]):
+    now = timezone.now()
+
+    for item, error in failures:
+        item.attempts += 1
+        item.last_error = error
+        item.next_attempt_at = now + retry_delay(item.attempts)
+
+        if item.attempts >= settings.OUTBOX_MAX_ATTEMPTS:
+            item.status = OutboxItem.Status.FAILED
+
+    OutboxItem.objects.bulk_update([item for item, _ in failures], ['attempts', 'last_error', 'next_attempt_at', 'status'])
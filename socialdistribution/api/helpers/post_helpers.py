@@ -0,0 +1,138 @@
+from typing import Dict, Iterable, List, Optional, Union
+from uuid import UUID
+
+from django.contrib.contenttypes.models import ContentType as DjangoContentType
+from django.db.models import OuterRef, Prefetch, Q, QuerySet, Subquery, prefetch_related_objects
+
+from bettersocial.models import Author, Comment, ContentType, Friendship, Like, Post
+from . import uuid_helpers
+
+# How many of a post's newest comments are embedded in it (commentsSrc)
+TOP_COMMENTS = 5
+
+
+def visible_posts(viewer_uuid: Union[str, UUID], author_uuid: Optional[Union[str, UUID]] = None) -> QuerySet:
+    """
+    Local posts that the viewer is allowed to see, newest first, optionally only those by one author. A post is visible if it is PUBLIC, if it is FRIENDS and its author counts the viewer as a friend, or if it is PRIVATE and addressed to the viewer.
+
+    The set of authors who count the viewer as a friend is an uncorrelated subquery on the Friendship table, so the database works it out once rather than per post. Nothing is joined onto Post, so rows never multiply and there's no need for DISTINCT.
+    """
+
+    friends_of_viewer = Friendship.objects.filter(friend_uuid = viewer_uuid).values('author_id')
+
+    queryset = Post.objects.filter(
+        Q(visibility = Post.Visibility.PUBLIC) |
+        Q(visibility = Post.Visibility.FRIENDS, author_id__in = friends_of_viewer) |
+        Q(visibility = Post.Visibility.PRIVATE, recipient_uuid = viewer_uuid)
+    )
+
+    if author_uuid is not None:
+        queryset = queryset.filter(author_id = author_uuid)
+
+    return queryset.order_by('-published')
+
+
+def prefetch_for_serializer(posts: Iterable[Post]) -> List[Post]:
+    """
+    Loads everything PostSerializer touches for a list of posts, in a fixed number of queries however many posts there are:
+
+    - each post's author and their user (skipped if already select_related)
+    - each post's newest TOP_COMMENTS comments, as `top_comments`
+
+    The number of comments is already stored on the post (comment_count).
+
+    Works on a page of already fetched posts too, which is why this doesn't work on a queryset.
+    """
+
+    posts = list(posts)
+
+    if not posts:
+        return posts
+
+    # Comments whose uuid is among the newest of their post. Django can't filter on a window function yet, so it's a correlated LIMIT instead, which the (post, -published) index answers.
+    newest_of_post = Comment.objects.filter(post_id = OuterRef('post_id')).order_by('-published').values('uuid')[:TOP_COMMENTS]
+
+    prefetch_related_objects(
+        posts,
+        'author__user',
+        Prefetch('comments', queryset = Comment.objects.filter(uuid__in = Subquery(newest_of_post)).order_by('-published'), to_attr = 'top_comments'),
+    )
+
+    return posts
+
+
+def local_authors_of(comments: Iterable[Comment], known: Optional[Dict[UUID, Optional[Author]]] = None) -> Dict[UUID, Optional[Author]]:
+    """
+    The local authors (with their users) of the comments by uuid, in one query. Only the uuids that aren't in `known` yet are looked up, and `known` is updated and returned. Remote authors map to None, so that they aren't looked up again either.
+    """
+
+    known = known if known is not None else dict()
+
+    missing = {comment.author_uuid for comment in comments} - known.keys()
+
+    if missing:
+        found = Author.objects.select_related('user').in_bulk(missing)
+
+        known.update({author_uuid: found.get(author_uuid) for author_uuid in missing})
+
+    return known
+
+
+def store_inbox_like(like_json: Dict) -> Optional[Like]:
+    """
+    Stores a like that arrived through an inbox as a Like, if it is on one of our posts or comments, so that it's listed and counted like any local one. Likes on anything else are left in the inbox only, and liking the same thing twice does nothing.
+    """
+
+    try:
+        object_url = str(like_json['object'])
+        liker_uuid = uuid_helpers.extract_author_uuid_from_id(like_json['author']['id'])
+    except (KeyError, TypeError):
+        return None
+
+    object_uuid = uuid_helpers.extract_last_uuid(object_url)
+
+    if liker_uuid is None or object_uuid is None:
+        return None
+
+    likeable_model = Comment if '/comments/' in object_url else Post
+
+    if not likeable_model.objects.filter(pk = object_uuid).exists():
+        return None
+
+    like, _ = Like.objects.get_or_create(author_uuid = liker_uuid, dj_object_uuid = object_uuid, dj_content_type = DjangoContentType.objects.get_for_model(likeable_model))
+
+    return like
+
+
+def store_inbox_comment(comment_json: Dict) -> Optional[Comment]:
+    """
+    Stores a comment that arrived through an inbox as a Comment, if it is on one of our posts, the same way as store_inbox_like. Receiving the same comment twice does nothing.
+    """
+
+    try:
+        comment_id = str(comment_json['id'])
+        author_uuid = uuid_helpers.extract_author_uuid_from_id(comment_json['author']['id'])
+        text = str(comment_json['comment'])
+    except (KeyError, TypeError):
+        return None
+
+    post_uuid = uuid_helpers.extract_post_uuid_from_id(comment_id)
+    comment_uuid = uuid_helpers.extract_last_uuid(comment_id)
+
+    # An id without a comment UUID after the post's
+    if author_uuid is None or post_uuid is None or comment_uuid == post_uuid:
+        return None
+
+    if not Post.objects.filter(pk = post_uuid).exists():
+        return None
+
+    content_type = comment_json.get('contentType')
+
+    comment, _ = Comment.objects.get_or_create(uuid = comment_uuid, defaults = {
+        'post_id': post_uuid,
+        'author_uuid': author_uuid,
+        'comment': text,
+        'content_type': content_type if content_type in ContentType.values else ContentType.PLAIN,
+    })
+
+    return comment
@@ -1,45 +1,306 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED, TimeoutError as FutureTimeoutError
+from datetime import timedelta
+from itertools import islice
 from sys import stderr
-from typing import Optional, Union, Dict, List
+from time import monotonic
+from typing import Optional, Union, Dict, List, Callable, Iterable, Iterator, Tuple, TypeVar, Set
 from uuid import UUID
 
-from bettersocial.models import UUIDRemoteCache, Node
-from . import uuid_helpers
+import requests
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+
+from api import node_health
+from bettersocial.models import UUIDRemoteCache, Node, RemoteAuthor, RemoteTombstone
+from . import uuid_helpers, cache_helpers, node_helpers
+
+T = TypeVar('T')
+
+# Seconds a single node gets to answer before we give up on it, so one dead node can't stall the whole request
+NODE_TIMEOUT = 5
+
+# Shared so that a fan-out doesn't have to spin up its own threads every time. The workers only ever do HTTP, never touch the database.
+_fan_out_executor = ThreadPoolExecutor(max_workers = 16, thread_name_prefix = 'node-fan-out')
+
+# Post checks get their own workers, so a page full of posts can't starve the lookups above of threads
+_probe_executor = ThreadPoolExecutor(max_workers = 16, thread_name_prefix = 'post-probe')
+
+# NODE_PROBE_CONCURRENCY slots per node, by node pk, shared by every posts_alive call in the process
+_node_probe_slots: Dict[int, threading.Semaphore] = dict()
+_node_probe_slots_lock = threading.Lock()
+
+
+def fan_out(nodes: Iterable[Node], call: Callable[[Node], T], accept: Callable[[Node, T], bool], timeout: float = NODE_TIMEOUT) -> Optional[Tuple[Node, T]]:
+    """Runs `call` against every node in parallel and returns the first `(node, result)` pair that passes `accept`, or None if no node did. Anything still in flight is cancelled (or abandoned, if it already started), so a lookup costs about as much as the fastest node that has the answer rather than the sum of all of them. Nodes whose circuit is open are skipped, and the healthiest, fastest nodes are submitted first."""
+
+    # Evaluated here, on the calling thread, so querysets are never touched from the workers
+    futures = { _fan_out_executor.submit(call, node): node for node in node_health.rank_nodes(nodes) }
+
+    pending = set(futures)
+    deadline = monotonic() + timeout
+
+    try:
+        while pending:
+            remaining = deadline - monotonic()
+
+            if remaining <= 0:
+                break
+
+            done, pending = wait(pending, timeout = remaining, return_when = FIRST_COMPLETED)
+
+            for future in done:
+                node = futures[future]
+
+                try:
+                    result = future.result()
+                except (requests.RequestException, ValueError) as e:
+                    print(f'Fan-out to node {node.host} failed: {e}', file = stderr)
+                    continue
+
+                if accept(node, result):
+                    return node, result
+    finally:
+        for future in pending:
+            future.cancel()
+
+    return None
+
+
+def get_nodes_of_uuids(uuids: Iterable[Union[str, UUID]]) -> Dict[UUID, Node]:
+    """Queries the cache for the node that hosts each of the objects with these UUIDs, leaving out the ones it doesn't know. Most are answered from memory; the rest take one query between them."""
+
+    uuids = { UUID(str(uuid)) for uuid in uuids }
+
+    node_ids = cache_helpers.get_memoized_node_ids(uuids)
+    unknown = uuids - node_ids.keys()
+
+    if unknown:
+        found = dict(UUIDRemoteCache.objects.filter(uuid__in = unknown).values_list('uuid', 'node_id'))
+
+        cache_helpers.memoize_node_ids(found)
+        node_ids.update(found)
+
+    nodes = { uuid: node_helpers.node_by_id(node_id) for uuid, node_id in node_ids.items() }
+
+    return { uuid: node for uuid, node in nodes.items() if node is not None }
 
 
 def get_node_of_uuid(uuid: Union[str, UUID]) -> Optional[Node]:
     """Queries the cache for the node that hosts the object with this UUID"""
-    if isinstance(uuid, str):
-        uuid = UUID(uuid)
+    return get_nodes_of_uuids([uuid]).get(UUID(str(uuid)))
 
-    queryset = UUIDRemoteCache.objects.filter(uuid = uuid)
 
-    if not queryset.exists():
-        return None
+# Rows per upsert, well under SQLite's limit on parameters
+UPSERT_BATCH_SIZE = 500
+
 
-    return queryset.get().node
+def cache_hosts_of_uuids(nodes: Dict[Union[str, UUID], Node]):
+    """Writes/overwrites to the UUID cache which node hosts each of the objects, with a single INSERT ... ON CONFLICT per batch, since Django 3.2's bulk_create can't update. Always written, even when the memo agrees, since another process may have moved the row since."""
+
+    rows = [(UUID(str(uuid)), node.pk) for uuid, node in nodes.items()]
+
+    if not rows:
+        return
+
+    quote = connection.ops.quote_name
+    uuid_field = UUIDRemoteCache._meta.get_field('uuid')
+    uuid_column, node_column = quote(uuid_field.column), quote(UUIDRemoteCache._meta.get_field('node').column)
+
+    with connection.cursor() as cursor:
+        for i in range(0, len(rows), UPSERT_BATCH_SIZE):
+            batch = rows[i:i + UPSERT_BATCH_SIZE]
+
+            cursor.execute(
+                f'INSERT INTO {quote(UUIDRemoteCache._meta.db_table)} ({uuid_column}, {node_column}) VALUES {", ".join(["(%s, %s)"] * len(batch))} '
+                f'ON CONFLICT ({uuid_column}) DO UPDATE SET {node_column} = excluded.{node_column}',
+                [param for uuid, node_id in batch for param in (uuid_field.get_db_prep_value(uuid, connection), node_id)]
+            )
+
+    cache_helpers.memoize_node_ids(dict(rows))
 
 
 def cache_host_of_uuid(uuid: Union[str, UUID], node: Node):
     """Writes/overwrites to the UUID cache which node hosts the object specified by the UUID."""
-    if isinstance(uuid, str):
-        uuid = UUID(uuid)
+    cache_hosts_of_uuids({ uuid: node })
 
-    try:
-        cached_object = UUIDRemoteCache.objects.filter(uuid = uuid).get()
-        cached_object.node = node
-        cached_object.save()
-    except UUIDRemoteCache.DoesNotExist:
-        UUIDRemoteCache.objects.create(uuid = uuid, node = node)
+
+def _fetch_shaped_author(node: Node, author_uuid: UUID) -> Tuple[requests.Response, Optional[Dict]]:
+    response = node.adapter.get_author(node, author_uuid, timeout = NODE_TIMEOUT)
+
+    if response.status_code != 200:
+        return response, None
+
+    # In the case that we have a 200 but it turns out that author was invalid, this will be None
+    return response, node.adapter.shape_author(node, author_uuid, response)
+
+
+def discover_remote_author(author_uuid: UUID) -> Optional[Tuple[Node, Dict]]:
+    """Asks every node for the author at once and caches whichever one hosts it. Returns the node along with the shaped author JSON."""
+
+    found = fan_out(
+        node_helpers.all_nodes(),
+        lambda node: _fetch_shaped_author(node, author_uuid),
+        lambda node, result: bool(result[1])
+    )
+
+    if found is None:
+        print(f'Could not find UUID "{author_uuid}" on any remote server! Perhaps the user was deleted?', file = stderr)
+        return None
+
+    node, (response, shaped_json) = found
+
+    print(f'\nresponse from node {node.host}:')
+    print(response.request.url)
+
+    cache_host_of_uuid(author_uuid, node)
+
+    return node, shaped_json
 
 
 def find_remote_author(author_uuid: Union[str, UUID]) -> Optional[Dict]:
+    """Gets the shaped JSON of a remote author. Served from the remote author cache when possible; stale entries are still returned, but refreshed in the background. Otherwise it comes from the replica (see replica_helpers), and the node is only asked when the author isn't replicated."""
     if isinstance(author_uuid, str):
         author_uuid = UUID(author_uuid)
 
+    cached = cache_helpers.get_remote_author(author_uuid)
+
+    if cached is not None:
+        if cached.stale:
+            cached_node = get_node_of_uuid(author_uuid)
+
+            if cached_node:
+                cache_helpers.revalidate_remote_author(author_uuid, lambda: _fetch_shaped_author(cached_node, author_uuid)[1])
+
+        return cached.author_json
+
+    author_json = get_replicated_author(author_uuid) or _find_remote_author_live(author_uuid)
+
+    if author_json:
+        cache_helpers.cache_remote_author(author_uuid, author_json)
+
+    return author_json
+
+
+def find_remote_authors(author_uuids: Iterable[Union[str, UUID]]) -> Dict[UUID, Dict]:
+    """Batch version of find_remote_author, by UUID, leaving out the authors that couldn't be found. The cache and replica are read for all of them at once, and whatever's left is asked of the nodes concurrently: each author's own node if we know it, otherwise every node."""
+
+    author_uuids = { UUID(str(author_uuid)) for author_uuid in author_uuids }
+    found: Dict[UUID, Dict] = dict()
+
+    for author_uuid in author_uuids:
+        cached = cache_helpers.get_remote_author(author_uuid)
+
+        if cached is not None:
+            if cached.stale:
+                found[author_uuid] = find_remote_author(author_uuid)
+            else:
+                found[author_uuid] = cached.author_json
+
+    missing = author_uuids - found.keys()
+
+    if missing:
+        found.update(
+            RemoteAuthor.objects
+            .filter(uuid__in = missing, fetched_at__gte = timezone.now() - timedelta(seconds = settings.REMOTE_AUTHOR_REPLICA_MAX_AGE))
+            .values_list('uuid', 'author_json')
+        )
+
+        for author_uuid in missing & found.keys():
+            cache_helpers.cache_remote_author(author_uuid, found[author_uuid])
+
+        missing -= found.keys()
+
+    if not missing:
+        return found
+
+    # Worked out here, on this thread, so the workers never have to touch the database
+    node_of = get_nodes_of_uuids(missing)
+
+    for author_uuid, (node, author_json) in _fetch_authors(node_of, missing - node_of.keys()).items():
+        found[author_uuid] = author_json
+        cache_helpers.cache_remote_author(author_uuid, author_json)
+
+    return found
+
+
+def discover_remote_authors(author_uuids: Iterable[Union[str, UUID]]) -> Dict[UUID, Tuple[Node, Dict]]:
+    """Batch version of discover_remote_author: every node is asked for all of the authors at once, and whichever node hosts each one is cached. Authors no node has are left out."""
+    return _fetch_authors(dict(), { UUID(str(author_uuid)) for author_uuid in author_uuids })
+
+
+def _fetch_authors(node_of: Dict[UUID, Node], undiscovered: Iterable[UUID]) -> Dict[UUID, Tuple[Node, Dict]]:
+    """
+    (node, shaped JSON) of each author, asking each known author's own node, and every node for the undiscovered ones, all nodes at once. Where more than one node has an undiscovered author, the healthiest wins, and is cached as its host.
+
+    No node gets more than NODE_PROBE_CONCURRENCY of these at a time, and the whole batch waits no longer than NODE_TIMEOUT, however many authors there are. Authors that weren't fetched by then are left out.
+    """
+
+    undiscovered = sorted(undiscovered)
+
+    by_node: Dict[int, Tuple[Node, List[UUID]]] = { node.pk: (node, list(undiscovered)) for node in node_health.rank_nodes(node_helpers.all_nodes()) } if undiscovered else dict()
+
+    for author_uuid, node in node_of.items():
+        by_node.setdefault(node.pk, (node, list()))[1].append(author_uuid)
+
+    deadline = monotonic() + NODE_TIMEOUT
+
+    def fetch(node: Node, uuids: List[UUID]) -> Dict[UUID, Dict]:
+        results = dict()
+
+        for author_uuid in uuids:
+            if monotonic() >= deadline:
+                break
+
+            try:
+                shaped_json = _fetch_shaped_author(node, author_uuid)[1]
+            except (requests.RequestException, ValueError) as e:
+                print(f'Could not fetch author {author_uuid} from {node.host}: {e}', file = stderr)
+                continue
+
+            if shaped_json:
+                results[author_uuid] = shaped_json
+
+        return results
+
+    # Each node's authors are split between a few workers, same as posts_alive, so we don't flood it
+    futures = {
+        _fan_out_executor.submit(fetch, node, uuids[i::settings.NODE_PROBE_CONCURRENCY]): node
+        for node, uuids in by_node.values()
+        for i in range(min(settings.NODE_PROBE_CONCURRENCY, len(uuids)))
+    }
+
+    done, _ = wait(futures, timeout = max(deadline - monotonic(), 0))
+    found: Dict[UUID, Tuple[Node, Dict]] = dict()
+
+    # In submission order, so the healthiest node wins
+    for future, node in futures.items():
+        if future in done:
+            for author_uuid, author_json in future.result().items():
+                found.setdefault(author_uuid, (node, author_json))
+
+    cache_hosts_of_uuids({ author_uuid: node for author_uuid, (node, _) in found.items() if author_uuid not in node_of })
+
+    return found
+
+
+def get_replicated_author(author_uuid: UUID) -> Optional[Dict]:
+    """The replicated JSON of the author, unless it isn't replicated, or hasn't been synced in REMOTE_AUTHOR_REPLICA_MAX_AGE (the sync isn't running, say)"""
+
+    return (
+        RemoteAuthor.objects
+        .filter(uuid = author_uuid, fetched_at__gte = timezone.now() - timedelta(seconds = settings.REMOTE_AUTHOR_REPLICA_MAX_AGE))
+        .values_list('author_json', flat = True)
+        .first()
+    )
+
+
+def _find_remote_author_live(author_uuid: UUID) -> Optional[Dict]:
     cached_node = get_node_of_uuid(author_uuid)
 
     if cached_node:
-        response = cached_node.adapter.get_author(cached_node, author_uuid)
+        response = cached_node.adapter.get_author(cached_node, author_uuid, timeout = NODE_TIMEOUT)
 
         print(f'\nresponse from node {cached_node.host}:')
         print(response.content)
@@ -61,28 +322,32 @@ def find_remote_author(author_uuid: Union[str, UUID]) -> Optional[Dict]:
         print(f'Could not find UUID "{author_uuid}" on {cached_node.host}\'s server! Perhaps the user was deleted?', file = stderr)
 
     else:
-        for node in Node.objects.all():
-            response = node.adapter.get_author(node, author_uuid)
+        found = discover_remote_author(author_uuid)
 
-            print(f'\nresponse from node {node.host}:')
-            # import pdb; pdb.set_trace()
-            print(response.content.decode('utf-8'))
-            print(response.request.url)
+        return found[1] if found else None
 
-            # Found user, cache and return
-            if response.status_code == 200:
-                shaped_json = node.adapter.shape_author(node, author_uuid, response)
 
-                # In the case that we have a 200 but it turns out that author was invalid
-                if not shaped_json:
-                    return None
+def _node_of_author(author_uuid: UUID) -> Optional[Node]:
+    """The node hosting the author -- from the cache if we know it, otherwise discovered by asking every node at once"""
 
-                cache_host_of_uuid(author_uuid, node)
+    cached_node = get_node_of_uuid(author_uuid)
 
-                return shaped_json
+    if cached_node:
+        return cached_node
+
+    found = discover_remote_author(author_uuid)
+
+    return found[0] if found else None
 
-        print(f'Could not find UUID "{author_uuid}" on any remote server! Perhaps the user was deleted?', file = stderr)
-        return None
+
+def _followers_include(response: requests.Response, author_uuid: UUID) -> bool:
+    """Check all of their followers -- IFF we find one whose UUID matches our own author's UUID, then we know they have approved the follow."""
+
+    for author_json in response.json()['items']:
+        if author_uuid == uuid_helpers.extract_author_uuid_from_id(author_json['id']):
+            return True
+
+    return False
 
 
 def approved_follow(remote_uuid: Union[str, UUID], author_uuid: Union[str, UUID]) -> bool:
@@ -96,141 +361,319 @@ def approved_follow(remote_uuid: Union[str, UUID], author_uuid: Union[str, UUID]
 
     if cached_node:
         # Get remote user's follower's list
-        response = cached_node.adapter.get_followers(cached_node, remote_uuid)
+        response = cached_node.adapter.get_followers(cached_node, remote_uuid, timeout = NODE_TIMEOUT)
 
         print(f'\nresponse from node {cached_node.host}:')
         print(response)
-        print(response.json())
         print(response.request.url)
 
-        # Check all of their followers -- IFF we find one whose UUID matches our own author's UUID, then we know they have approved the follow.
         if response.status_code == 200:
-            for author_json in response.json()['items']:
-                if author_uuid == uuid_helpers.extract_author_uuid_from_id(author_json['id']):
-                    return True
+            return _followers_include(response, author_uuid)
 
     else:
-        for node in Node.objects.all():
-            # Get remote user's follower's list
-            response = node.adapter.get_followers(node, remote_uuid)
+        # Get remote user's follower's list from whichever node answers for them
+        found = fan_out(
+            node_helpers.all_nodes(),
+            lambda node: node.adapter.get_followers(node, remote_uuid, timeout = NODE_TIMEOUT),
+            lambda node, response: response.status_code == 200
+        )
+
+        if found:
+            node, response = found
 
             print(f'\nresponse from node {node.host}:')
             print(response)
-            print(response.json() if response.status_code == 200 else None)
             print(response.request.url)
 
-            # Check all of their followers -- IFF we find one whose UUID matches our own author's UUID, then we know they have approved the follow.
-            if response.status_code == 200:
-
-                cache_host_of_uuid(remote_uuid, node)
+            cache_host_of_uuid(remote_uuid, node)
 
-                for author_json in response.json()['items']:
-                    if author_uuid == uuid_helpers.extract_author_uuid_from_id(author_json['id']):
-                        return True
+            return _followers_include(response, author_uuid)
 
     return False
 
 
-def get_all_authors(node: Node) -> List[Dict]:
-    response = node.adapter.get_authors(node)
+def approved_follows(remote_uuids: Iterable[Union[str, UUID]], author_uuid: Union[str, UUID]) -> Set[UUID]:
+    """Batch version of approved_follow: which of the remote authors have approved `author_uuid`'s follow. The authors are grouped by node, the nodes are checked concurrently, and the answers are memoized for FOLLOW_APPROVAL_CACHE_TTL seconds."""
+    if isinstance(author_uuid, str):
+        author_uuid = UUID(author_uuid)
 
-    print(f'\nGET /authors -- response from node {node.host}:')
-    print(response)
-    print(response.json() if response.status_code == 200 else None)
-    print(response.request.url)
+    remote_uuids = { UUID(str(remote_uuid)) for remote_uuid in remote_uuids }
 
-    if response.status_code == 200:
-        shaped_json = node.adapter.shape_authors(node, response)
+    memoized = cache_helpers.get_follow_approvals(remote_uuids, author_uuid)
+    approved = { remote_uuid for remote_uuid, is_approved in memoized.items() if is_approved }
 
-        # In the case that we have a 200 but it turns out that author was invalid
-        if not shaped_json:
-            return list()
+    unknown = remote_uuids - memoized.keys()
 
-        return shaped_json['items']
+    if not unknown:
+        return approved
 
-    return list()
+    # Work out which node hosts each author here, on this thread, so the workers never have to touch the database
+    node_of = get_nodes_of_uuids(unknown)
 
+    # The rest are looked for on every node, all at once, rather than one fan-out per author
+    for remote_uuid, (node, _) in discover_remote_authors(unknown - node_of.keys()).items():
+        node_of[remote_uuid] = node
 
-def send_friend_request(author_uuid: Union[str, UUID], follower_json: Dict) -> Optional[Dict]:
-    if isinstance(author_uuid, str):
-        author_uuid = UUID(author_uuid)
+    by_node: Dict[int, Tuple[Node, List[UUID]]] = dict()
 
-    cached_node = get_node_of_uuid(author_uuid)
+    for remote_uuid, node in node_of.items():
+        by_node.setdefault(node.pk, (node, list()))[1].append(remote_uuid)
 
-    if cached_node:
-        response = cached_node.adapter.send_friend_request(cached_node, author_uuid, follower_json)
+    def check(node: Node, uuids: List[UUID]) -> Dict[UUID, bool]:
+        # One node's authors are checked one after the other, so we don't flood it
+        results = dict()
 
-        print(f'\nresponse from node {cached_node.host}:')
-        print(response.content.decode('utf-8'))
-        print(response.request.url)
+        for remote_uuid in uuids:
+            try:
+                response = node.adapter.get_followers(node, remote_uuid, timeout = NODE_TIMEOUT)
+                results[remote_uuid] = response.status_code == 200 and _followers_include(response, author_uuid)
+            except (requests.RequestException, ValueError) as e:
+                # Left out, so that it isn't memoized
+                print(f'Could not check followers of {remote_uuid} on {node.host}: {e}', file = stderr)
 
-        # If it was cached, and it's no longer there, it should error
-        response.raise_for_status()
+        return results
 
-        # Found user, cache and return
-        if response.status_code == 200:
-            if bool(response.content):
-                return response.json()
-            else:
-                return None
-        
+    futures = [_fan_out_executor.submit(check, node, uuids) for node, uuids in by_node.values()]
 
-        print(f'Could not find UUID "{author_uuid}" on {cached_node.host}\'s server! Perhaps the user was deleted?', file = stderr)
+    results = dict()
 
-    else:
-        for node in Node.objects.all():
-            response = node.adapter.send_friend_request(node, author_uuid, follower_json)
+    for future in futures:
+        results.update(future.result())
 
-            print(f'\nresponse from node {node.host}:')
-            print(response.content.decode('utf-8'))
-            print(response.request.url)
+    cache_helpers.cache_follow_approvals(results, author_uuid)
 
-            # Found user, cache and return
-            if response.status_code == 200:
-                cache_host_of_uuid(author_uuid, node)
-                return response.json()
+    return approved | { remote_uuid for remote_uuid, is_approved in results.items() if is_approved }
 
-        print(f'Could not find UUID "{author_uuid}" on any remote server! Perhaps the user was deleted?', file = stderr)
+
+def _probe_slots(node: Node) -> threading.Semaphore:
+    with _node_probe_slots_lock:
+        if node.pk not in _node_probe_slots:
+            _node_probe_slots[node.pk] = threading.Semaphore(settings.NODE_PROBE_CONCURRENCY)
+
+        return _node_probe_slots[node.pk]
+
+
+def posts_alive(posts: Iterable[Tuple[Node, str]], unknown: Optional[bool] = True) -> Dict[str, Optional[bool]]:
+    """
+    Whether each (node, post url) is still there, by url. Answers are memoized for POST_LIVENESS_CACHE_TTL seconds, and the rest are checked concurrently: the nodes all at once, but no more than NODE_PROBE_CONCURRENCY checks at a time to any one node, across every call in the process.
+
+    Waits no longer than POST_PROBE_TIMEOUT overall. Posts that couldn't be checked by then, or whose node failed, are `unknown` (taken to be alive, by default), and aren't memoized.
+    """
+
+    posts = { url: node for node, url in posts }
+
+    alive = cache_helpers.get_post_liveness(posts.keys())
+
+    by_node: Dict[int, Tuple[Node, List[str]]] = dict()
+
+    for url, node in posts.items():
+        if url not in alive:
+            by_node.setdefault(node.pk, (node, list()))[1].append(url)
+
+    deadline = monotonic() + settings.POST_PROBE_TIMEOUT
+
+    def probe(node: Node, urls: List[str]) -> Dict[str, bool]:
+        results = dict()
+        slots = _probe_slots(node)
+
+        for url in urls:
+            # Other requests may be checking posts on this node too, so wait for a slot, but not past the deadline
+            if monotonic() >= deadline or not slots.acquire(timeout = max(deadline - monotonic(), 0)):
+                break
+
+            try:
+                # Deleted posts 404. Anything else, like a 403 for a post that went private, still exists.
+                results[url] = node.adapter.check_post(node, url, timeout = min(NODE_TIMEOUT, max(deadline - monotonic(), 0.1))).status_code != 404
+            except requests.RequestException as e:
+                print(f'Could not check post {url} on {node.host}: {e}', file = stderr)
+            finally:
+                slots.release()
+
+        # Memoized here rather than by the caller, so that checks that finish after the caller gave up on them still count for next time
+        cache_helpers.cache_post_liveness(results)
+
+        return results
+
+    # Each node's posts are split between a few workers, which then share the node's slots with any other call
+    futures = [
+        _probe_executor.submit(probe, node, urls[i::settings.NODE_PROBE_CONCURRENCY])
+        for node, urls in by_node.values()
+        for i in range(min(settings.NODE_PROBE_CONCURRENCY, len(urls)))
+    ]
+
+    done, _ = wait(futures, timeout = max(deadline - monotonic(), 0))
+
+    for future in done:
+        alive.update(future.result())
+
+    return { url: alive.get(url, unknown) for url in posts }
+
+
+def fetch_remote_post(node: Node, post_json: Dict) -> Optional[Tuple[Dict, List[Dict]]]:
+    """
+    Gets the latest (post JSON, comments JSON) of a remote post from its node, given the copy of the post we were sent. The post and its comments are fetched at the same time, and kept for REMOTE_POST_CACHE_TTL seconds.
+
+    Returns None if the node couldn't give us the post, and tombstones it if the node says it's gone. Comments that couldn't be fetched are left empty, and then nothing is kept.
+    """
+
+    post_uuid = uuid_helpers.extract_post_uuid_from_id(post_json['id'])
+
+    cached = cache_helpers.get_remote_post(post_uuid)
+
+    if cached is not None:
+        return cached
+
+    post_future = _fan_out_executor.submit(node.adapter.get_post, node, post_json.get('url', post_json['id']), timeout = NODE_TIMEOUT)
+    comments_future = _fan_out_executor.submit(node.adapter.get_comments, node, post_json['comments'], timeout = NODE_TIMEOUT) if post_json.get('comments') else None
+
+    # Both requests time out on their own, but the page shouldn't wait on a worker that hasn't even started yet
+    wait([future for future in [post_future, comments_future] if future is not None], timeout = NODE_TIMEOUT * 2)
+
+    try:
+        post_response = post_future.result(timeout = 0)
+
+        if post_response.status_code == 404:
+            tombstone_posts([(node, post_uuid)])
+            return None
+
+        post_response.raise_for_status()
+        fetched_json = post_response.json()
+
+    except (requests.RequestException, FutureTimeoutError, ValueError) as e:
+        print(f'Could not fetch post {post_uuid} from {node.host}: {e}', file = stderr)
         return None
 
+    comments = list()
+    # A post without a comments URL has nothing more to fetch
+    comments_fetched = comments_future is None
 
-def remove_follower(user_uuid: Union[str, UUID], author_uuid: Union[str, UUID]) -> Optional[Dict]:
+    try:
+        if comments_future is not None:
+            comments_response = comments_future.result(timeout = 0)
+            comments_response.raise_for_status()
+
+            comments = comments_response.json()['comments']
+            comments_fetched = True
+
+    except (requests.RequestException, FutureTimeoutError, ValueError, KeyError) as e:
+        print(f'Could not fetch the comments of post {post_uuid} from {node.host}: {e}', file = stderr)
+
+    revive_posts([post_uuid])
+
+    # Otherwise the empty comments would stick around for REMOTE_POST_CACHE_TTL, so it's fetched again next time instead
+    if comments_fetched:
+        cache_helpers.cache_remote_post(post_uuid, fetched_json, comments)
+
+    return fetched_json, comments
+
+
+def tombstone_posts(posts: Iterable[Tuple[Node, Union[str, UUID]]]):
+    """Records that each (node, post uuid) was just found to be gone from its node. The first time, the post is tombstoned; after that, the tombstone is only moved along, until it's confirmed (see RemoteTombstone)."""
+
+    posts = { UUID(str(post_uuid)): node for node, post_uuid in posts }
+
+    if not posts:
+        return
+
+    now = timezone.now()
+
+    RemoteTombstone.objects.filter(object_uuid__in = posts.keys()).update(last_seen_at = now)
+    RemoteTombstone.objects.bulk_create(
+        [RemoteTombstone(object_uuid = post_uuid, node = node, deleted_at = now, last_seen_at = now) for post_uuid, node in posts.items()],
+        ignore_conflicts = True
+    )
+
+
+def revive_posts(post_uuids: Iterable[Union[str, UUID]]):
+    """Drops the tombstones of posts that turned out to be there after all"""
+
+    post_uuids = { UUID(str(post_uuid)) for post_uuid in post_uuids }
+
+    if post_uuids:
+        RemoteTombstone.objects.filter(object_uuid__in = post_uuids).delete()
+
+
+def iter_all_authors(node: Node) -> Iterator[Dict]:
+    """Lazily yields every one of the node's authors, a page at a time (see BaseAdapter.iter_authors). Stops early, with what it has, if the node stops answering."""
+
+    try:
+        yield from node.adapter.iter_authors(node, timeout = NODE_TIMEOUT)
+    except requests.RequestException as e:
+        # Includes open circuits -- a node being down shouldn't take the whole page with it
+        print(f'GET /authors -- node {node.host} is unavailable: {e}', file = stderr)
+
+
+def iter_node_authors(node: Node, start: int = 0, stop: Optional[int] = None) -> Iterator[Dict]:
+    """
+    The node's authors by display name, from the replica, or just the `start:stop` slice of them. The node is only asked when nothing of it has been replicated in REMOTE_AUTHOR_REPLICA_MAX_AGE (it's new, or the sync isn't running, say).
+
+    The replica is sliced by the database. Asking the node still reads through every page before `start`, but stops once it has `stop`.
+    """
+
+    # Same cutoff as get_replicated_author, so authors are never shown from a replica that's stopped being synced
+    replicated = (
+        RemoteAuthor.objects
+        .filter(node = node, fetched_at__gte = timezone.now() - timedelta(seconds = settings.REMOTE_AUTHOR_REPLICA_MAX_AGE))
+        .order_by('display_name')
+        .values_list('author_json', flat = True)
+    )
+
+    if replicated.exists():
+        return replicated[start:stop].iterator()
+
+    return islice(iter_all_authors(node), start, stop)
+
+
+def send_friend_request(author_uuid: Union[str, UUID], follower_json: Dict) -> Optional[Dict]:
     if isinstance(author_uuid, str):
         author_uuid = UUID(author_uuid)
 
-    if isinstance(user_uuid, str):
-        user_uuid = UUID(user_uuid)
+    # Find the node first rather than POSTing the request at every node
+    node = _node_of_author(author_uuid)
 
-    cached_node = get_node_of_uuid(author_uuid)
+    if node is None:
+        return None
 
-    if cached_node:
-        response = cached_node.adapter.remove_follower(cached_node, author_uuid, user_uuid)
+    response = node.adapter.send_friend_request(node, author_uuid, follower_json, timeout = NODE_TIMEOUT)
 
-        print(f'\nresponse from node {cached_node.host}:')
-        print(response.content.decode('utf-8'))
-        print(response.request.url)
+    print(f'\nresponse from node {node.host}:')
+    print(response.content.decode('utf-8'))
+    print(response.request.url)
 
-        # If it was cached, and it's no longer there, it should error
-        # response.raise_for_status()
+    # If it was cached, and it's no longer there, it should error
+    response.raise_for_status()
 
-        # Found user, cache and return
-        if response.status_code == 200:
+    if response.status_code == 200:
+        if bool(response.content):
             return response.json()
+        else:
+            return None
 
-        print(f'Could not find UUID "{author_uuid}" on {cached_node.host}\'s server! Perhaps the user was deleted?', file = stderr)
+    print(f'Could not find UUID "{author_uuid}" on {node.host}\'s server! Perhaps the user was deleted?', file = stderr)
+    return None
 
-    else:
-        for node in Node.objects.all():
-            response = node.adapter.remove_follower(node, author_uuid, user_uuid)
 
-            print(f'\nresponse from node {node.host}:')
-            print(response.content.decode('utf-8'))
-            print(response.request.url)
+def remove_follower(user_uuid: Union[str, UUID], author_uuid: Union[str, UUID]) -> Optional[Dict]:
+    if isinstance(author_uuid, str):
+        author_uuid = UUID(author_uuid)
 
-            # Found user, cache and return
-            if response.status_code == 200:
-                cache_host_of_uuid(author_uuid, node)
-                return response.json()
+    if isinstance(user_uuid, str):
+        user_uuid = UUID(user_uuid)
 
-        print(f'Could not find UUID "{author_uuid}" on any remote server! Perhaps the user was deleted?', file = stderr)
+    # Find the node first rather than DELETEing at every node
+    node = _node_of_author(author_uuid)
+
+    if node is None:
         return None
+
+    response = node.adapter.remove_follower(node, author_uuid, user_uuid, timeout = NODE_TIMEOUT)
+
+    print(f'\nresponse from node {node.host}:')
+    print(response.content.decode('utf-8'))
+    print(response.request.url)
+
+    if response.status_code == 200:
+        return response.json()
+
+    print(f'Could not find UUID "{author_uuid}" on {node.host}\'s server! Perhaps the user was deleted?', file = stderr)
+    return None
@@ -0,0 +1,87 @@
+from sys import stderr
+from typing import Dict, Iterable, List, Optional
+
+import requests
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from bettersocial.models import Node, RemoteAuthor
+from . import remote_helpers, uuid_helpers
+
+
+def sync_node(node: Node, batch_size: Optional[int] = None) -> Optional[int]:
+    """
+    Copies every one of the node's authors into the replica, writing a batch at a time as the node's pages come in. Returns how many were synced, or None if the node stopped answering part way.
+
+    Authors the node doesn't list anymore are removed, but only once the whole listing has gone through, so a node going down doesn't empty its replica.
+    """
+
+    batch_size = batch_size or settings.REMOTE_AUTHOR_SYNC_BATCH_SIZE
+    started = timezone.now()
+
+    synced = 0
+    batch = list()
+
+    try:
+        for author_json in node.adapter.iter_authors(node, timeout = remote_helpers.NODE_TIMEOUT):
+            batch.append(author_json)
+
+            if len(batch) >= batch_size:
+                synced += _upsert(node, batch)
+                batch = list()
+
+        synced += _upsert(node, batch)
+
+    except (requests.RequestException, ValueError) as e:
+        print(f'Could not sync the authors of node {node.host}: {e}', file = stderr)
+        return None
+
+    RemoteAuthor.objects.filter(node = node, fetched_at__lt = started).delete()
+
+    return synced
+
+
+def _upsert(node: Node, author_jsons: Iterable[Dict]) -> int:
+    """Inserts or updates each author of the node in a handful of queries, however many there are"""
+
+    by_uuid = dict()
+
+    for author_json in author_jsons:
+        author_uuid = uuid_helpers.extract_author_uuid_from_id(author_json.get('id', ''))
+
+        if author_uuid:
+            by_uuid[author_uuid] = author_json
+
+    if not by_uuid:
+        return 0
+
+    now = timezone.now()
+    existing = { remote_author.uuid: remote_author for remote_author in RemoteAuthor.objects.filter(node = node, uuid__in = by_uuid.keys()) }
+
+    updated: List[RemoteAuthor] = list()
+    created: List[RemoteAuthor] = list()
+
+    for author_uuid, author_json in by_uuid.items():
+        remote_author = existing.get(author_uuid) or RemoteAuthor(node = node, uuid = author_uuid)
+
+        remote_author.display_name = (author_json.get('displayName') or '')[:255]
+        remote_author.author_json = author_json
+        remote_author.fetched_at = now
+
+        (updated if remote_author.pk else created).append(remote_author)
+
+    with transaction.atomic():
+        RemoteAuthor.objects.bulk_update(updated, ['display_name', 'author_json', 'fetched_at'])
+        RemoteAuthor.objects.bulk_create(created)
+
+        # Now we know where they live, too, even if they used to live on another node
+        remote_helpers.cache_hosts_of_uuids({ author_uuid: node for author_uuid in by_uuid })
+
+    return len(by_uuid)
+
+
+def sync_all(batch_size: Optional[int] = None) -> Dict[Node, Optional[int]]:
+    """Syncs each node in turn. A node that fails is left as it was, and doesn't stop the others."""
+
+    return { node: sync_node(node, batch_size) for node in Node.objects.all() }
@@ -1,36 +1,73 @@
 import re
+from functools import lru_cache
 from typing import Optional
 from uuid import UUID
 
 # Doesn't need to be esacped because it'll be substituted in later -- also a raw string
 UUID_MATCH_STRING = r'[0-9a-fA-F]{8}-?[0-9a-fA-F]{4}-?[0-9a-fA-F]{4}-?[0-9a-fA-F]{4}-?[0-9a-fA-F]{12}'
 
+# How many distinct IDs each of the extract_* functions remembers. The same few hundred authors and posts come through over and over (in every page of posts, followers, etc.), so this is plenty.
+ID_CACHE_SIZE = 16_384
+
+# All compiled once, at import, instead of on every call
+_DASHED_UUID = re.compile('([0-9a-fA-F]{8})-([0-9a-fA-F]{4})-([0-9a-fA-F]{4})-([0-9a-fA-F]{4})-([0-9a-fA-F]{12})')
+_ANY_UUID = re.compile(UUID_MATCH_STRING)
+_AUTHOR_ID = re.compile(fr'http.*?authors?/({UUID_MATCH_STRING})/?')
+_POST_ID = re.compile(fr'http.*?authors?/.*?/posts/({UUID_MATCH_STRING})/?')
+
+# Our own IDs, which is most of what we parse: 'http(s)://<host>/api/author/<hex>[/posts/<hex>]...'. Anchored, so they don't have to scan the way the general patterns do, and they give the same answer as them for anything they match.
+_OWN_ID = re.compile(r'https?://[^/]+/api/author/([0-9a-f]{32})(?:/posts/([0-9a-f]{32}))?(?:/|$)')
+
 
 def remove_uuid_dashes(uuid_str: str):
     """Removes the dashes from uuid strings, because DRF can't do that apparently."""
-    return re.sub('([0-9a-fA-F]{8})-([0-9a-fA-F]{4})-([0-9a-fA-F]{4})-([0-9a-fA-F]{4})-([0-9a-fA-F]{12})', '\\1\\2\\3\\4\\5', uuid_str)
+
+    # Our own IDs don't have any, so skip the regex entirely
+    if '-' not in uuid_str:
+        return uuid_str
+
+    return _DASHED_UUID.sub('\\1\\2\\3\\4\\5', uuid_str)
 
 
+@lru_cache(maxsize = ID_CACHE_SIZE)
 def extract_author_uuid_from_id(id: str) -> Optional[UUID]:
     """Extracts the author UUID from a 'http://<host>/author/<uuid>' type string"""
 
-    # Returns group 1, the first capture group, as a UUID
-    match = re.search(fr'http.*?authors?/({UUID_MATCH_STRING})/?', id)
+    match = _OWN_ID.match(id) or _AUTHOR_ID.search(id)
 
+    # Returns group 1, the first capture group, as a UUID
     if match is None or match.group(1) is None:
         return None
 
     return UUID(match.group(1))
 
 
+@lru_cache(maxsize = ID_CACHE_SIZE)
 def extract_post_uuid_from_id(id: str) -> Optional[UUID]:
     """Extracts the post UUID from a 'http://<host>/author/<a_uuid>/post/<uuid>' type string"""
 
-    # Returns group 1, the first capture group, as a UUID
-    match = re.search(fr'http.*?authors?/.*?/posts/({UUID_MATCH_STRING})/?', id)
+    match = _OWN_ID.match(id)
+
+    if match is not None and match.group(2) is not None:
+        # Note the 2, since we want the second capture group
+        return UUID(match.group(2))
 
+    match = _POST_ID.search(id)
+
+    # Returns group 1, the first capture group, as a UUID
     if match is None or match.group(1) is None:
         return None
 
-    # Note the 2, since we want the second capture group
     return UUID(match.group(1))
+
+
+@lru_cache(maxsize = ID_CACHE_SIZE)
+def extract_last_uuid(id: str) -> Optional[UUID]:
+    """Extracts the last UUID in a URL, i.e. the UUID of the object the URL points to, like the comment in 'http://<host>/author/<a_uuid>/posts/<p_uuid>/comments/<uuid>'"""
+
+    matches = _ANY_UUID.findall(id)
+
+    if not matches:
+        return None
+
+    return UUID(matches[-1])
@@ -0,0 +1,66 @@
+from time import perf_counter
+from uuid import uuid4
+
+from django.contrib.auth.models import User
+from django.contrib.contenttypes.models import ContentType as DjangoContentType
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from api.helpers import outbox_helpers
+from bettersocial.models import Author, InboxItem, Post
+
+
+def legacy_fan_out(post_json, author_uuids):
+    """The per-recipient loop SendPostRemoteViewSet used to run for local authors, kept here for comparison"""
+
+    for author_uuid in author_uuids:
+        local_author = Author.objects.filter(uuid = author_uuid).get()
+
+        InboxItem.objects.create(author = local_author, dj_content_type = DjangoContentType.objects.get_for_model(Post), inbox_object = post_json)
+
+
+def bulk_fan_out(post_json, author_uuids):
+    local_uuids, _ = outbox_helpers.split_recipients(author_uuids)
+
+    with transaction.atomic():
+        outbox_helpers.insert_into_local_inboxes((author_uuid, post_json) for author_uuid in local_uuids)
+
+
+class Command(BaseCommand):
+    help = 'Times the legacy per-recipient inbox fan-out against the bulk one for a post sent to N local followers. Everything runs in a transaction that is rolled back at the end. (SQLite caps the parameters per statement, so it splits big inserts into several; other databases take them in one.)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--followers', type = int, nargs = '+', default = [1, 100, 10_000])
+        parser.add_argument('--batch-size', type = int, default = 10_000)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            author_uuids = self._seed(max(options['followers']), options['batch_size'])
+
+            poster = Author.objects.get(uuid = author_uuids[0])
+            post = Post.objects.create(author = poster, title = 'Benchmark Post')
+            post_json = { 'type': 'post', 'id': f'http://benchmark.example.com/api/author/{poster.uuid.hex}/posts/{post.uuid.hex}', 'title': post.title }
+
+            for followers in options['followers']:
+                for name, fan_out in [('legacy', legacy_fan_out), ('bulk', bulk_fan_out)]:
+                    queries = list()
+
+                    with connection.execute_wrapper(lambda execute, sql, params, many, context: queries.append(sql) or execute(sql, params, many, context)):
+                        start = perf_counter()
+                        fan_out(post_json, author_uuids[:followers])
+                        elapsed = perf_counter() - start
+
+                    self.stdout.write(f'{followers} followers, {name}: {elapsed * 1000:.1f}ms, {len(queries)} queries')
+
+            transaction.set_rollback(True)
+
+    def _seed(self, count, batch_size):
+        # bulk_create skips the signal that creates an Author per User, so both are created here
+        prefix = f'bench-{uuid4().hex[:8]}-'
+        User.objects.bulk_create([User(username = f'{prefix}{i}', password = '!') for i in range(count)], batch_size = batch_size)
+
+        user_ids = User.objects.filter(username__startswith = prefix).values_list('id', flat = True)
+        authors = [Author(uuid = uuid4(), user_id = user_id) for user_id in user_ids]
+        Author.objects.bulk_create(authors, batch_size = batch_size)
+
+        return [author.uuid for author in authors]
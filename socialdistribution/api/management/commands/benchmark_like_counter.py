@@ -0,0 +1,83 @@
+import threading
+from time import perf_counter
+from uuid import uuid4
+
+from django.contrib.contenttypes.models import ContentType as DjangoContentType
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from bettersocial.models import Author, Like, Post
+
+
+class Command(BaseCommand):
+    help = 'Has many threads like one hot post at the same time, then checks that like_count matches the likes stored, against a read-modify-write counter that loses updates. The post and its likes are deleted at the end. Run against the production database engine for meaningful numbers; SQLite serializes writers.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type = int, default = 8)
+        parser.add_argument('--likes', type = int, default = 100, help = 'Likes per thread')
+
+    def handle(self, *args, **options):
+        author = Author.objects.first()
+
+        if author is None:
+            self.stderr.write('Needs at least one author to own the post')
+            return
+
+        post = Post.objects.create(author = author, title = 'Benchmark Post')
+        post_content_type = DjangoContentType.objects.get_for_model(Post)
+
+        try:
+            for name, like in [('F() counter', self._like), ('read-modify-write', self._like_racy)]:
+                Like.objects.filter(dj_object_uuid = post.uuid).delete()
+                Post.objects.filter(pk = post.pk).update(like_count = 0)
+
+                elapsed = self._run(options, lambda: like(post, post_content_type))
+
+                post.refresh_from_db()
+                stored = Like.objects.filter(dj_object_uuid = post.uuid).count()
+
+                self.stdout.write(f'{name}: {stored} likes in {elapsed:.2f}s ({stored / elapsed:.0f}/s), like_count = {post.like_count} ({stored - post.like_count} lost)')
+        finally:
+            post.delete()
+
+    @staticmethod
+    def _run(options, like) -> float:
+        errors = list()
+
+        def work():
+            try:
+                for _ in range(options['likes']):
+                    like()
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target = work) for _ in range(options['threads'])]
+
+        start = perf_counter()
+
+        for thread in threads:
+            thread.start()
+
+        for thread in threads:
+            thread.join()
+
+        if errors:
+            raise errors[0]
+
+        return perf_counter() - start
+
+    @staticmethod
+    def _like(post, post_content_type):
+        # The signal does the counting
+        Like.objects.create(author_uuid = uuid4(), dj_object_uuid = post.uuid, dj_content_type = post_content_type)
+
+    @staticmethod
+    def _like_racy(post, post_content_type):
+        # What counting in Python would look like. bulk_create skips the signal.
+        Like.objects.bulk_create([Like(author_uuid = uuid4(), dj_object_uuid = post.uuid, dj_content_type = post_content_type)])
+
+        current = Post.objects.get(pk = post.pk)
+        current.like_count += 1
+        current.save(update_fields = ['like_count'])
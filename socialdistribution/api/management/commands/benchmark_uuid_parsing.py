@@ -0,0 +1,63 @@
+import re
+from time import perf_counter
+from uuid import UUID, uuid4
+
+from django.core.management.base import BaseCommand
+
+from api.helpers import uuid_helpers
+
+# The ID formats seen from each node we federate with
+ID_FORMATS = {
+    'ours': 'https://bettersocial.example.com/api/author/{author.hex}/posts/{post.hex}',
+    'team_1': 'https://team1.example.com/service/author/{author}/posts/{post}/',
+    'team_4': 'https://team4.example.com/api/author/{author}/posts/{post}',
+    'team_7': 'https://team7.example.com/authors/{author.hex}/posts/{post}/',
+}
+
+
+def legacy_extract_author_uuid_from_id(id):
+    """What uuid_helpers used to do, kept here for comparison"""
+
+    match = re.search(fr'http.*?authors?/({uuid_helpers.UUID_MATCH_STRING})/?', id)
+
+    return UUID(match.group(1)) if match else None
+
+
+def legacy_extract_post_uuid_from_id(id):
+    match = re.search(fr'http.*?authors?/.*?/posts/({uuid_helpers.UUID_MATCH_STRING})/?', id)
+
+    return UUID(match.group(1)) if match else None
+
+
+class Command(BaseCommand):
+    help = 'Times parsing the author and post UUIDs out of federated post IDs in each node\'s format, with the old per-call regexes and with uuid_helpers. Like real traffic, the IDs repeat: each run parses --ids IDs drawn from --distinct different posts.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ids', type = int, default = 1_000_000, help = 'IDs to parse per format')
+        parser.add_argument('--distinct', type = int, default = 5_000, help = 'Distinct posts per format')
+
+    def handle(self, *args, **options):
+        for name, id_format in ID_FORMATS.items():
+            distinct_ids = [id_format.format(author = uuid4(), post = uuid4()) for _ in range(options['distinct'])]
+            ids = [distinct_ids[i % len(distinct_ids)] for i in range(options['ids'])]
+
+            self.stdout.write(f'\n-- {name}: {ids[0]} --')
+
+            for label, extract_author, extract_post in [
+                ('legacy', legacy_extract_author_uuid_from_id, legacy_extract_post_uuid_from_id),
+                ('uuid_helpers', uuid_helpers.extract_author_uuid_from_id, uuid_helpers.extract_post_uuid_from_id),
+            ]:
+                uuid_helpers.extract_author_uuid_from_id.cache_clear()
+                uuid_helpers.extract_post_uuid_from_id.cache_clear()
+
+                start = perf_counter()
+
+                for id in ids:
+                    extract_author(id)
+                    extract_post(id)
+
+                elapsed = perf_counter() - start
+
+                self.stdout.write(f'{label}: {elapsed:.2f}s ({elapsed / len(ids) * 1e9:.0f}ns per ID)')
+
+            self.stdout.write(f'cache: {uuid_helpers.extract_post_uuid_from_id.cache_info()}')
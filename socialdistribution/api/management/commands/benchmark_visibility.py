@@ -0,0 +1,106 @@
+import random
+from time import perf_counter
+from uuid import uuid4
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+
+from api.helpers import post_helpers
+from bettersocial.models import Author, Post, Follower, Following, Friendship
+
+
+def legacy_visible_posts(viewer_uuid):
+    """The query AllPostsViewSet used to run, kept here for comparison"""
+
+    return Post.objects.filter(
+        (Q(visibility = Post.Visibility.PUBLIC)) |
+        (Q(visibility = Post.Visibility.FRIENDS) & Q(author__follower__follower_uuid = viewer_uuid) & Q(author__following__following_uuid = viewer_uuid)) |
+        (Q(visibility = Post.Visibility.PRIVATE) & Q(recipient_uuid = viewer_uuid))
+    ).distinct().order_by('-published')
+
+
+class Command(BaseCommand):
+    help = 'Seeds synthetic authors, friendships and posts, then compares the plan and latency of the legacy post visibility query with post_helpers.visible_posts. Everything runs in a transaction that is rolled back at the end.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--authors', type = int, default = 10_000)
+        parser.add_argument('--posts', type = int, default = 1_000_000)
+        parser.add_argument('--friends', type = int, default = 20, help = 'Friends per author')
+        parser.add_argument('--viewers', type = int, default = 5, help = 'How many random viewers to time the queries for')
+        parser.add_argument('--batch-size', type = int, default = 10_000)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            author_uuids = self._seed(options)
+
+            for viewer_uuid in random.sample(author_uuids, min(options['viewers'], len(author_uuids))):
+                self.stdout.write(f'\n-- viewer {viewer_uuid} --')
+
+                for name, queryset in [('legacy', legacy_visible_posts(viewer_uuid)), ('visible_posts', post_helpers.visible_posts(viewer_uuid))]:
+                    start = perf_counter()
+                    list(queryset[:5])
+                    first_page = perf_counter() - start
+
+                    start = perf_counter()
+                    count = queryset.count()
+                    counted = perf_counter() - start
+
+                    self.stdout.write(f'{name}: first page {first_page * 1000:.1f}ms, count ({count}) {counted * 1000:.1f}ms')
+
+            self.stdout.write('\n-- legacy plan --')
+            self.stdout.write(legacy_visible_posts(viewer_uuid)[:5].explain())
+
+            self.stdout.write('\n-- visible_posts plan --')
+            self.stdout.write(post_helpers.visible_posts(viewer_uuid)[:5].explain())
+
+            transaction.set_rollback(True)
+
+    def _seed(self, options):
+        batch_size = options['batch_size']
+        start = perf_counter()
+
+        # bulk_create skips the signal that creates an Author per User, so both are created here
+        prefix = f'bench-{uuid4().hex[:8]}-'
+        User.objects.bulk_create([User(username = f'{prefix}{i}', password = '!') for i in range(options['authors'])], batch_size = batch_size)
+
+        user_ids = User.objects.filter(username__startswith = prefix).values_list('id', flat = True)
+        authors = [Author(uuid = uuid4(), user_id = user_id) for user_id in user_ids]
+        Author.objects.bulk_create(authors, batch_size = batch_size)
+
+        author_uuids = [author.uuid for author in authors]
+
+        # Friendships are seeded straight into all three tables, since bulk_create skips the signals that keep them in sync
+        pairs = set()
+
+        for author_uuid in author_uuids:
+            for friend_uuid in random.sample(author_uuids, min(options['friends'], len(author_uuids))):
+                if friend_uuid != author_uuid:
+                    pairs.add((author_uuid, friend_uuid))
+                    pairs.add((friend_uuid, author_uuid))
+
+        Following.objects.bulk_create([Following(author_id = a, following_uuid = b) for a, b in pairs], batch_size = batch_size, ignore_conflicts = True)
+        Follower.objects.bulk_create([Follower(author_id = a, follower_uuid = b) for a, b in pairs], batch_size = batch_size, ignore_conflicts = True)
+        Friendship.objects.bulk_create([Friendship(author_id = a, friend_uuid = b) for a, b in pairs], batch_size = batch_size, ignore_conflicts = True)
+
+        visibilities = [Post.Visibility.PUBLIC] * 6 + [Post.Visibility.FRIENDS] * 3 + [Post.Visibility.PRIVATE]
+
+        for offset in range(0, options['posts'], batch_size):
+            batch = list()
+
+            for _ in range(min(batch_size, options['posts'] - offset)):
+                visibility = random.choice(visibilities)
+
+                batch.append(Post(
+                    author_id = random.choice(author_uuids),
+                    title = 'Benchmark Post',
+                    visibility = visibility,
+                    recipient_uuid = random.choice(author_uuids) if visibility == Post.Visibility.PRIVATE else None,
+                ))
+
+            Post.objects.bulk_create(batch)
+
+        self.stdout.write(f'Seeded {len(author_uuids)} authors, {len(pairs)} friendships and {options["posts"]} posts in {perf_counter() - start:.1f}s')
+
+        return author_uuids
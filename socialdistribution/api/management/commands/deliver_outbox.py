@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.helpers import outbox_helpers
+
+
+class Command(BaseCommand):
+    help = 'Delivers queued posts from the outbox to local and remote inboxes, retrying failures with backoff. Runs until stopped, unless --once is given.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action = 'store_true', help = 'Deliver everything that is currently due, then exit')
+        parser.add_argument('--batch-size', type = int, default = None)
+        parser.add_argument('--interval', type = float, default = 2, help = 'Seconds to sleep when there is nothing due')
+
+    def handle(self, *args, **options):
+        while True:
+            delivered, failed = outbox_helpers.deliver_due(options['batch_size'])
+
+            if delivered or failed:
+                self.stdout.write(f'Delivered {delivered}, failed {failed}')
+
+            # Keep going while there's a backlog
+            elif options['once']:
+                return
+
+            else:
+                time.sleep(options['interval'])
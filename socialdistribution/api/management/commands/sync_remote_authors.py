@@ -0,0 +1,27 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api.helpers import replica_helpers
+
+
+class Command(BaseCommand):
+    help = 'Copies the authors of every node into the local replica, one node at a time, then waits for the next round. Runs until stopped, unless --once is given.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action = 'store_true', help = 'Sync every node once, then exit')
+        parser.add_argument('--batch-size', type = int, default = None)
+        parser.add_argument('--interval', type = float, default = None, help = 'Seconds between rounds (defaults to REMOTE_AUTHOR_SYNC_INTERVAL)')
+
+    def handle(self, *args, **options):
+        interval = options['interval'] if options['interval'] is not None else settings.REMOTE_AUTHOR_SYNC_INTERVAL
+
+        while True:
+            for node, synced in replica_helpers.sync_all(options['batch_size']).items():
+                self.stdout.write(f'{node.host}: ' + (f'synced {synced} authors' if synced is not None else 'failed, kept what was there'))
+
+            if options['once']:
+                return
+
+            time.sleep(interval)
@@ -0,0 +1,136 @@
+import threading
+from collections import deque
+from time import monotonic
+from typing import Dict, Iterable, List
+
+import requests
+
+# How many of the most recent calls the error rate and latency are computed over
+WINDOW_SIZE = 20
+
+# Don't judge a node until it has had at least this many calls in the window
+MIN_CALLS = 5
+
+# Error rate (0..1) over the window at which the circuit opens
+FAILURE_THRESHOLD = 0.5
+
+# Seconds an open circuit waits before letting a single trial request through
+COOLDOWN = 30
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """Raised instead of making a request to a node whose circuit is open. Subclasses ConnectionError so existing handling for unreachable nodes applies as-is."""
+
+
+class NodeHealth:
+    """Rolling error rate and latency for one node, plus the state of its circuit breaker. A closed circuit lets everything through, an open one fails fast, and a half-open one lets a single trial request through to decide which way to go."""
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+    def __init__(self, window_size: int = WINDOW_SIZE, min_calls: int = MIN_CALLS, failure_threshold: float = FAILURE_THRESHOLD, cooldown: float = COOLDOWN) -> None:
+        super().__init__()
+
+        self.min_calls = min_calls
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+
+        # (succeeded, latency in seconds) of the last `window_size` calls
+        self.outcomes = deque(maxlen = window_size)
+
+        self.state = self.CLOSED
+        self.opened_at = 0.0
+        self.trial_in_flight = False
+
+        self._lock = threading.Lock()
+
+    @property
+    def error_rate(self) -> float:
+        if not self.outcomes:
+            return 0.0
+
+        return sum(1 for ok, _ in self.outcomes if not ok) / len(self.outcomes)
+
+    @property
+    def mean_latency(self) -> float:
+        if not self.outcomes:
+            return 0.0
+
+        return sum(latency for _, latency in self.outcomes) / len(self.outcomes)
+
+    def is_open(self) -> bool:
+        """Whether requests would currently be refused. Unlike `allow_request`, this never uses up the half-open trial."""
+
+        with self._lock:
+            if self.state == self.OPEN:
+                return monotonic() - self.opened_at < self.cooldown
+
+            return self.state == self.HALF_OPEN and self.trial_in_flight
+
+    def allow_request(self) -> bool:
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+
+            if self.state == self.OPEN and monotonic() - self.opened_at >= self.cooldown:
+                self.state = self.HALF_OPEN
+
+            if self.state == self.HALF_OPEN and not self.trial_in_flight:
+                self.trial_in_flight = True
+                return True
+
+            return False
+
+    def record_success(self, latency: float):
+        with self._lock:
+            self.outcomes.append((True, latency))
+
+            # The trial went through, so the node is back
+            if self.state == self.HALF_OPEN:
+                self.state = self.CLOSED
+                self.trial_in_flight = False
+                self.outcomes.clear()
+
+    def record_failure(self, latency: float):
+        with self._lock:
+            self.outcomes.append((False, latency))
+
+            if self.state == self.HALF_OPEN or (len(self.outcomes) >= self.min_calls and self.error_rate >= self.failure_threshold):
+                self.state = self.OPEN
+                self.opened_at = monotonic()
+                self.trial_in_flight = False
+
+    def __str__(self):
+        return f'{self.state} ({self.error_rate:.0%} errors, {self.mean_latency * 1000:.0f}ms avg over {len(self.outcomes)} calls)'
+
+
+# Keyed by host, because adapters are shared between nodes and Node rows are reloaded on every request
+_health: Dict[str, NodeHealth] = dict()
+_health_lock = threading.Lock()
+
+
+def health_of(node) -> NodeHealth:
+    with _health_lock:
+        health = _health.get(node.host)
+
+        if health is None:
+            health = _health[node.host] = NodeHealth()
+
+        return health
+
+
+def rank_nodes(nodes: Iterable) -> List:
+    """Drops nodes whose circuit is open and orders the rest healthiest and fastest first"""
+
+    ranked = list()
+
+    for node in nodes:
+        health = health_of(node)
+
+        if not health.is_open():
+            ranked.append((health.state != NodeHealth.CLOSED, health.error_rate, health.mean_latency, node))
+
+    ranked.sort(key = lambda entry: entry[:3])
+
+    return [entry[3] for entry in ranked]
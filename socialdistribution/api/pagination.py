@@ -1,6 +1,14 @@
+from base64 import urlsafe_b64encode, urlsafe_b64decode
+from typing import Optional
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
 from rest_framework.pagination import PageNumberPagination
 from rest_framework.response import Response
 from rest_framework.utils.serializer_helpers import ReturnList
+from rest_framework.utils.urls import replace_query_param
 
 
 class CustomPageNumberPagination(PageNumberPagination):
@@ -11,3 +19,83 @@ class CustomPageNumberPagination(PageNumberPagination):
     def get_paginated_response(self, data: ReturnList):
         """don't modify the response structure because the api does not call for it"""
         return Response(data)
+
+
+class CustomKeysetPagination(CustomPageNumberPagination):
+    """
+    Opt-in keyset pagination, newest first on (published, pk). A request with a `cursor` query param (empty for the first page) gets the page after that cursor; anything else falls back to page numbers. Rather than an OFFSET, each page is found by comparing against the last row of the previous one, so deep pages cost the same as the first and rows added while paging don't shift anything.
+
+    The body is left unwrapped, same as page numbers, so the next cursor goes in the `X-Next-Cursor` header (plus a `Link: <...>; rel="next"`). It's absent on the last page.
+    """
+
+    cursor_query_param = 'cursor'
+    next_cursor_header = 'X-Next-Cursor'
+
+    keyset = False
+    next_cursor: Optional[str] = None
+
+    def paginate_queryset(self, queryset, request, view = None):
+        self.keyset = self.cursor_query_param in request.query_params
+
+        if not self.keyset:
+            return super().paginate_queryset(queryset, request, view)
+
+        self.request = request
+
+        page_size = self.get_page_size(request)
+        queryset = queryset.order_by('-published', '-pk')
+
+        cursor = request.query_params[self.cursor_query_param]
+
+        try:
+            if cursor:
+                published, pk = self.decode_cursor(cursor)
+
+                queryset = queryset.filter(Q(published__lt = published) | Q(published = published, pk__lt = pk))
+
+            # One extra, to know whether there is a next page
+            page = list(queryset[:page_size + 1])
+        except (ValueError, DjangoValidationError):
+            # A pk that doesn't fit the model's primary key
+            raise NotFound('Invalid cursor')
+
+        self.next_cursor = self.encode_cursor(page[page_size - 1]) if len(page) > page_size else None
+
+        return page[:page_size]
+
+    def get_paginated_response(self, data: ReturnList):
+        response = super().get_paginated_response(data)
+
+        if self.keyset and self.next_cursor:
+            response[self.next_cursor_header] = self.next_cursor
+            response['Link'] = f'<{replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, self.next_cursor)}>; rel="next"'
+
+        return response
+
+    @staticmethod
+    def encode_cursor(instance) -> str:
+        return urlsafe_b64encode(f'{instance.published.isoformat()}|{instance.pk}'.encode('utf-8')).decode('ascii')
+
+    @staticmethod
+    def decode_cursor(cursor: str):
+        try:
+            published, pk = urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8').split('|', 1)
+            published = parse_datetime(published)
+        except (ValueError, UnicodeError):
+            raise NotFound('Invalid cursor')
+
+        if published is None:
+            raise NotFound('Invalid cursor')
+
+        return published, pk
+
+
+class OptionalKeysetPagination(CustomKeysetPagination):
+    """Same as CustomKeysetPagination, but without a cursor everything is returned unpaginated -- for views that never paginated, so existing clients see no change"""
+
+    def paginate_queryset(self, queryset, request, view = None):
+        if self.cursor_query_param not in request.query_params:
+            self.keyset = False
+            return None
+
+        return super().paginate_queryset(queryset, request, view)
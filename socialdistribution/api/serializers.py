@@ -1,12 +1,14 @@
-from typing import Dict, List
+from typing import Dict, List, Optional
+from uuid import UUID
 
+from django.db import transaction
 from rest_framework import serializers
 from rest_framework.exceptions import ValidationError
 from rest_framework.fields import empty
 from rest_framework.reverse import reverse
 from rest_framework_nested import serializers as nested_serializers
 
-from api.helpers import uuid_helpers
+from api.helpers import uuid_helpers, post_helpers, remote_helpers, cache_helpers
 from bettersocial.models import *
 
 
@@ -77,12 +79,46 @@ class AuthorSerializer(serializers.ModelSerializer):
         }
 
 
+def _origin_of(request) -> str:
+    """The scheme and host that the request came in on, which every link we serialize starts with"""
+
+    return request.build_absolute_uri('/').rstrip('/')
+
+
+def _author_json(author_uuid: UUID, context: Dict) -> Optional[Dict]:
+    """The JSON of the author of a comment or like, who may be local or remote -- both are stored here. Uses the local authors in context['local_authors'], when a list serializer has resolved them already."""
+
+    local_authors = context.get('local_authors', dict())
+
+    if author_uuid in local_authors:
+        author = local_authors[author_uuid]
+    else:
+        author = Author.objects.select_related('user').filter(uuid = author_uuid).first()
+
+    if author is None:
+        return remote_helpers.find_remote_author(author_uuid)
+
+    return AuthorSerializer(instance = author, context = context, read_only = True).data
+
+
 class FollowerSerializer(serializers.ModelSerializer):
     class Meta:
         model = Follower
         fields = '__all__'
 
 
+class CommentListSerializer(serializers.ListSerializer):
+    """Resolves the authors of every comment in one query, rather than one (or two) per comment"""
+
+    def to_representation(self, data):
+        comments = list(data.all() if isinstance(data, models.Manager) else data)
+
+        # Shared with PostListSerializer, which may have looked them up already
+        post_helpers.local_authors_of(comments, self.context.setdefault('local_authors', dict()))
+
+        return super().to_representation(comments)
+
+
 class CommentSerializer(serializers.ModelSerializer):
     type = models.CharField(max_length = 32)
 
@@ -99,8 +135,7 @@ class CommentSerializer(serializers.ModelSerializer):
     )
 
     def get_author(self, instance: Comment):
-        # TODO: 2021-11-22 refactor for remote authors
-        return AuthorSerializer(instance = instance.author_local, context = self.context, read_only = True).data
+        return _author_json(instance.author_uuid, self.context)
 
     def to_representation(self, instance):
         json = super().to_representation(instance)
@@ -111,6 +146,7 @@ class CommentSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Comment
+        list_serializer_class = CommentListSerializer
         fields = [
             'type',
             'author',
@@ -126,6 +162,27 @@ class CommentSerializer(serializers.ModelSerializer):
         }
 
 
+class PostListSerializer(serializers.ListSerializer):
+    """Loads what every post needs up front (see post_helpers.prefetch_for_serializer), rather than a handful of queries per post"""
+
+    def to_representation(self, data):
+        posts = list(data.all() if isinstance(data, models.Manager) else data)
+
+        origin = _origin_of(self.context['request'])
+        cached = cache_helpers.get_post_jsons(posts, origin)
+
+        # Only the posts that aren't cached need loading
+        misses = post_helpers.prefetch_for_serializer(post for post in posts if post.pk not in cached)
+
+        post_helpers.local_authors_of((comment for post in misses for comment in post.top_comments), self.context.setdefault('local_authors', dict()))
+
+        serialized = { post.pk: self.child.to_uncached_representation(post) for post in misses }
+
+        cache_helpers.cache_post_jsons(((post, serialized[post.pk]) for post in misses), origin)
+
+        return [cached[post.pk] if post.pk in cached else serialized[post.pk] for post in posts]
+
+
 class PostSerializer(serializers.ModelSerializer):
     id = nested_serializers.NestedHyperlinkedIdentityField(
         view_name = 'api:post-detail',
@@ -135,7 +192,7 @@ class PostSerializer(serializers.ModelSerializer):
     type = models.CharField(max_length = 32)
 
     count = serializers.IntegerField(
-        source = 'comments.count',
+        source = 'comment_count',
         read_only = True,
     )
 
@@ -155,19 +212,38 @@ class PostSerializer(serializers.ModelSerializer):
     )
 
     def get_comments(self, instance: Post):
+        # Already fetched when serializing many
+        if hasattr(instance, 'top_comments'):
+            comments = instance.top_comments
+        else:
+            comments = instance.comments.order_by('-published')[:post_helpers.TOP_COMMENTS]
+
         # Gotta hardcode this stuff because there's no way to get the "list representation" without a circular import
         return {
             'type': 'comments',
             'page': 1,
-            'size': 5,
+            'size': post_helpers.TOP_COMMENTS,
             'post': None,  # Both to be filled in to_representation because we can't reference an existing field here, apparently.
             'id': None,
-            'comments': CommentSerializer(instance.comments.order_by('-published')[:5], context = self.context, many = True).data,
+            'comments': CommentSerializer(comments, context = self.context, many = True).data,
         }
 
     published = serializers.DateTimeField(format = 'iso-8601')
 
     def to_representation(self, instance):
+        origin = _origin_of(self.context['request'])
+        cached = cache_helpers.get_post_jsons([instance], origin)
+
+        if cached:
+            return cached[instance.pk]
+
+        json = self.to_uncached_representation(instance)
+
+        cache_helpers.cache_post_jsons([(instance, json)], origin)
+
+        return json
+
+    def to_uncached_representation(self, instance):
         json = super().to_representation(instance)
 
         json['id'] = uuid_helpers.remove_uuid_dashes(json['id'])
@@ -188,6 +264,7 @@ class PostSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Post
+        list_serializer_class = PostListSerializer
         fields = [
             'type',
             'title',
@@ -224,16 +301,12 @@ class BaseLikeSerializer(serializers.ModelSerializer):
         method_name = 'get_author'
     )
 
-    # TODO: 2021-10-25 refactor later for remote authors
-    @staticmethod
-    def helper_get_author(instance: Like) -> Author:
-        return instance.author_local
-
     def get_summary(self, instance: Like):
-        return f'{self.helper_get_author(instance).display_name} Likes your post'
+        # Filled in to_representation, from the author
+        return None
 
     def get_author(self, instance: Like):
-        return AuthorSerializer(self.helper_get_author(instance), context = self.context).data
+        return _author_json(instance.author_uuid, self.context)
 
     def to_representation(self, instance):
         json = super().to_representation(instance)
@@ -241,6 +314,8 @@ class BaseLikeSerializer(serializers.ModelSerializer):
         json['@context'] = 'https://www.w3.org/ns/activitystreams'
         json.move_to_end('@context', last = False)
 
+        json['summary'] = f'{(json["author"] or dict()).get("displayName", "Someone")} Likes your post'
+
         return json
 
     class Meta:
@@ -291,11 +366,18 @@ class InboxItemSerializer(serializers.ModelSerializer):
         # We have to access the raw request since DRF blows any fields that are not part of the Model
         data: Dict = self.context['request'].data
 
-        inbox_item = InboxItem.objects.create(
-            author_id = self.context['author_id'],
-            dj_content_type = DjangoContentType.objects.get_for_model(model = self.types[data['type']]['model']),
-            inbox_object = data
-        )
+        with transaction.atomic():
+            inbox_item = InboxItem.objects.create(
+                author_id = self.context['author_id'],
+                dj_content_type = DjangoContentType.objects.get_for_model(model = self.types[data['type']]['model']),
+                inbox_object = data
+            )
+
+            # Likes and comments on our own posts are stored alongside local ones, so that they're shown and counted
+            if data['type'] == 'like':
+                post_helpers.store_inbox_like(data)
+            elif data['type'] == 'comment':
+                post_helpers.store_inbox_comment(data)
 
         return inbox_item
 
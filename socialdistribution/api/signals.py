@@ -0,0 +1,40 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from bettersocial.models import Follower, Following, Node, Post
+from .helpers import cache_helpers, node_helpers
+
+
+@receiver(signal = post_save, sender = Follower)
+@receiver(signal = post_delete, sender = Follower)
+def invalidate_follower_author(sender, instance: Follower, **kwargs):
+    """A follow or unfollow may change what the follower's node reports about them, so drop our cached copy"""
+
+    cache_helpers.invalidate_remote_author(instance.follower_uuid)
+    cache_helpers.invalidate_follow_approval(instance.follower_uuid, instance.author_id)
+
+
+@receiver(signal = post_save, sender = Following)
+@receiver(signal = post_delete, sender = Following)
+def invalidate_following_author(sender, instance: Following, **kwargs):
+    """A follow or unfollow may change what the followed author's node reports about them, so drop our cached copy"""
+
+    cache_helpers.invalidate_remote_author(instance.following_uuid)
+    cache_helpers.invalidate_follow_approval(instance.following_uuid, instance.author_id)
+
+
+@receiver(signal = post_delete, sender = Post)
+def invalidate_post_json(sender, instance: Post, **kwargs):
+    """Edits retire cached JSON by bumping the version, but a deleted post has no next version, so drop it"""
+
+    cache_helpers.invalidate_post_json(instance.pk, instance.version)
+
+
+@receiver(signal = post_save, sender = Node)
+@receiver(signal = post_delete, sender = Node)
+def invalidate_node_credentials(sender, instance: Node, **kwargs):
+    """Credentials or hosts may have changed, or the node may be gone, along with everything it hosted"""
+
+    cache_helpers.invalidate_node_credentials()
+    cache_helpers.invalidate_node_ids()
+    node_helpers.invalidate_nodes()
@@ -0,0 +1,89 @@
+from uuid import uuid4
+
+from django.core.cache import caches
+from django.test import TestCase, RequestFactory
+
+from api.helpers import author_helpers
+from api.tests import utils
+from bettersocial.models import Following, Follower
+from bettersocial.tests import utils as bettersocial_utils
+
+
+class AuthorFriendsTests(TestCase):
+
+    LOCAL_FRIENDS = 10
+
+    def setUp(self) -> None:
+        super().setUp()
+
+        caches['default'].clear()
+        caches['remote_authors'].clear()
+
+        self.author = bettersocial_utils.create_test_user(username = 'author').author
+
+        self.friends = list()
+
+        for i in range(self.LOCAL_FRIENDS):
+            friend = bettersocial_utils.create_test_user(username = f'friend_{i}').author
+
+            bettersocial_utils.add_local_following(self.author, friend)
+            bettersocial_utils.add_local_following(friend, self.author)
+
+            self.friends.append(friend)
+
+        # Followed back in the author's tables, but never recorded the author as a follower on their side, so not a friend
+        self.unapproved = bettersocial_utils.create_test_user(username = 'unapproved').author
+        Following.objects.create(author = self.author, following_uuid = self.unapproved.uuid)
+        Follower.objects.create(author = self.author, follower_uuid = self.unapproved.uuid)
+
+        # Only follows the author
+        self.follower = bettersocial_utils.create_test_user(username = 'follower').author
+        bettersocial_utils.add_local_following(self.follower, self.author)
+
+        self.request = RequestFactory().get('/')
+
+    def test_local_friends_as_uuid(self):
+        """Tests that only mutually approved local authors are friends, and that resolving them doesn't scale queries with the friend count"""
+
+        with self.assertNumQueries(2):
+            friends = author_helpers.get_author_friends_as_uuid(self.author)
+
+        self.assertCountEqual(friends, [friend.uuid for friend in self.friends])
+
+    def test_local_friends_as_json(self):
+        """Tests that serializing the local friends doesn't go back to the database for each friend's user"""
+
+        with self.assertNumQueries(2):
+            friends = author_helpers.get_author_friends(self.request, self.author)
+
+        self.assertCountEqual([friend['displayName'] for friend in friends], [friend.display_name for friend in self.friends])
+
+    def test_remote_friends(self):
+        """Tests that remote approvals are checked per node, and memoized"""
+
+        adapter = utils.register_stub_adapter()
+        self.addCleanup(utils.unregister_stub_adapter)
+
+        node = utils.create_test_node('http://remote.example.com')
+        own_json = { 'id': f'http://testserver/api/author/{self.author.uuid.hex}' }
+
+        approved_uuid, unapproved_uuid = uuid4(), uuid4()
+
+        adapter.nodes[node.host] = (0, {
+            approved_uuid: utils.create_test_remote_author_json(node.host, approved_uuid, _followers = [own_json]),
+            unapproved_uuid: utils.create_test_remote_author_json(node.host, unapproved_uuid),
+        })
+
+        for remote_uuid in [approved_uuid, unapproved_uuid]:
+            Following.objects.create(author = self.author, following_uuid = remote_uuid)
+            Follower.objects.create(author = self.author, follower_uuid = remote_uuid)
+
+        friends = author_helpers.get_author_friends_as_uuid(self.author)
+
+        self.assertIn(approved_uuid, friends)
+        self.assertNotIn(unapproved_uuid, friends)
+
+        calls = adapter.calls
+
+        self.assertCountEqual(author_helpers.get_author_friends_as_uuid(self.author), friends)
+        self.assertEqual(adapter.calls, calls)
@@ -0,0 +1,43 @@
+from django.test import TestCase
+
+from api.helpers import node_helpers
+from api.tests import utils
+
+
+class NodeRegistryTests(TestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+
+        self.node = utils.create_test_node('http://nodes.example.com/')
+        self.overlapping = utils.create_test_node('http://nodes.example.com.evil.org/')
+        self.api = utils.create_test_node('https://shared.example.com/', prefix = 'api', auth_username = 'shared-api')
+        self.root = utils.create_test_node('https://shared.example.com/social/', prefix = '', auth_username = 'shared-social')
+
+    def test_node_for_url(self):
+        """Tests that URLs resolve by origin, not by substring, and that nodes on the same origin are told apart by path"""
+
+        self.assertEqual(node_helpers.node_for_url('http://NODES.example.com:80/service/author/1/posts/2'), self.node)
+        self.assertEqual(node_helpers.node_for_url('http://nodes.example.com.evil.org/'), self.overlapping)
+        self.assertIsNone(node_helpers.node_for_url('http://example.com/'))
+        self.assertIsNone(node_helpers.node_for_url('https://nodes.example.com/'))
+        self.assertIsNone(node_helpers.node_for_url('not a url'))
+
+        self.assertEqual(node_helpers.node_for_url('https://shared.example.com/api/author/1'), self.api)
+        self.assertEqual(node_helpers.node_for_url('https://shared.example.com/social/author/1'), self.root)
+
+    def test_loaded_once(self):
+        """Tests that the nodes are loaded with one query, and loaded again once one is saved"""
+
+        node_helpers.invalidate_nodes()
+
+        with self.assertNumQueries(1):
+            for _ in range(10):
+                node_helpers.node_for_url('http://nodes.example.com/')
+                node_helpers.all_nodes()
+
+        self.node.host = 'http://moved.example.com/'
+        self.node.save()
+
+        self.assertIsNone(node_helpers.node_for_url('http://nodes.example.com/'))
+        self.assertEqual(node_helpers.node_for_url('http://moved.example.com/'), self.node)
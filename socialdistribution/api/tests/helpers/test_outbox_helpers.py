@@ -0,0 +1,118 @@
+from datetime import timedelta
+from uuid import uuid4
+
+from django.contrib.contenttypes.models import ContentType as DjangoContentType
+from django.core.cache import caches
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from api.helpers import outbox_helpers, node_helpers
+from api.tests import utils
+from bettersocial.models import InboxItem, OutboxItem, Post, UUIDRemoteCache
+from bettersocial.tests import utils as bettersocial_utils
+
+
+class OutboxDeliveryTests(TestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+
+        caches['remote_authors'].clear()
+
+        self.adapter = utils.register_stub_adapter()
+
+        self.author = bettersocial_utils.create_test_user(username = 'poster').author
+        self.post = bettersocial_utils.create_test_post(self.author)
+        self.post_json = { 'type': 'post', 'id': f'http://testserver/api/author/{self.author.uuid.hex}/posts/{self.post.uuid.hex}', 'title': self.post.title }
+
+        self.local_authors = [bettersocial_utils.create_test_user(username = f'local-{i}').author for i in range(3)]
+
+        self.node = utils.create_test_node('http://remote.example.com')
+        self.remote_uuids = [uuid4() for _ in range(2)]
+        self.adapter.nodes[self.node.host] = (0, { remote_uuid: utils.create_test_remote_author_json(self.node.host, remote_uuid) for remote_uuid in self.remote_uuids })
+
+        for remote_uuid in self.remote_uuids:
+            UUIDRemoteCache.objects.create(uuid = remote_uuid, node = self.node)
+
+    def tearDown(self) -> None:
+        utils.unregister_stub_adapter()
+
+        super().tearDown()
+
+    def test_delivers_local_and_remote(self):
+        """Tests that local recipients get an inbox row, remote ones get the post sent to their node, and delivered rows are removed"""
+
+        outbox_helpers.enqueue_post(self.post, self.post_json, [a.uuid for a in self.local_authors] + self.remote_uuids)
+
+        # The same however many recipients there are (the content type is cached by Django after its first lookup, and the nodes by the registry)
+        DjangoContentType.objects.get_for_model(Post)
+        node_helpers.all_nodes()
+
+        with self.assertNumQueries(11):
+            self.assertEqual(outbox_helpers.deliver_due(), (5, 0))
+
+        self.assertFalse(OutboxItem.objects.exists())
+
+        for local_author in self.local_authors:
+            inbox_item = InboxItem.objects.get(author = local_author)
+
+            self.assertEqual(inbox_item.inbox_object, self.post_json)
+            self.assertEqual(inbox_item.object_uuid, self.post.uuid)
+
+        for remote_uuid in self.remote_uuids:
+            self.assertEqual(self.adapter.inboxes[remote_uuid], [self.post_json])
+
+    def test_delivers_to_friends(self):
+        """Tests that a friends-only post is queued as a single row, which the worker turns into one per friend, local and remote, and delivers in the same batch"""
+
+        friend, other = self.local_authors[:2]
+        bettersocial_utils.add_local_following(self.author, friend)
+        bettersocial_utils.add_local_following(friend, self.author)
+        # Only followed, so not a friend
+        bettersocial_utils.add_local_following(self.author, other)
+
+        # The remote friend approved our follow, the other remote author didn't
+        remote_friend, remote_other = self.remote_uuids
+        author_json = utils.create_test_remote_author_json('http://testserver', self.author.uuid)
+
+        for remote_uuid in self.remote_uuids:
+            bettersocial_utils.create_test_following(self.author, remote_uuid)
+            bettersocial_utils.create_test_follower(self.author, remote_uuid)
+
+        self.adapter.nodes[self.node.host][1][remote_friend]['_followers'] = [author_json]
+
+        outbox_helpers.enqueue_post_to_friends(self.post, self.post_json)
+
+        self.assertEqual(OutboxItem.objects.get().recipient_uuid, None)
+        self.assertEqual(outbox_helpers.deliver_due(), (2, 0))
+
+        self.assertFalse(OutboxItem.objects.exists())
+        self.assertEqual(list(InboxItem.objects.values_list('author_id', flat = True)), [friend.uuid])
+        self.assertEqual(self.adapter.inboxes[remote_friend], [self.post_json])
+        self.assertNotIn(remote_other, self.adapter.inboxes)
+
+    @override_settings(OUTBOX_MAX_ATTEMPTS = 2)
+    def test_retries_with_backoff(self):
+        """Tests that a failed delivery is pushed back rather than retried right away, and given up on after its last attempt"""
+
+        unknown_uuid = uuid4()
+        UUIDRemoteCache.objects.create(uuid = unknown_uuid, node = self.node)
+
+        outbox_helpers.enqueue_post(self.post, self.post_json, [unknown_uuid])
+
+        self.assertEqual(outbox_helpers.deliver_due(), (0, 1))
+
+        item = OutboxItem.objects.get()
+
+        self.assertEqual(item.attempts, 1)
+        self.assertEqual(item.status, OutboxItem.Status.PENDING)
+        self.assertGreater(item.next_attempt_at, timezone.now())
+        self.assertIn('404', item.last_error)
+
+        # Not due yet
+        self.assertEqual(outbox_helpers.deliver_due(), (0, 0))
+
+        OutboxItem.objects.update(next_attempt_at = timezone.now() - timedelta(seconds = 1))
+
+        self.assertEqual(outbox_helpers.deliver_due(), (0, 1))
+        self.assertEqual(OutboxItem.objects.get().status, OutboxItem.Status.FAILED)
@@ -0,0 +1,42 @@
+from django.test import TestCase
+
+from api.helpers import post_helpers
+from bettersocial.models import Post
+from bettersocial.tests import utils
+
+
+class VisiblePostsTests(TestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+
+        self.viewer = utils.create_test_user(username = 'viewer').author
+        self.friend = utils.create_test_user(username = 'friend').author
+        self.stranger = utils.create_test_user(username = 'stranger').author
+
+        utils.add_local_following(self.viewer, self.friend)
+        utils.add_local_following(self.friend, self.viewer)
+
+        self.public = utils.create_test_post(self.stranger, visibility = Post.Visibility.PUBLIC)
+        self.friends_only = utils.create_test_post(self.friend, visibility = Post.Visibility.FRIENDS)
+        self.strangers_friends_only = utils.create_test_post(self.stranger, visibility = Post.Visibility.FRIENDS)
+        self.private_to_viewer = utils.create_test_post(self.stranger, visibility = Post.Visibility.PRIVATE, recipient_uuid = self.viewer.uuid)
+        self.private_to_friend = utils.create_test_post(self.stranger, visibility = Post.Visibility.PRIVATE, recipient_uuid = self.friend.uuid)
+
+    def test_visibility(self):
+        """Tests that each visibility is resolved against the viewer, and that nothing is returned twice"""
+
+        # More friends of the post author would have multiplied rows with the old joins
+        utils.add_local_following(self.friend, self.stranger)
+        utils.add_local_following(self.stranger, self.friend)
+
+        self.assertEqual(
+            list(post_helpers.visible_posts(self.viewer.uuid)),
+            [self.private_to_viewer, self.friends_only, self.public]
+        )
+
+    def test_single_author(self):
+        """Tests that every branch of the query is limited to the author, when one is given"""
+
+        self.assertEqual(list(post_helpers.visible_posts(self.viewer.uuid, author_uuid = self.friend.uuid)), [self.friends_only])
+        self.assertEqual(list(post_helpers.visible_posts(self.viewer.uuid, author_uuid = self.stranger.uuid)), [self.private_to_viewer, self.public])
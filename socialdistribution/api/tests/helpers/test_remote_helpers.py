@@ -0,0 +1,377 @@
+import threading
+import time
+from uuid import uuid4
+
+from django.core.cache import caches
+from django.test import TestCase, override_settings
+
+from api.helpers import remote_helpers, cache_helpers, node_helpers
+from api.tests import utils
+from bettersocial.models import UUIDRemoteCache, Following
+from bettersocial.tests import utils as bettersocial_utils
+
+
+class FanOutTests(TestCase):
+    """Doubles as a benchmark: every node is a stub with a fixed delay, so a sequential walk would cost the sum of the delays"""
+
+    SLOW_NODES = 8
+    SLOW_DELAY = 0.25
+    FAST_DELAY = 0.05
+
+    def setUp(self) -> None:
+        super().setUp()
+
+        caches['remote_authors'].clear()
+
+        self.adapter = utils.register_stub_adapter()
+        self.author_uuid = uuid4()
+
+        self.slow_nodes = [utils.create_test_node(f'http://slow-{i}.example.com') for i in range(self.SLOW_NODES)]
+        self.fast_node = utils.create_test_node('http://fast.example.com')
+
+        for node in self.slow_nodes:
+            self.adapter.nodes[node.host] = (self.SLOW_DELAY, dict())
+
+        self.author_json = utils.create_test_remote_author_json(self.fast_node.host, self.author_uuid)
+        self.adapter.nodes[self.fast_node.host] = (self.FAST_DELAY, { self.author_uuid: self.author_json })
+
+    def tearDown(self) -> None:
+        utils.unregister_stub_adapter()
+
+        super().tearDown()
+
+    def test_latency_close_to_fastest_node(self):
+        """Tests that an uncached lookup returns in about the time of the node that has the author, not the sum of every node"""
+
+        start = time.monotonic()
+        author_json = remote_helpers.find_remote_author(self.author_uuid)
+        elapsed = time.monotonic() - start
+
+        self.assertEqual(author_json, self.author_json)
+        self.assertLess(elapsed, self.SLOW_DELAY)
+
+    def test_winner_is_cached(self):
+        """Tests that the node that answered is written to the UUIDRemoteCache"""
+
+        remote_helpers.find_remote_author(self.author_uuid)
+
+        self.assertEqual(UUIDRemoteCache.objects.get(uuid = self.author_uuid).node, self.fast_node)
+
+    def test_dead_node_does_not_stall(self):
+        """Tests that a node that never answers is abandoned once the timeout passes"""
+
+        self.adapter.nodes[self.fast_node.host] = (2, { self.author_uuid: self.author_json })
+
+        start = time.monotonic()
+        found = remote_helpers.fan_out(
+            [self.fast_node] + self.slow_nodes,
+            lambda node: node.adapter.get_author(node, self.author_uuid),
+            lambda node, response: response.status_code == 200,
+            timeout = 0.5
+        )
+
+        self.assertIsNone(found)
+        self.assertLess(time.monotonic() - start, 1)
+
+    def test_not_found(self):
+        """Tests that an author no node knows about resolves to None and is not cached"""
+
+        self.assertIsNone(remote_helpers.find_remote_author(uuid4()))
+        self.assertFalse(UUIDRemoteCache.objects.exists())
+
+
+class FindRemoteAuthorsTests(TestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+
+        caches['remote_authors'].clear()
+
+        self.adapter = utils.register_stub_adapter()
+
+        self.nodes = [utils.create_test_node(f'http://batch-{i}.example.com') for i in range(3)]
+        self.author_jsons = dict()
+
+        for node in self.nodes:
+            authors = { author_uuid: utils.create_test_remote_author_json(node.host, author_uuid) for author_uuid in [uuid4(), uuid4()] }
+
+            self.adapter.nodes[node.host] = (0, authors)
+            self.author_jsons.update(authors)
+
+    def tearDown(self) -> None:
+        utils.unregister_stub_adapter()
+
+        super().tearDown()
+
+    def test_batch(self):
+        """Tests that authors are found whether or not their node is known, that the nodes that had them are cached, and that the answers are kept"""
+
+        known_uuid = next(iter(self.adapter.nodes[self.nodes[0].host][1]))
+        remote_helpers.cache_host_of_uuid(known_uuid, self.nodes[0])
+
+        found = remote_helpers.find_remote_authors(list(self.author_jsons) + [uuid4()])
+
+        self.assertEqual(found, self.author_jsons)
+        self.assertEqual(
+            { cached.uuid: cached.node for cached in UUIDRemoteCache.objects.all() },
+            { author_uuid: node for node in self.nodes for author_uuid in self.adapter.nodes[node.host][1] }
+        )
+
+        calls = self.adapter.calls
+
+        self.assertEqual(remote_helpers.find_remote_authors(self.author_jsons), self.author_jsons)
+        self.assertEqual(self.adapter.calls, calls)
+
+
+class ApprovedFollowsTests(TestCase):
+
+    DELAY = 0.1
+
+    def setUp(self) -> None:
+        super().setUp()
+
+        caches['default'].clear()
+
+        self.adapter = utils.register_stub_adapter()
+
+        self.node = utils.create_test_node('http://followed.example.com')
+        self.other_node = utils.create_test_node('http://other-followed.example.com')
+
+        self.author_uuid = uuid4()
+        follower_json = utils.create_test_remote_author_json('http://local.example.com', self.author_uuid)
+
+        # None of them have been seen before, and every other one has approved the follow
+        self.remote_uuids = [uuid4() for _ in range(8)]
+        self.approved = set(self.remote_uuids[::2])
+
+        self.adapter.nodes[self.node.host] = (self.DELAY, {
+            remote_uuid: utils.create_test_remote_author_json(self.node.host, remote_uuid, _followers = [follower_json] if remote_uuid in self.approved else [])
+            for remote_uuid in self.remote_uuids
+        })
+        self.adapter.nodes[self.other_node.host] = (self.DELAY, dict())
+
+    def tearDown(self) -> None:
+        utils.unregister_stub_adapter()
+
+        super().tearDown()
+
+    def test_undiscovered(self):
+        """Tests that authors whose node isn't known are all looked for at once, rather than one fan-out after another"""
+
+        start = time.monotonic()
+        approved = remote_helpers.approved_follows(self.remote_uuids, self.author_uuid)
+        elapsed = time.monotonic() - start
+
+        self.assertEqual(approved, self.approved)
+        self.assertEqual({ cached.uuid: cached.node for cached in UUIDRemoteCache.objects.all() }, { remote_uuid: self.node for remote_uuid in self.remote_uuids })
+
+        # 8 authors found 4 at a time, then their followers checked one after the other, against 16 one after the other
+        self.assertLess(elapsed, self.DELAY * 14)
+
+
+class RemoteAuthorCacheTests(TestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+
+        caches['remote_authors'].clear()
+
+        self.adapter = utils.register_stub_adapter()
+        self.author_uuid = uuid4()
+
+        self.node = utils.create_test_node('http://remote.example.com')
+        self.author_json = utils.create_test_remote_author_json(self.node.host, self.author_uuid)
+        self.adapter.nodes[self.node.host] = (0, { self.author_uuid: self.author_json })
+
+    def tearDown(self) -> None:
+        utils.unregister_stub_adapter()
+
+        super().tearDown()
+
+    def test_repeat_lookup_skips_network(self):
+        """Tests that a second lookup of the same author is served from the cache"""
+
+        self.assertEqual(remote_helpers.find_remote_author(self.author_uuid), self.author_json)
+        calls = self.adapter.calls
+
+        self.assertEqual(remote_helpers.find_remote_author(self.author_uuid), self.author_json)
+        self.assertEqual(self.adapter.calls, calls)
+
+    def test_follow_invalidates(self):
+        """Tests that following the author drops them from the cache"""
+
+        remote_helpers.find_remote_author(self.author_uuid)
+        self.assertIsNotNone(cache_helpers.get_remote_author(self.author_uuid))
+
+        Following.objects.create(author = bettersocial_utils.create_test_user().author, following_uuid = self.author_uuid)
+
+        self.assertIsNone(cache_helpers.get_remote_author(self.author_uuid))
+
+    @override_settings(REMOTE_AUTHOR_CACHE_TTL = 0)
+    def test_stale_while_revalidate(self):
+        """Tests that a stale author is still returned straight away, and refreshed in the background"""
+
+        remote_helpers.find_remote_author(self.author_uuid)
+
+        renamed_json = { **self.author_json, 'displayName': 'Renamed Author' }
+        self.adapter.nodes[self.node.host] = (0, { self.author_uuid: renamed_json })
+
+        self.assertEqual(remote_helpers.find_remote_author(self.author_uuid), self.author_json)
+
+        # Wait for the background refresh to land
+        deadline = time.monotonic() + 2
+        while cache_helpers.get_remote_author(self.author_uuid).author_json != renamed_json and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+        self.assertEqual(cache_helpers.get_remote_author(self.author_uuid).author_json, renamed_json)
+
+
+@override_settings(NODE_PROBE_CONCURRENCY = 4, POST_PROBE_TIMEOUT = 5)
+class UUIDNodeMemoTests(TestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+
+        self.node = utils.create_test_node('http://memo.example.com')
+        self.other_node = utils.create_test_node('http://other-memo.example.com')
+        self.uuids = [uuid4() for _ in range(5)]
+
+        for uuid in self.uuids:
+            UUIDRemoteCache.objects.create(uuid = uuid, node = self.node)
+
+        # Loaded once per process, so it's not part of what's counted
+        node_helpers.all_nodes()
+
+    def test_read_through(self):
+        """Tests that a lookup only goes to the database the first time, and that hits and misses are counted"""
+
+        before = cache_helpers.node_id_memo_stats()
+
+        with self.assertNumQueries(1):
+            self.assertEqual(remote_helpers.get_nodes_of_uuids(self.uuids + [uuid4()]), { uuid: self.node for uuid in self.uuids })
+
+        with self.assertNumQueries(0):
+            for uuid in self.uuids:
+                self.assertEqual(remote_helpers.get_node_of_uuid(uuid), self.node)
+
+        stats = cache_helpers.node_id_memo_stats()
+
+        self.assertEqual(stats['hits'] - before['hits'], 5)
+        self.assertEqual(stats['misses'] - before['misses'], 6)
+
+    def test_upsert(self):
+        """Tests that writes are a single statement whether or not the row is there, and that they're remembered"""
+
+        new_uuid = uuid4()
+
+        with self.assertNumQueries(1):
+            remote_helpers.cache_hosts_of_uuids({ self.uuids[0]: self.other_node, new_uuid: self.other_node })
+
+        self.assertEqual(UUIDRemoteCache.objects.get(uuid = self.uuids[0]).node, self.other_node)
+        self.assertEqual(UUIDRemoteCache.objects.get(uuid = new_uuid).node, self.other_node)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(remote_helpers.get_node_of_uuid(self.uuids[0]), self.other_node)
+
+    def test_written_elsewhere(self):
+        """Tests that rows rewritten by another process are picked up once the memo times out, and that writes go through even when the memo agrees"""
+
+        remote_helpers.get_nodes_of_uuids(self.uuids)
+
+        # As if by the sync worker
+        UUIDRemoteCache.objects.filter(uuid = self.uuids[0]).update(node = self.other_node)
+
+        self.assertEqual(remote_helpers.get_node_of_uuid(self.uuids[0]), self.node)
+
+        with override_settings(UUID_NODE_MEMO_TTL = 0):
+            self.assertEqual(remote_helpers.get_node_of_uuid(self.uuids[0]), self.other_node)
+
+        UUIDRemoteCache.objects.filter(uuid = self.uuids[1]).update(node = self.other_node)
+
+        with self.assertNumQueries(1):
+            remote_helpers.cache_host_of_uuid(self.uuids[1], self.node)
+
+        self.assertEqual(UUIDRemoteCache.objects.get(uuid = self.uuids[1]).node, self.node)
+
+    @override_settings(UUID_NODE_MEMO_SIZE = 2)
+    def test_bounded(self):
+        """Tests that the least recently used uuids are dropped past UUID_NODE_MEMO_SIZE"""
+
+        remote_helpers.get_nodes_of_uuids(self.uuids)
+
+        self.assertEqual(cache_helpers.node_id_memo_stats()['size'], 2)
+
+
+class PostLivenessTests(TestCase):
+
+    DELAY = 0.1
+
+    def setUp(self) -> None:
+        super().setUp()
+
+        caches['default'].clear()
+
+        self.adapter = utils.register_stub_adapter()
+        remote_helpers._node_probe_slots.clear()
+
+        self.node = utils.create_test_node('http://probed.example.com')
+        self.other_node = utils.create_test_node('http://other-probed.example.com')
+
+        for node in [self.node, self.other_node]:
+            self.adapter.nodes[node.host] = (self.DELAY, dict())
+
+        self.posts = [(node, f'{node.host}/api/author/{uuid4().hex}/posts/{uuid4().hex}') for node in [self.node, self.other_node] for _ in range(10)]
+
+        self.dead = { url for _, url in self.posts[::3] }
+
+        for url in self.dead:
+            self.adapter.post_statuses[url] = 404
+
+    def tearDown(self) -> None:
+        utils.unregister_stub_adapter()
+
+        super().tearDown()
+
+    def test_concurrent(self):
+        """Tests that posts are checked concurrently, but never more than NODE_PROBE_CONCURRENCY at once per node, and that the answers are memoized"""
+
+        start = time.monotonic()
+        alive = remote_helpers.posts_alive(self.posts)
+        elapsed = time.monotonic() - start
+
+        self.assertEqual({ url for url, is_alive in alive.items() if not is_alive }, self.dead)
+        self.assertEqual(len(alive), 20)
+
+        # 10 posts per node, 4 at a time, is 3 rounds, against 20 one after the other
+        self.assertLess(elapsed, self.DELAY * 8)
+        self.assertEqual(max(self.adapter.max_in_flight.values()), 4)
+
+        calls = self.adapter.calls
+
+        self.assertEqual(remote_helpers.posts_alive(self.posts), alive)
+        self.assertEqual(self.adapter.calls, calls)
+
+    def test_concurrent_calls(self):
+        """Tests that NODE_PROBE_CONCURRENCY holds per node across calls, not just within one"""
+
+        results = dict()
+        callers = [threading.Thread(target = lambda i = i: results.__setitem__(i, remote_helpers.posts_alive(self.posts[i::3]))) for i in range(3)]
+
+        for caller in callers:
+            caller.start()
+
+        for caller in callers:
+            caller.join()
+
+        self.assertEqual({ url for alive in results.values() for url, is_alive in alive.items() if not is_alive }, self.dead)
+        self.assertEqual(max(self.adapter.max_in_flight.values()), 4)
+
+    @override_settings(POST_PROBE_TIMEOUT = 0.05)
+    def test_deadline(self):
+        """Tests that posts that couldn't be checked in time are shown rather than waited for"""
+
+        start = time.monotonic()
+        alive = remote_helpers.posts_alive(self.posts)
+
+        self.assertLess(time.monotonic() - start, self.DELAY)
+        self.assertTrue(all(alive.values()))
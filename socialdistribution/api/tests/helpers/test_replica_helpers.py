@@ -0,0 +1,109 @@
+from datetime import timedelta
+from unittest import mock
+from uuid import UUID
+
+from django.conf import settings
+from django.core.cache import caches
+from django.test import TestCase
+from django.utils import timezone
+
+from api.helpers import remote_helpers, replica_helpers
+from api.tests import utils
+from bettersocial.models import RemoteAuthor, UUIDRemoteCache
+
+
+class ReplicaTests(TestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+
+        caches['remote_authors'].clear()
+
+        self.recording = utils.load_recording('paged')
+        self.node = utils.create_test_node(self.recording['host'], adapter_id = self.recording['adapter_id'], prefix = self.recording['prefix'])
+
+    def _sync(self, recording = None, page_size: int = 2):
+        with utils.Replay(self.node.adapter, recording or self.recording) as replay, mock.patch.object(self.node.adapter, 'authors_page_size', page_size):
+            synced = replica_helpers.sync_node(self.node, batch_size = 3)
+
+        return synced, replay
+
+    def test_sync(self):
+        """Tests that a node's authors are copied in batches, along with where they live, and that authors the node dropped are removed"""
+
+        synced, _ = self._sync()
+
+        self.assertEqual(synced, 5)
+        self.assertEqual(list(RemoteAuthor.objects.order_by('display_name').values_list('display_name', flat = True)), [f'Author {i}' for i in range(1, 6)])
+        self.assertEqual(UUIDRemoteCache.objects.filter(node = self.node).count(), 5)
+
+        # The last author is gone, and the first one was renamed
+        recording = utils.load_recording('paged')
+        recording['responses'][0]['json']['items'][0]['displayName'] = 'Renamed'
+        recording['responses'][2]['json']['items'] = []
+
+        self.assertEqual(self._sync(recording)[0], 4)
+        self.assertEqual(list(RemoteAuthor.objects.order_by('display_name').values_list('display_name', flat = True)), ['Author 2', 'Author 3', 'Author 4', 'Renamed'])
+
+    def test_capped_page_size(self):
+        """Tests that a node that gives back smaller pages than we ask for is still listed to the end, so nothing after its first page is pruned"""
+
+        self._sync()
+
+        # Asked for 3 at a time, it still answers 2
+        recording = utils.load_recording('paged')
+
+        for response in recording['responses']:
+            response['url'] = response['url'].replace('size=2', 'size=3')
+
+        self.assertEqual(self._sync(recording, page_size = 3)[0], 5)
+        self.assertEqual(RemoteAuthor.objects.count(), 5)
+
+    def test_failed_sync(self):
+        """Tests that a node that errors on its first page keeps its replica"""
+
+        self._sync()
+
+        recording = utils.load_recording('paged')
+        recording['responses'][0].update(status = 503, json = None)
+
+        self.assertIsNone(self._sync(recording)[0])
+        self.assertEqual(RemoteAuthor.objects.count(), 5)
+
+    def test_failed_sync_part_way(self):
+        """Tests that a node that stops answering part way keeps its replica, including the authors it didn't get to"""
+
+        self._sync()
+
+        recording = utils.load_recording('paged')
+        recording['responses'][1].update(status = 500, json = None)
+
+        self.assertIsNone(self._sync(recording)[0])
+        self.assertEqual(RemoteAuthor.objects.count(), 5)
+
+    def test_reads(self):
+        """Tests that finding a remote author and listing a node's authors come from the replica, without asking the node"""
+
+        self._sync()
+
+        with utils.Replay(self.node.adapter, { 'responses': [] }) as replay:
+            author_json = remote_helpers.find_remote_author(UUID('00000000-0000-4000-8000-000000000003'))
+            authors = list(remote_helpers.iter_node_authors(self.node))
+
+        self.assertEqual(replay.requests, [])
+        self.assertEqual(author_json['displayName'], 'Author 3')
+        self.assertEqual(len(authors), 5)
+
+    def test_stale_replica(self):
+        """Tests that a replica that hasn't been synced in REMOTE_AUTHOR_REPLICA_MAX_AGE isn't listed from, and the node is asked instead"""
+
+        self._sync()
+
+        RemoteAuthor.objects.update(fetched_at = timezone.now() - timedelta(seconds = settings.REMOTE_AUTHOR_REPLICA_MAX_AGE + 1))
+
+        with utils.Replay(self.node.adapter, self.recording) as replay, mock.patch.object(self.node.adapter, 'authors_page_size', 2):
+            authors = list(remote_helpers.iter_node_authors(self.node))
+
+        # Every page, then the 404 past the last one
+        self.assertEqual(len(replay.requests), 4)
+        self.assertEqual([author['displayName'] for author in authors], [f'Author {i}' for i in range(1, 6)])
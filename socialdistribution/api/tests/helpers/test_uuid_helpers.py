@@ -0,0 +1,49 @@
+from uuid import uuid4
+
+from django.test import TestCase
+
+from api.helpers import uuid_helpers
+
+
+class UUIDHelpersTests(TestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+
+        self.author_uuid = uuid4()
+        self.post_uuid = uuid4()
+        self.comment_uuid = uuid4()
+
+    def test_own_ids(self):
+        """Tests the fast path, for IDs in our own format"""
+
+        post_id = f'https://bettersocial.example.com/api/author/{self.author_uuid.hex}/posts/{self.post_uuid.hex}'
+
+        self.assertEqual(uuid_helpers.extract_author_uuid_from_id(f'https://bettersocial.example.com/api/author/{self.author_uuid.hex}'), self.author_uuid)
+        self.assertEqual(uuid_helpers.extract_author_uuid_from_id(post_id), self.author_uuid)
+        self.assertEqual(uuid_helpers.extract_post_uuid_from_id(post_id + '/'), self.post_uuid)
+        self.assertEqual(uuid_helpers.extract_post_uuid_from_id(f'{post_id}/comments/{self.comment_uuid.hex}'), self.post_uuid)
+        self.assertEqual(uuid_helpers.extract_last_uuid(f'{post_id}/comments/{self.comment_uuid.hex}'), self.comment_uuid)
+
+        # An author ID has no post in it
+        self.assertIsNone(uuid_helpers.extract_post_uuid_from_id(f'https://bettersocial.example.com/api/author/{self.author_uuid.hex}'))
+
+    def test_other_ids(self):
+        """Tests IDs in the formats other nodes use, which don't take the fast path"""
+
+        for post_id in [
+            f'http://team1.example.com/service/author/{self.author_uuid}/posts/{self.post_uuid}/',
+            f'https://team4.example.com/api/author/{self.author_uuid}/posts/{self.post_uuid}',
+            f'https://team7.example.com/authors/{self.author_uuid.hex}/posts/{self.post_uuid}/',
+        ]:
+            self.assertEqual(uuid_helpers.extract_author_uuid_from_id(post_id), self.author_uuid, post_id)
+            self.assertEqual(uuid_helpers.extract_post_uuid_from_id(post_id), self.post_uuid, post_id)
+
+        self.assertIsNone(uuid_helpers.extract_author_uuid_from_id('https://example.com/not/an/author'))
+        self.assertIsNone(uuid_helpers.extract_last_uuid('https://example.com/not/an/author'))
+
+    def test_remove_uuid_dashes(self):
+        """Tests that dashes are only taken out of UUIDs, and that strings without any are returned as is"""
+
+        self.assertEqual(uuid_helpers.remove_uuid_dashes(f'http://some-host.com/author/{self.author_uuid}'), f'http://some-host.com/author/{self.author_uuid.hex}')
+        self.assertEqual(uuid_helpers.remove_uuid_dashes(self.author_uuid.hex), self.author_uuid.hex)
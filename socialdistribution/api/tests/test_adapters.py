@@ -0,0 +1,82 @@
+from unittest import mock
+from uuid import UUID
+
+from django.core.cache import caches
+from django.test import TestCase
+
+from api.helpers import remote_helpers
+from api.tests import utils
+
+RECORDINGS = ['default', 'team_1', 'team_4', 'team_7']
+
+
+class AdapterContractTests(TestCase):
+    """Replays what each team's node answered, to check that every adapter makes exactly one request per logical operation and shapes the answer the way we expect"""
+
+    def setUp(self) -> None:
+        super().setUp()
+
+        caches['remote_authors'].clear()
+
+    def _replay(self, name: str):
+        recording = utils.load_recording(name)
+        node = utils.create_test_node(recording['host'], adapter_id = recording['adapter_id'], prefix = recording['prefix'])
+
+        return recording, node, utils.Replay(node.adapter, recording)
+
+    def test_author(self):
+        """Tests finding a remote author on a node"""
+
+        for name in RECORDINGS:
+            with self.subTest(name):
+                recording, node, replay = self._replay(name)
+                author_uuid = UUID(recording['author_uuid'])
+
+                with replay:
+                    found_node, author_json = remote_helpers.discover_remote_author(author_uuid)
+
+                self.assertEqual(len(replay.requests), 1)
+                self.assertEqual(found_node, node)
+                self.assertEqual(author_json['displayName'], 'Recorded Author')
+
+                node.delete()
+
+    def test_authors(self):
+        """Tests listing a node's authors. Team 7 also lists authors of other nodes, which are left out."""
+
+        for name in RECORDINGS:
+            with self.subTest(name):
+                recording, node, replay = self._replay(name)
+
+                with replay:
+                    authors = list(remote_helpers.iter_all_authors(node))
+
+                # The page, then the 404 past it
+                self.assertEqual(len(replay.requests), 2)
+                self.assertEqual([author['displayName'] for author in authors], ['Recorded Author', 'Second Author'])
+
+                node.delete()
+
+    def test_paging(self):
+        """Tests that authors are listed a page at a time, lazily, until past the last page"""
+
+        recording, node, replay = self._replay('paged')
+
+        with replay, mock.patch.object(node.adapter, 'authors_page_size', 2):
+            authors = remote_helpers.iter_all_authors(node)
+
+            self.assertEqual(next(authors)['displayName'], 'Author 1')
+            self.assertEqual(len(replay.requests), 1)
+
+            self.assertEqual([author['displayName'] for author in authors], ['Author 2', 'Author 3', 'Author 4', 'Author 5'])
+            self.assertEqual(len(replay.requests), 4)
+
+    def test_ignored_paging(self):
+        """Tests that a node that answers every page the same is only listed once"""
+
+        recording, node, replay = self._replay('unpaged')
+
+        with replay, mock.patch.object(node.adapter, 'authors_page_size', 2):
+            self.assertEqual(len(list(remote_helpers.iter_all_authors(node))), 2)
+
+        self.assertEqual(len(replay.requests), 2)
@@ -0,0 +1,51 @@
+import base64
+
+from django.test import TestCase
+from rest_framework import exceptions
+from rest_framework.test import APIRequestFactory
+
+from api.authentication import NodeAuthentication
+from api.tests import utils
+
+
+class NodeAuthenticationTests(TestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+
+        self.factory = APIRequestFactory()
+        self.node = utils.create_test_node('http://remote.example.com', auth_username = 'remote')
+
+    def _authenticate(self, username: str, password: str):
+        credentials = base64.b64encode(f'{username}:{password}'.encode()).decode()
+
+        return NodeAuthentication().authenticate(self.factory.get('/', HTTP_AUTHORIZATION = f'Basic {credentials}'))
+
+    def test_cached(self):
+        """Tests that once a node has authenticated, it does so again without touching the database, and that the wrong password is still rejected"""
+
+        self.assertEqual(self._authenticate('remote', 'password-in')[0], self.node)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self._authenticate('remote', 'password-in')[0], self.node)
+
+            with self.assertRaises(exceptions.AuthenticationFailed):
+                self._authenticate('remote', 'wrong')
+
+    def test_invalidated(self):
+        """Tests that changing or deleting a node takes effect on the next request"""
+
+        self._authenticate('remote', 'password-in')
+
+        self.node.auth_password = 'changed'
+        self.node.save()
+
+        with self.assertRaises(exceptions.AuthenticationFailed):
+            self._authenticate('remote', 'password-in')
+
+        self.assertEqual(self._authenticate('remote', 'changed')[0], self.node)
+
+        self.node.delete()
+
+        with self.assertRaises(exceptions.AuthenticationFailed):
+            self._authenticate('remote', 'changed')
@@ -0,0 +1,203 @@
+from unittest import mock
+
+import requests
+from django.conf import settings
+from django.core.cache import caches
+from django.test import TestCase, SimpleTestCase
+from rest_framework.test import APIClient
+
+from api import adapters
+from api.helpers import cache_helpers
+from bettersocial.models import Post
+from bettersocial.tests import utils
+
+
+class ConditionalGetTests(TestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+
+        caches['serialized_posts'].clear()
+
+        self.client = APIClient()
+        self.client.force_authenticate(utils.create_test_user(username = 'viewer'))
+
+        self.author = utils.create_test_user(username = 'poster').author
+        self.post = utils.create_test_post(self.author, visibility = Post.Visibility.PUBLIC)
+
+        self.posts_url = f'/api/author/{self.author.uuid.hex}/posts/'
+        self.post_url = f'{self.posts_url}{self.post.uuid.hex}/'
+
+    def test_posts(self):
+        """Tests that a post and the list of posts are 304 until the post changes, checked with one query"""
+
+        for url in [self.posts_url, self.post_url]:
+            response = self.client.get(url)
+
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(response['ETag'].startswith('W/"'))
+
+            with self.assertNumQueries(1):
+                not_modified = self.client.get(url, HTTP_IF_NONE_MATCH = response['ETag'])
+
+            self.assertEqual(not_modified.status_code, 304)
+            self.assertEqual(not_modified.content, b'')
+            self.assertEqual(not_modified['ETag'], response['ETag'])
+
+        last_modified = self.client.get(self.post_url)['Last-Modified']
+        self.assertEqual(self.client.get(self.post_url, HTTP_IF_MODIFIED_SINCE = last_modified).status_code, 304)
+
+        etags = [self.client.get(url)['ETag'] for url in [self.posts_url, self.post_url]]
+
+        utils.create_test_comment(self.author.uuid, self.post)
+
+        for url, etag in zip([self.posts_url, self.post_url], etags):
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH = etag).status_code, 200)
+
+        # Another page gets a different ETag
+        self.assertNotEqual(self.client.get(self.posts_url)['ETag'], self.client.get(self.posts_url, { 'page': 1 })['ETag'])
+
+    def test_posts_leaving_list(self):
+        """Tests that the list of posts has no Last-Modified, since a post leaving it doesn't change any modified time, but its ETag still changes"""
+
+        response = self.client.get(self.posts_url)
+        self.assertNotIn('Last-Modified', response)
+
+        other = utils.create_test_post(self.author, visibility = Post.Visibility.PUBLIC)
+        etag = self.client.get(self.posts_url)['ETag']
+
+        Post.objects.filter(pk = other.pk).delete()
+
+        self.assertEqual(self.client.get(self.posts_url, HTTP_IF_NONE_MATCH = etag).status_code, 200)
+        self.assertEqual(self.client.get(self.posts_url, HTTP_IF_MODIFIED_SINCE = 'Wed, 01 Jan 2100 00:00:00 GMT').status_code, 200)
+
+    def test_comments(self):
+        """Tests that the comments are 304 until a comment is added"""
+
+        url = f'{self.post_url}comments/'
+        etag = self.client.get(url)['ETag']
+
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH = etag).status_code, 304)
+
+        utils.create_test_comment(self.author.uuid, self.post)
+
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH = etag).status_code, 200)
+
+    def test_commenter_renamed(self):
+        """Tests that the comments, and the post that shows them, change when a commenter renames themselves"""
+
+        commenter = utils.create_test_user(username = 'commenter')
+        utils.create_test_comment(commenter.author.uuid, self.post)
+
+        urls = [f'{self.post_url}comments/', self.post_url]
+        etags = [self.client.get(url)['ETag'] for url in urls]
+
+        commenter.first_name = 'Renamed'
+        commenter.save()
+
+        for url, etag in zip(urls, etags):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH = etag)
+
+            self.assertEqual(response.status_code, 200)
+            self.assertIn('Renamed', response.content.decode())
+
+    def test_author(self):
+        """Tests that authors, which have no version, are 304 as long as their body is the same"""
+
+        url = f'/api/author/{self.author.uuid.hex}/'
+        etag = self.client.get(url)['ETag']
+
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH = f'W/"other", {etag}').status_code, 304)
+
+        self.author.github_url = 'https://github.com/poster'
+        self.author.save()
+
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH = etag).status_code, 200)
+
+
+class ConditionalRequestTests(SimpleTestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+
+        self.adapter = adapters.BaseAdapter()
+        self.node = mock.Mock(host = 'http://conditional.example.com', node_username = 'u', node_password = 'p')
+        self.url = 'http://conditional.example.com/api/authors/'
+
+    def _response(self, status_code: int, body: bytes = b'', etag: str = None, **headers) -> requests.Response:
+        response = requests.Response()
+        response.status_code = status_code
+        response._content = body
+
+        if etag:
+            response.headers['ETag'] = etag
+
+        response.headers.update(headers)
+
+        return response
+
+    def test_reuses_body(self):
+        """Tests that the adapter sends the last ETag it got for a URL, and returns the body it had when the answer is 304"""
+
+        adapter, node = self.adapter, self.node
+
+        with mock.patch.object(adapter.session, 'request', side_effect = [self._response(200, b'{"n": 1}', 'W/"1"'), self._response(304)]) as request:
+            self.assertEqual(adapter.request(node, 'GET', 'http://conditional.example.com/api/authors/', params = { 'size': 5 }).json(), { 'n': 1 })
+            self.assertNotIn('headers', request.call_args.kwargs)
+
+            response = adapter.request(node, 'GET', 'http://conditional.example.com/api/authors/', params = { 'size': 5 })
+
+            self.assertEqual(request.call_args.kwargs['headers']['If-None-Match'], 'W/"1"')
+            self.assertEqual((response.status_code, response.json()), (200, { 'n': 1 }))
+
+        # Anything but a 304 or another ETag drops what was kept
+        with mock.patch.object(adapter.session, 'request', side_effect = [self._response(404), self._response(200, b'{}')]) as request:
+            adapter.request(node, 'GET', 'http://conditional.example.com/api/authors/', params = { 'size': 5 })
+            adapter.request(node, 'GET', 'http://conditional.example.com/api/authors/', params = { 'size': 5 })
+
+            self.assertNotIn('headers', request.call_args.kwargs)
+
+    def test_cache_control(self):
+        """Tests that a response is reused without asking the node while its max-age lasts, that no-store responses aren't kept, and that Last-Modified is revalidated too"""
+
+        with mock.patch.object(self.adapter.session, 'request', side_effect = [
+            self._response(200, b'1', **{ 'Cache-Control': 'public, max-age=60' }),
+            self._response(200, b'2', **{ 'Cache-Control': 'no-store', 'ETag': 'W/"2"' }),
+            self._response(200, b'3', **{ 'Last-Modified': 'Sun, 18 Oct 2026 10:00:00 GMT' }),
+            self._response(304),
+        ]) as request:
+            self.assertEqual(self.adapter.request(self.node, 'GET', self.url).content, b'1')
+            self.assertEqual(self.adapter.request(self.node, 'GET', self.url).content, b'1')
+            self.assertEqual(request.call_count, 1)
+
+            self.assertEqual(self.adapter.request(self.node, 'GET', f'{self.url}?page=2').content, b'2')
+            self.assertEqual(self.adapter.request(self.node, 'GET', f'{self.url}?page=2').content, b'3')
+            self.assertNotIn('headers', request.call_args.kwargs)
+
+            self.assertEqual(self.adapter.request(self.node, 'GET', f'{self.url}?page=2').content, b'3')
+            self.assertEqual(request.call_args.kwargs['headers']['If-Modified-Since'], 'Sun, 18 Oct 2026 10:00:00 GMT')
+
+    def test_bounded(self):
+        """Tests that the least recently used responses are dropped once the bodies outgrow the cache"""
+
+        cache = cache_helpers.ResponseCache(max_bytes = 250)
+
+        for i in range(3):
+            cache.set(f'{self.url}{i}', self._response(200, b'x' * 100, f'"{i}"'))
+
+        cache.set(f'{self.url}too-big', self._response(200, b'x' * 300, '"too-big"'))
+
+        self.assertEqual([cache.get(f'{self.url}{i}') is not None for i in range(3)], [False, True, True])
+        self.assertIsNone(cache.get(f'{self.url}too-big'))
+        self.assertLessEqual(cache.size, 250)
+
+    def test_pools(self):
+        """Tests that each node gets its own connection pool on the session"""
+
+        with mock.patch.object(self.adapter.session, 'request', return_value = self._response(200)):
+            self.adapter.request(self.node, 'POST', f'{self.url}x/inbox/')
+
+        node_adapter = self.adapter.session.get_adapter(self.url)
+
+        self.assertIsNot(node_adapter, self.adapter.session.get_adapter('http://other.example.com/'))
+        self.assertEqual(node_adapter._pool_maxsize, settings.NODE_POOL_MAXSIZE)
@@ -0,0 +1,85 @@
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from api import node_health
+from api.adapters import BaseAdapter
+from api.node_health import NodeHealth
+
+
+class NodeHealthTests(SimpleTestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+
+        self.health = NodeHealth(window_size = 10, min_calls = 4, failure_threshold = 0.5, cooldown = 30)
+
+    def test_opens_on_error_rate(self):
+        """Tests that the circuit only opens once there are enough calls and enough of them failed"""
+
+        self.health.record_success(0.1)
+        self.health.record_failure(0.1)
+        self.health.record_failure(0.1)
+
+        self.assertEqual(self.health.state, NodeHealth.CLOSED)
+
+        self.health.record_failure(0.1)
+
+        self.assertEqual(self.health.state, NodeHealth.OPEN)
+        self.assertFalse(self.health.allow_request())
+
+    def test_half_open_trial(self):
+        """Tests that after the cooldown a single trial is let through, and that its outcome decides the state"""
+
+        for _ in range(4):
+            self.health.record_failure(0.1)
+
+        with mock.patch.object(node_health, 'monotonic', return_value = self.health.opened_at + 31):
+            self.assertTrue(self.health.allow_request())
+            self.assertEqual(self.health.state, NodeHealth.HALF_OPEN)
+
+            # Only one trial at a time
+            self.assertFalse(self.health.allow_request())
+
+            self.health.record_failure(0.1)
+            self.assertEqual(self.health.state, NodeHealth.OPEN)
+
+        with mock.patch.object(node_health, 'monotonic', return_value = self.health.opened_at + 31):
+            self.assertTrue(self.health.allow_request())
+
+            self.health.record_success(0.1)
+            self.assertEqual(self.health.state, NodeHealth.CLOSED)
+            self.assertTrue(self.health.allow_request())
+
+    def test_trial_released_on_any_error(self):
+        """Tests that a trial request that fails with something other than a RequestException still reopens the circuit, rather than holding the trial for good"""
+
+        node = mock.Mock(host = 'http://trial.example.com', node_username = 'user', node_password = 'pass')
+        health = node_health.health_of(node)
+
+        for _ in range(node_health.MIN_CALLS):
+            health.record_failure(0.1)
+
+        adapter = BaseAdapter()
+
+        with mock.patch.object(node_health, 'monotonic', return_value = health.opened_at + node_health.COOLDOWN + 1), \
+                mock.patch.object(adapter.session, 'request', side_effect = ValueError('bad hook')):
+            with self.assertRaises(ValueError):
+                adapter.request(node, 'GET', f'{node.host}/authors/')
+
+        self.assertEqual(health.state, NodeHealth.OPEN)
+        self.assertFalse(health.trial_in_flight)
+
+    def test_rank_nodes(self):
+        """Tests that open nodes are dropped and the rest are ordered by error rate, then latency"""
+
+        nodes = [mock.Mock(host = f'http://rank-{i}.example.com') for i in range(3)]
+        slow, dead, fast = nodes
+
+        node_health.health_of(slow).record_success(0.5)
+        node_health.health_of(fast).record_success(0.05)
+
+        for _ in range(node_health.MIN_CALLS):
+            node_health.health_of(dead).record_failure(0.1)
+
+        self.assertEqual(node_health.rank_nodes(nodes), [fast, slow])
@@ -0,0 +1,71 @@
+from base64 import urlsafe_b64encode
+
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.exceptions import NotFound
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from api import pagination
+from bettersocial.models import Post
+from bettersocial.tests import utils
+
+
+class KeysetPaginationTests(TestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+
+        self.factory = APIRequestFactory()
+        self.author = utils.create_test_user().author
+
+        for _ in range(7):
+            utils.create_test_post(self.author)
+
+        # Ties on published have to be broken by pk, or rows would be skipped or repeated across pages
+        Post.objects.update(published = timezone.now())
+
+        self.expected = list(Post.objects.order_by('-published', '-pk'))
+
+    def _paginate(self, paginator, query):
+        request = Request(self.factory.get('/api/posts/', query))
+
+        page = paginator.paginate_queryset(Post.objects.all(), request)
+
+        return page, paginator.get_paginated_response([post.pk for post in page or []])
+
+    def test_pages(self):
+        """Tests that following the cursor header walks every row exactly once, and that the body is left unwrapped"""
+
+        seen = list()
+        cursor = ''
+
+        while cursor is not None:
+            page, response = self._paginate(pagination.CustomKeysetPagination(), { 'cursor': cursor, 'size': 3 })
+
+            self.assertEqual(response.data, [post.pk for post in page])
+
+            seen.extend(page)
+            cursor = response.get('X-Next-Cursor')
+
+            if cursor is not None:
+                self.assertIn(f'cursor={cursor}', response['Link'])
+
+        self.assertEqual(seen, self.expected)
+
+    def test_fallbacks(self):
+        """Tests that without a cursor, page numbers are used, or nothing is paginated for the optional paginator"""
+
+        page, response = self._paginate(pagination.CustomKeysetPagination(), { 'page': 2, 'size': 3 })
+
+        self.assertEqual(len(page), 3)
+        self.assertNotIn('X-Next-Cursor', response)
+
+        self.assertIsNone(pagination.OptionalKeysetPagination().paginate_queryset(Post.objects.all(), Request(self.factory.get('/api/posts/'))))
+
+    def test_invalid_cursor(self):
+        """Tests that a garbled cursor is a 404 rather than a server error"""
+
+        for cursor in ['garbage', urlsafe_b64encode(b'2021-12-06T06:38:00+00:00|not-a-uuid').decode('ascii')]:
+            with self.assertRaises(NotFound):
+                self._paginate(pagination.CustomKeysetPagination(), { 'cursor': cursor })
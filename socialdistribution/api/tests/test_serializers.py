@@ -0,0 +1,95 @@
+from django.core.cache import caches
+from django.test import TestCase
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from api.serializers import PostSerializer
+from bettersocial.models import Post
+from bettersocial.tests import utils
+
+
+class PostSerializerCacheTests(TestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+
+        caches['serialized_posts'].clear()
+
+        self.factory = APIRequestFactory()
+
+        self.author = utils.create_test_user().author
+        self.post = utils.create_test_post(self.author)
+
+    def _serialize(self, post: Post, host: str = 'testserver'):
+        return PostSerializer(post, context = { 'request': Request(self.factory.get('/', HTTP_HOST = host)) }).data
+
+    def test_cached(self):
+        """Tests that serializing an unchanged post again is served from the cache, with links (but not the author's text) patched for another host"""
+
+        self.post.content = 'See http://testserver/api/authors/'
+        self.post.save()
+
+        utils.create_test_comment(self.author.uuid, self.post)
+        self.post.refresh_from_db()
+
+        post_json = self._serialize(self.post)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self._serialize(self.post), post_json)
+
+            other_json = self._serialize(self.post, host = 'other.example.com')
+
+        self.assertEqual(other_json['id'], post_json['id'].replace('http://testserver/', 'http://other.example.com/'))
+        self.assertEqual(other_json['author']['host'], 'http://other.example.com/api/')
+        self.assertEqual(other_json['commentsSrc']['id'], other_json['comments'])
+        self.assertEqual(other_json['commentsSrc']['comments'][0]['author']['id'], post_json['author']['id'].replace('http://testserver/', 'http://other.example.com/'))
+        self.assertTrue(other_json['commentsSrc']['comments'][0]['id'].startswith('http://other.example.com/'))
+        self.assertEqual(other_json['content'], 'See http://testserver/api/authors/')
+
+    def test_versions(self):
+        """Tests that edits, new comments and author changes all show up rather than the cached copy"""
+
+        self._serialize(self.post)
+
+        # The instance that was saved is serialized as it is now, without reloading it
+        self.post.title = 'Edited'
+        self.post.save()
+
+        self.assertEqual(self._serialize(self.post)['title'], 'Edited')
+
+        utils.create_test_comment(self.author.uuid, self.post)
+        self.post.refresh_from_db()
+
+        self.assertEqual(self._serialize(self.post)['count'], 1)
+
+        self.author.user.first_name = 'Renamed'
+        self.author.user.save()
+        self.post.refresh_from_db()
+
+        self.assertTrue(self._serialize(self.post)['author']['displayName'].startswith('Renamed'))
+
+    def test_stale_save(self):
+        """Tests that saving a stale copy of a post doesn't overwrite counters and the version, which are only ever updated in place"""
+
+        stale = Post.objects.get(pk = self.post.pk)
+
+        utils.create_test_comment(self.author.uuid, self.post)
+        utils.create_test_like(self.author.uuid, self.post)
+
+        stale.title = 'Edited'
+        stale.save()
+
+        self.post.refresh_from_db()
+
+        self.assertEqual((self.post.title, self.post.comment_count, self.post.like_count, self.post.version), ('Edited', 1, 1, 3))
+
+    def test_save_after_delete(self):
+        """Tests that saving a post that was deleted meanwhile saves it again, like any other model, rather than failing"""
+
+        stale = Post.objects.get(pk = self.post.pk)
+        Post.objects.filter(pk = self.post.pk).delete()
+
+        stale.title = 'Edited'
+        stale.save()
+
+        self.assertEqual(Post.objects.get(pk = self.post.pk).title, 'Edited')
@@ -0,0 +1,262 @@
+from datetime import timedelta
+from uuid import uuid4
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType as DjangoContentType
+from django.core.cache import caches
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from api.tests import utils as api_utils
+from bettersocial.models import Comment, InboxItem, Like, OutboxItem, Post, RemoteTombstone
+from bettersocial.tests import utils
+
+
+class SendPostTests(TestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+
+        self.client = APIClient()
+
+        self.author = utils.create_test_user(username = 'poster').author
+        self.post = utils.create_test_post(self.author)
+
+        self.followers = [utils.create_test_user(username = f'follower-{i}').author for i in range(5)]
+        self.remote_uuid = uuid4()
+
+    def test_fan_out(self):
+        """Tests that local followers are written in bulk, and remote ones are queued for the outbox worker"""
+
+        # Django caches this after the first lookup
+        DjangoContentType.objects.get_for_model(Post)
+
+        # The post, its serialization, one recipient lookup and two inserts, however many followers there are
+        with self.assertNumQueries(11):
+            response = self.client.post('/api/send-post/', {
+                'post_uuid': str(self.post.uuid),
+                'author_uuids': [str(f.uuid) for f in self.followers] + [str(self.remote_uuid)],
+            }, format = 'json')
+
+        self.assertEqual(response.status_code, 200)
+
+        self.assertEqual(set(InboxItem.objects.values_list('author_id', flat = True)), {f.uuid for f in self.followers})
+        self.assertEqual(set(InboxItem.objects.values_list('object_uuid', flat = True)), {self.post.uuid})
+
+        self.assertEqual(list(OutboxItem.objects.values_list('recipient_uuid', flat = True)), [self.remote_uuid])
+
+
+class PostQueryCountTests(TestCase):
+    """The number of queries to list posts must not grow with the number of posts or comments"""
+
+    def setUp(self) -> None:
+        super().setUp()
+
+        self.user = utils.create_test_user(username = 'viewer')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+        self.author = utils.create_test_user(username = 'poster').author
+        self.commenters = [utils.create_test_user(username = f'commenter-{i}').author for i in range(3)]
+
+    def _add_posts(self, count: int):
+        for _ in range(count):
+            post = utils.create_test_post(self.author, visibility = Post.Visibility.PUBLIC)
+
+            # More comments than are embedded, from a few different authors
+            for i in range(7):
+                utils.create_test_comment(self.commenters[i % len(self.commenters)].uuid, post)
+
+    def _assert_constant(self, url: str, expected: int):
+        for posts in [1, 4]:
+            self._add_posts(posts)
+
+            with self.assertNumQueries(expected):
+                response = self.client.get(url)
+
+            self.assertEqual(response.status_code, 200)
+
+        return response
+
+    def test_post_view_set(self):
+        """Tests GET author/{uuid}/posts: the ETag, posts, the count, newest comments and their authors"""
+
+        response = self._assert_constant(f'/api/author/{self.author.uuid.hex}/posts/?size=10', 5)
+
+        self.assertEqual(len(response.data), 5)
+        self.assertEqual(response.data[0]['count'], 7)
+        self.assertEqual(len(response.data[0]['commentsSrc']['comments']), 5)
+
+    def test_all_posts_view_set(self):
+        """Tests GET posts: the same, plus the viewer's session"""
+
+        self._assert_constant('/api/posts/', 3)
+
+    def test_comment_view_set(self):
+        """Tests GET author/{uuid}/posts/{uuid}/comments: the ETag, the comments along with their posts, and one query for all of their authors"""
+
+        post = utils.create_test_post(self.author)
+
+        for i in range(6):
+            utils.create_test_comment(self.commenters[i % len(self.commenters)].uuid, post)
+
+        with self.assertNumQueries(3):
+            response = self.client.get(f'/api/author/{self.author.uuid.hex}/posts/{post.uuid.hex}/comments/')
+
+        self.assertEqual(len(response.data['comments']), 6)
+
+
+class InboxInteractionTests(TestCase):
+    """Likes and comments that other nodes send to an inbox are stored and counted on our posts"""
+
+    def setUp(self) -> None:
+        super().setUp()
+
+        self.author = utils.create_test_user(username = 'poster').author
+        self.post = utils.create_test_post(self.author)
+
+        self.client = APIClient()
+        self.client.force_authenticate(self.author.user)
+
+        self.remote_uuid = uuid4()
+        self.remote_author = { 'type': 'author', 'id': f'http://remote.example.com/service/author/{self.remote_uuid.hex}', 'host': 'http://remote.example.com/service/', 'displayName': 'Remote Author' }
+        self.post_id = f'http://testserver/api/author/{self.author.uuid.hex}/posts/{self.post.uuid.hex}'
+
+    def _send(self, inbox_object):
+        response = self.client.post(f'/api/author/{self.author.uuid.hex}/inbox/', inbox_object, format = 'json')
+        self.assertEqual(response.status_code, 201)
+
+    def test_like(self):
+        """Tests that a like on our post is stored once, however many times it arrives"""
+
+        for _ in range(2):
+            self._send({ 'type': 'Like', 'author': self.remote_author, 'object': self.post_id, 'summary': 'Remote Author Likes your post' })
+
+        self.post.refresh_from_db()
+
+        self.assertEqual(self.post.like_count, 1)
+        self.assertEqual(InboxItem.objects.filter(item_type = InboxItem.ItemType.LIKE).count(), 2)
+
+    def test_comment(self):
+        """Tests that a comment on our post is stored under its own UUID"""
+
+        comment_uuid = uuid4()
+
+        self._send({ 'type': 'comment', 'author': self.remote_author, 'comment': 'Nice', 'contentType': 'text/markdown', 'id': f'{self.post_id}/comments/{comment_uuid.hex}' })
+
+        self.post.refresh_from_db()
+
+        self.assertEqual(self.post.comment_count, 1)
+        self.assertEqual(Comment.objects.get(pk = comment_uuid).author_uuid, self.remote_uuid)
+
+    def test_not_ours(self):
+        """Tests that likes on posts that aren't here are only kept in the inbox"""
+
+        self._send({ 'type': 'like', 'author': self.remote_author, 'object': f'http://remote.example.com/service/author/{uuid4().hex}/posts/{uuid4().hex}' })
+
+        self.assertFalse(Like.objects.exists())
+
+
+class RemotePostsTests(TestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+
+        caches['default'].clear()
+
+        self.adapter = api_utils.register_stub_adapter()
+        self.node = api_utils.create_test_node('http://remote-posts.example.com/')
+        self.adapter.nodes[self.node.host] = (0, dict())
+
+        self.author = utils.create_test_user(username = 'reader').author
+
+        self.client = APIClient()
+        self.client.force_authenticate(self.author.user)
+
+        author_json = api_utils.create_test_remote_author_json('http://remote-posts.example.com', uuid4())
+        post_content_type = DjangoContentType.objects.get_for_model(Post)
+
+        self.post_ids = [f'{author_json["id"]}/posts/{uuid4().hex}' for _ in range(3)]
+
+        for post_id, visibility in zip(self.post_ids, [Post.Visibility.PUBLIC, Post.Visibility.PUBLIC, Post.Visibility.FRIENDS]):
+            InboxItem.objects.create(author = self.author, dj_content_type = post_content_type, inbox_object = { 'type': 'post', 'id': post_id, 'visibility': visibility, 'author': author_json })
+
+    def tearDown(self) -> None:
+        api_utils.unregister_stub_adapter()
+
+        super().tearDown()
+
+    def test_deleted_posts(self):
+        """Tests that public posts that were deleted on their node are left out, and that posts are only checked once in a while"""
+
+        self.adapter.post_statuses[self.post_ids[0]] = 404
+
+        for _ in range(2):
+            response = self.client.get('/api/remote-posts/')
+
+            self.assertCountEqual([post['id'] for post in response.data], self.post_ids[1:])
+
+        # Only the public ones are checked, and only the first time
+        self.assertEqual(self.adapter.calls, 2)
+
+    def test_paginated(self):
+        """Tests that a cursor pages through the inbox newest first, and that only the page's posts are checked"""
+
+        response = self.client.get('/api/remote-posts/', { 'cursor': '', 'size': 2 })
+
+        self.assertEqual([post['id'] for post in response.data], self.post_ids[:0:-1])
+        self.assertEqual(self.adapter.calls, 1)
+
+        response = self.client.get('/api/remote-posts/', { 'cursor': response['X-Next-Cursor'], 'size': 2 })
+
+        self.assertEqual([post['id'] for post in response.data], self.post_ids[:1])
+        self.assertNotIn('X-Next-Cursor', response)
+        self.assertEqual(self.adapter.calls, 2)
+
+    def _load(self):
+        # As if the memoized checks had timed out
+        caches['default'].clear()
+
+        return [post['id'] for post in self.client.get('/api/remote-posts/').data]
+
+    def test_deleted_posts_tombstoned(self):
+        """Tests that a deleted post is tombstoned, but still checked until it's still gone after the grace period, and only then left out without being checked"""
+
+        self.adapter.post_statuses[self.post_ids[0]] = 404
+
+        self.assertCountEqual(self._load(), self.post_ids[1:])
+
+        tombstone = RemoteTombstone.objects.get()
+        self.assertEqual(tombstone.object_uuid.hex, self.post_ids[0].rsplit('/', 1)[1])
+        self.assertFalse(RemoteTombstone.objects.confirmed().exists())
+
+        # Not confirmed yet, so it's checked again
+        self._load()
+        self.assertEqual(self.adapter.calls, 4)
+
+        # A day later, it's still gone
+        a_day_ago = tombstone.deleted_at - timedelta(seconds = settings.TOMBSTONE_GRACE_PERIOD)
+        RemoteTombstone.objects.update(deleted_at = a_day_ago, last_seen_at = a_day_ago)
+        self.assertFalse(RemoteTombstone.objects.confirmed().exists())
+
+        self._load()
+        self.assertTrue(RemoteTombstone.objects.confirmed().exists())
+
+        # Confirmed, so it's left out by the database
+        self.assertCountEqual(self._load(), self.post_ids[1:])
+        self.assertEqual(self.adapter.calls, 7)
+
+        # The rows stay until they're purged, but no inbox shows them
+        self.assertEqual(InboxItem.objects.count(), 3)
+        self.assertEqual(InboxItem.objects.exclude_tombstoned().count(), 2)
+
+    def test_post_back(self):
+        """Tests that a post that 404'd once, like one that was briefly not public, loses its tombstone when it's there again"""
+
+        self.adapter.post_statuses[self.post_ids[0]] = 404
+        self._load()
+
+        del self.adapter.post_statuses[self.post_ids[0]]
+
+        self.assertCountEqual(self._load(), self.post_ids)
+        self.assertFalse(RemoteTombstone.objects.exists())
@@ -0,0 +1,216 @@
+import json
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Optional, Union
+from unittest import mock
+from uuid import UUID
+
+import requests
+
+from api import adapters
+from api.adapters import BaseAdapter
+from api.helpers import cache_helpers
+from bettersocial.models import Node
+
+
+def make_response(url: str, status_code: int = 200, json_body: Optional[Dict] = None, method: str = 'GET') -> requests.Response:
+    """
+    Builds a `requests.Response` without touching the network
+    """
+
+    response = requests.Response()
+    response.status_code = status_code
+    response._content = json.dumps(json_body).encode('utf-8') if json_body is not None else b''
+    response.headers['Content-Type'] = 'application/json'
+    response.url = url
+    response.request = requests.Request(method, url).prepare()
+
+    return response
+
+
+RECORDINGS_DIR = Path(__file__).parent / 'recordings'
+
+
+def load_recording(name: str) -> Dict:
+    """
+    Loads `recordings/<name>.json`: responses recorded from a team's node, along with the adapter_id, host and prefix of that node.
+    """
+
+    with open(RECORDINGS_DIR / f'{name}.json') as f:
+        return json.load(f)
+
+
+class Replay:
+    """
+    Answers every request an adapter's session makes from a recording, instead of the network. `requests` lists the (method, url) of each one, so tests can assert how many went out. A request that wasn't recorded fails the test.
+
+    Use as a context manager around the calls to the adapter.
+    """
+
+    def __init__(self, adapter: BaseAdapter, recording: Dict) -> None:
+        super().__init__()
+
+        self.responses = { (r['method'], r['url']): r for r in recording['responses'] }
+        self.requests: List[tuple] = list()
+
+        self._patches = [
+            mock.patch.object(adapter.session, 'request', side_effect = self._answer),
+            # Nothing carried over from other tests
+            mock.patch.object(adapter, 'responses', cache_helpers.ResponseCache()),
+        ]
+
+    def _answer(self, method: str, url: str, **kwargs) -> requests.Response:
+        url = requests.Request(method, url, params = kwargs.get('params')).prepare().url
+        self.requests.append((method, url))
+
+        recorded = self.responses.get((method, url))
+
+        if recorded is None:
+            raise AssertionError(f'No recorded response for {method} {url}')
+
+        return make_response(url, recorded['status'], recorded.get('json'), method)
+
+    def __enter__(self):
+        for patch in self._patches:
+            patch.start()
+
+        return self
+
+    def __exit__(self, *exc_info):
+        for patch in self._patches:
+            patch.stop()
+
+
+class StubAdapter(BaseAdapter):
+    """
+    An adapter that answers from memory after an artificial delay. Each node registered against it is configured with `StubAdapter.nodes[host] = (delay_seconds, {author_uuid: author_json})`. Whatever is sent to an inbox is kept in `StubAdapter.inboxes[author_uuid]`. Checked posts and fetched comments answer with `StubAdapter.post_statuses[url]`, or 200. Fetched posts and comments come from `StubAdapter.posts[url]` and `StubAdapter.comments[url]`. `max_in_flight[host]` is the most requests that were ever made of one node at once.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+
+        self.nodes: Dict[str, tuple] = dict()
+        self.inboxes: Dict[UUID, list] = defaultdict(list)
+        self.post_statuses: Dict[str, int] = dict()
+        self.posts: Dict[str, Dict] = dict()
+        self.comments: Dict[str, list] = dict()
+        self.calls = 0
+        self._calls_lock = threading.Lock()
+
+        self.in_flight: Dict[str, int] = defaultdict(int)
+        self.max_in_flight: Dict[str, int] = defaultdict(int)
+
+    def _answer(self, node, author_uuid: Union[str, UUID], url: str, body_for) -> requests.Response:
+        with self._calls_lock:
+            self.calls += 1
+
+        delay, authors = self.nodes[node.host]
+        time.sleep(delay)
+
+        author_json = authors.get(UUID(str(author_uuid)))
+
+        if author_json is None:
+            return make_response(url, 404)
+
+        return make_response(url, 200, body_for(author_json))
+
+    def get_author(self, node, author_uuid: Union[str, UUID], *args, **kwargs) -> requests.Response:
+        return self._answer(node, author_uuid, self.get_author_url(node, author_uuid), lambda author_json: author_json)
+
+    def send_to_inbox(self, node, author_uuid: Union[str, UUID], post_json: Dict, *args, **kwargs) -> requests.Response:
+        def deliver(author_json):
+            self.inboxes[UUID(str(author_uuid))].append(post_json)
+            return post_json
+
+        return self._answer(node, author_uuid, self.get_inbox_url(node, author_uuid), deliver)
+
+    @contextmanager
+    def _in_flight(self, node):
+        with self._calls_lock:
+            self.calls += 1
+            self.in_flight[node.host] += 1
+            self.max_in_flight[node.host] = max(self.max_in_flight[node.host], self.in_flight[node.host])
+
+        try:
+            time.sleep(self.nodes[node.host][0])
+            yield
+        finally:
+            with self._calls_lock:
+                self.in_flight[node.host] -= 1
+
+    def check_post(self, node, url: str, *args, **kwargs) -> requests.Response:
+        with self._in_flight(node):
+            return make_response(url, self.post_statuses.get(url, 200), method = 'HEAD')
+
+    def get_post(self, node, url: str, *args, **kwargs) -> requests.Response:
+        with self._in_flight(node):
+            return make_response(url, 404) if url not in self.posts else make_response(url, self.post_statuses.get(url, 200), self.posts[url])
+
+    def get_comments(self, node, url: str, *args, **kwargs) -> requests.Response:
+        with self._in_flight(node):
+            return make_response(url, self.post_statuses.get(url, 200), { 'type': 'comments', 'comments': self.comments.get(url, []) })
+
+    def get_followers(self, node, author_uuid: Union[str, UUID], *args, **kwargs):
+        return self._answer(node, author_uuid, self.get_followers_url(node, author_uuid), lambda author_json: { 'type': 'followers', 'items': author_json.get('_followers', []) })
+
+
+def register_stub_adapter(adapter_id: str = 'stub') -> StubAdapter:
+    """
+    Registers a fresh `StubAdapter` under `adapter_id`. Remember to call `unregister_stub_adapter` in tearDown.
+    """
+
+    adapter = StubAdapter()
+    adapters.registered_adapters[adapter_id] = adapter
+
+    return adapter
+
+
+def unregister_stub_adapter(adapter_id: str = 'stub'):
+    adapters.registered_adapters.pop(adapter_id, None)
+
+
+def create_test_node(
+        host: str,
+        adapter_id: str = 'stub',
+        **kwargs
+):
+    """
+    Creates a test Node with some reasonable defaults
+
+    **kwargs are for arguments that have model defaults. These include:
+    - display_name: str
+    - prefix: str
+    - auth_username, auth_password, node_username, node_password: str
+    """
+
+    return Node.objects.create(
+        host = host,
+        adapter_id = adapter_id,
+        auth_username = kwargs.pop('auth_username', f'{host}-in'),
+        auth_password = kwargs.pop('auth_password', 'password-in'),
+        node_username = kwargs.pop('node_username', f'{host}-out'),
+        node_password = kwargs.pop('node_password', 'password-out'),
+        **kwargs
+    )
+
+
+def create_test_remote_author_json(host: str, author_uuid: UUID, **kwargs) -> Dict:
+    """
+    Creates the JSON of a remote author the way a node would return it
+    """
+
+    author_id = f'{host}/service/author/{author_uuid.hex}'
+
+    return {
+        'type': 'author',
+        'id': author_id,
+        'url': author_id,
+        'host': f'{host}/',
+        'displayName': kwargs.pop('displayName', 'Remote Author'),
+        'github': '',
+        'profileImage': None,
+        **kwargs
+    }
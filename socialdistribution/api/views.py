@@ -1,22 +1,19 @@
 from collections import OrderedDict
 from uuid import UUID
 
-import requests
-import yarl
 from django.contrib.auth.models import User
-from django.contrib.contenttypes.models import ContentType as DjangoContentType
-from django.db.models import Q
+from django.db import transaction
 from django.http.response import HttpResponseServerError
-from requests.auth import HTTPBasicAuth
 from rest_framework import viewsets, mixins, permissions
 from rest_framework.exceptions import PermissionDenied, ValidationError, NotFound
 from rest_framework.request import Request
 from rest_framework.response import Response
 from yarl import URL
 
+from api import conditional
 from api import pagination
 from api import serializers
-from api.helpers import uuid_helpers, remote_helpers
+from api.helpers import uuid_helpers, remote_helpers, post_helpers, outbox_helpers, node_helpers
 from api.serializers import PostSerializer
 from bettersocial import models
 from bettersocial.models import Post, InboxItem, Node, Author, Follower
@@ -24,7 +21,7 @@ from bettersocial.models import Post, InboxItem, Node, Author, Follower
 
 # -- API SPEC -- #
 
-class AuthorViewSet(viewsets.GenericViewSet, mixins.RetrieveModelMixin, mixins.ListModelMixin, mixins.UpdateModelMixin):
+class AuthorViewSet(conditional.ConditionalGetMixin, viewsets.GenericViewSet, mixins.RetrieveModelMixin, mixins.ListModelMixin, mixins.UpdateModelMixin):
     queryset = models.Author.objects.all()
     serializer_class = serializers.AuthorSerializer
     pagination_class = pagination.CustomPageNumberPagination
@@ -47,7 +44,7 @@ class AuthorViewSet(viewsets.GenericViewSet, mixins.RetrieveModelMixin, mixins.L
         return response
 
 
-class FollowerViewSet(viewsets.GenericViewSet, mixins.RetrieveModelMixin, mixins.ListModelMixin, mixins.UpdateModelMixin, mixins.DestroyModelMixin):
+class FollowerViewSet(conditional.ConditionalGetMixin, viewsets.GenericViewSet, mixins.RetrieveModelMixin, mixins.ListModelMixin, mixins.UpdateModelMixin, mixins.DestroyModelMixin):
     queryset = Follower.objects.none()
     serializer_class = serializers.AuthorSerializer
 
@@ -158,19 +155,31 @@ class FollowerViewSet(viewsets.GenericViewSet, mixins.RetrieveModelMixin, mixins
             raise ValidationError({ 'message': 'Follower does not exist' })
 
 
-class PostViewSet(viewsets.GenericViewSet, mixins.RetrieveModelMixin, mixins.ListModelMixin):
+class PostViewSet(conditional.ConditionalGetMixin, viewsets.GenericViewSet, mixins.RetrieveModelMixin, mixins.ListModelMixin):
     serializer_class = serializers.PostSerializer
-    pagination_class = pagination.CustomPageNumberPagination
+    pagination_class = pagination.CustomKeysetPagination
 
     def get_queryset(self):
-        return models.Post.objects.filter(author__uuid = self.kwargs['author_pk'], visibility = Post.Visibility.PUBLIC).all()
+        return models.Post.objects.filter(author__uuid = self.kwargs['author_pk'], visibility = Post.Visibility.PUBLIC).select_related('author__user')
+
+    def get_validator(self, request):
+        if self.action == 'retrieve':
+            return conditional.validator_of_row(self.get_queryset().filter(pk = self.kwargs['pk']))
 
+        return conditional.validator_of_rows(self.get_queryset())
 
-class CommentViewSet(viewsets.GenericViewSet, mixins.RetrieveModelMixin, mixins.ListModelMixin):
+
+class CommentViewSet(conditional.ConditionalGetMixin, viewsets.GenericViewSet, mixins.RetrieveModelMixin, mixins.ListModelMixin):
     serializer_class = serializers.CommentSerializer
+    pagination_class = pagination.OptionalKeysetPagination
 
     def get_queryset(self):
-        return models.Comment.objects.filter(post__uuid = self.kwargs['post_pk']).order_by('-published').all()
+        # The comment's id links through its post's author
+        return models.Comment.objects.filter(post__uuid = self.kwargs['post_pk']).select_related('post__author').order_by('-published')
+
+    def get_validator(self, request):
+        # Adding or removing a comment bumps its post's version
+        return conditional.validator_of_row(models.Post.objects.filter(pk = self.kwargs['post_pk']))
 
     def list(self, request, *args, **kwargs):
         """
@@ -193,10 +202,10 @@ class CommentViewSet(viewsets.GenericViewSet, mixins.RetrieveModelMixin, mixins.
 class InboxItemViewSet(viewsets.GenericViewSet, mixins.ListModelMixin, mixins.CreateModelMixin):
     serializer_class = serializers.InboxItemSerializer
     permission_classes = [permissions.IsAuthenticated]
-    pagination_class = pagination.CustomPageNumberPagination
+    pagination_class = pagination.CustomKeysetPagination
 
     def get_queryset(self):
-        return InboxItem.objects.filter(author_id = self.kwargs['author_pk']).all()
+        return InboxItem.objects.filter(author_id = self.kwargs['author_pk']).exclude_tombstoned()
 
     def get_serializer_context(self):
         context = super().get_serializer_context()
@@ -252,6 +261,7 @@ class AllRemotePostsViewSet(viewsets.GenericViewSet, mixins.ListModelMixin):
     queryset = Post.objects.none()
     permission_classes = [permissions.IsAuthenticated]
     serializer_class = serializers.PostSerializer
+    pagination_class = pagination.OptionalKeysetPagination
 
     def list(self, request, *args, **kwargs):
         """
@@ -262,37 +272,35 @@ class AllRemotePostsViewSet(viewsets.GenericViewSet, mixins.ListModelMixin):
         if not isinstance(request.user, User):
             raise PermissionDenied({ 'message': "You must be authenticated as a user to get post items this way!" })
 
-        data = list()
-
-        # Dirtiest hack but hey it works
-        queryset = InboxItem.objects.filter(author = request.user.author, inbox_object__iregex = '"type": "post"').all()
+        # Posts known to be deleted for good are left out by the database, so they're never checked again
+        items = InboxItem.objects.filter(author = request.user.author, item_type = InboxItem.ItemType.POST).exclude_tombstoned().order_by('-published', '-pk')
 
-        for item in queryset:
+        # Only paginated when a cursor is given, so only that page's posts get checked below. A page can come back short if some of them turn out to be deleted.
+        page = self.paginate_queryset(items)
 
-            if item.inbox_object['visibility'] == Post.Visibility.PUBLIC:
+        data = [item.inbox_object for item in (page if page is not None else items)]
 
-                host = yarl.URL(item.inbox_object['author']['host']).origin().human_repr()
+        # Public posts may have been deleted since they were sent, so they're checked (concurrently, and memoized) before they're shown
+        public_posts = [(post, URL(post.get('url', post['id'])).human_repr()) for post in data if post['visibility'] == Post.Visibility.PUBLIC]
 
-                node = Node.objects.filter(host__contains = host).get()
+        probes = list()
 
-                try:
-                    url = item.inbox_object['url']
-                except KeyError:
-                    url = item.inbox_object['id']
+        for post, url in public_posts:
+            node = node_helpers.node_for_url(post['author']['host'])
 
-                response = requests.head(
-                    URL(url).human_repr(),
-                    headers = { 'Accept': 'application/json' },
-                    auth = HTTPBasicAuth(node.node_username, node.node_password),
-                )
+            if node is not None:
+                probes.append((post, node, url))
 
-                print(f'Inbox checking: {response.status_code} -- {response.request.url}')
+        alive = remote_helpers.posts_alive(((node, url) for post, node, url in probes), unknown = None)
 
-                # If the response to a public post comes back as 404 that means it was deleted, so the inbox item is invalid, so don't return it.
-                if response.status_code == 404:
-                    continue
+        # If the response to a public post comes back as 404 that means it was deleted, so the inbox item is invalid, so don't return it.
+        dead = [(post, node) for post, node, url in probes if alive.get(url) is False]
+        dead_ids = { id(post) for post, node in dead }
+        data = [post for post in data if id(post) not in dead_ids]
 
-            data.append(item.inbox_object)
+        # ...and it's tombstoned. Once it's still gone a while later, it's not checked again, and its row gets purged (see RemoteTombstone). Posts that are there after all lose theirs.
+        remote_helpers.tombstone_posts((node, uuid_helpers.extract_post_uuid_from_id(post['id'])) for post, node in dead)
+        remote_helpers.revive_posts(uuid_helpers.extract_post_uuid_from_id(post['id']) for post, node, url in probes if alive.get(url))
 
         for post in data:
             # Make post UUID available in _uuid
@@ -301,6 +309,9 @@ class AllRemotePostsViewSet(viewsets.GenericViewSet, mixins.ListModelMixin):
             # Make author UUID available in author._uuid
             post['author']['_uuid'] = uuid_helpers.extract_author_uuid_from_id(post['author']['id']).hex
 
+        if page is not None:
+            return self.get_paginated_response(data)
+
         return Response(data)
 
 
@@ -309,6 +320,7 @@ class AllPostsViewSet(viewsets.GenericViewSet, mixins.ListModelMixin):
 
     permission_classes = [permissions.IsAuthenticated]
     serializer_class = serializers.PostSerializer
+    pagination_class = pagination.OptionalKeysetPagination
 
     def list(self, request, *args, **kwargs):
         """
@@ -333,14 +345,7 @@ class AllPostsViewSet(viewsets.GenericViewSet, mixins.ListModelMixin):
         return response
 
     def get_queryset(self):
-
-        author_uuid = self.kwargs['author_uuid']
-
-        return Post.objects.filter(
-            (Q(visibility = Post.Visibility.PUBLIC)) |
-            (Q(visibility = Post.Visibility.FRIENDS) & Q(author__follower__follower_uuid = author_uuid) & Q(author__following__following_uuid = author_uuid)) |
-            (Q(visibility = Post.Visibility.PRIVATE) & Q(recipient_uuid = author_uuid))
-        ).distinct().order_by('-published')
+        return post_helpers.visible_posts(self.kwargs['author_uuid']).select_related('author__user')
 
 
 class SendPostRemoteViewSet(viewsets.GenericViewSet, mixins.CreateModelMixin):
@@ -348,32 +353,20 @@ class SendPostRemoteViewSet(viewsets.GenericViewSet, mixins.CreateModelMixin):
     serializer_class = serializers.RemotePostSerializer
 
     def create(self, request: Request, *args, **kwargs):
-        # output_json = serializers.PostSerializer(Post.objects.first(), context = {'request': self.request}).data
-
-        post_json = PostSerializer(Post.objects.filter(uuid = request.data['post_uuid']).get(), context = { 'request': request }).data
-        author_uuids = request.data['author_uuids']
-
-        for author_uuid in author_uuids:
-
-            if isinstance(author_uuid, str):
-                author_uuid = UUID(author_uuid)
-
-            try:
-                local_author = Author.objects.filter(uuid = author_uuid).get()
-
-                # Save to local user's inbox
-                InboxItem.objects.create(author = local_author, dj_content_type = DjangoContentType.objects.get_for_model(Post), inbox_object = post_json)
+        """
+        POST {host_url}/send-post
 
-            # Author is remote, send to inbox
-            except Author.DoesNotExist:
+        Sends a local post to the inboxes of the given authors. Local inboxes are written right away, in one insert; remote ones are queued for the deliver_outbox worker.
+        """
+        post = Post.objects.filter(uuid = request.data['post_uuid']).get()
 
-                # Find and cache author
-                remote_helpers.find_remote_author(author_uuid)
-                node = remote_helpers.get_node_of_uuid(author_uuid)
+        # Serialized once, for every recipient
+        post_json = PostSerializer(post, context = { 'request': request }).data
 
-                # Send to inbox -- not much we can do if it fails.
-                response = node.adapter.send_to_inbox(node, author_uuid, post_json = post_json)
+        local_uuids, remote_uuids = outbox_helpers.split_recipients(request.data['author_uuids'])
 
-                print(f'POST remote inbox for {author_uuid} ({node.display_name}): {response}\n')
+        with transaction.atomic():
+            outbox_helpers.insert_into_local_inboxes((author_uuid, post_json) for author_uuid in local_uuids)
+            outbox_helpers.enqueue_post(post, post_json, remote_uuids)
 
         return Response(request.data)
@@ -1,6 +1,6 @@
 from django.contrib import admin
 
-from .models import Author, Post, Comment, Like, LikedRemote, Follower, Following, InboxItem, Node, UUIDRemoteCache
+from .models import Author, Post, Comment, Like, LikedRemote, Follower, Following, Friendship, InboxItem, OutboxItem, Node, UUIDRemoteCache, RemoteAuthor, RemoteTombstone
 
 admin.site.register(Author)
 admin.site.register(Post)
@@ -11,9 +11,13 @@ admin.site.register(LikedRemote)
 
 admin.site.register(Follower)
 admin.site.register(Following)
+admin.site.register(Friendship)
 
 admin.site.register(InboxItem)
+admin.site.register(OutboxItem)
 
 admin.site.register(Node)
 
 admin.site.register(UUIDRemoteCache)
+admin.site.register(RemoteAuthor)
+admin.site.register(RemoteTombstone)
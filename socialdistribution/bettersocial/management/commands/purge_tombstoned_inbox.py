@@ -0,0 +1,44 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from bettersocial.models import InboxItem, RemoteTombstone
+
+
+def purge_tombstoned(batch_size: int) -> int:
+    """Deletes the inbox rows of every post whose tombstone is confirmed, `batch_size` rows at a time, and returns how many there were"""
+
+    tombstoned = InboxItem.objects.filter(item_type = InboxItem.ItemType.POST, object_uuid__in = RemoteTombstone.objects.confirmed().values('object_uuid'))
+
+    purged = 0
+
+    while True:
+        # Short deletes by primary key rather than one long one, so inboxes can still be written to meanwhile
+        batch = list(tombstoned.values_list('pk', flat = True)[:batch_size])
+
+        if not batch:
+            return purged
+
+        purged += InboxItem.objects.filter(pk__in = batch).delete()[0]
+
+
+class Command(BaseCommand):
+    help = 'Deletes the inbox rows of remote posts that were found to be deleted for good on their node (see RemoteTombstone), then waits for the next round. Runs until stopped, unless --once is given.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action = 'store_true', help = 'Purge once, then exit')
+        parser.add_argument('--batch-size', type = int, default = None, help = 'Rows deleted at a time (defaults to TOMBSTONE_PURGE_BATCH_SIZE)')
+        parser.add_argument('--interval', type = float, default = None, help = 'Seconds between rounds (defaults to TOMBSTONE_PURGE_INTERVAL)')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size'] or settings.TOMBSTONE_PURGE_BATCH_SIZE
+        interval = options['interval'] if options['interval'] is not None else settings.TOMBSTONE_PURGE_INTERVAL
+
+        while True:
+            self.stdout.write(f'Purged {purge_tombstoned(batch_size)} tombstoned inbox items')
+
+            if options['once']:
+                return
+
+            time.sleep(interval)
@@ -0,0 +1,58 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
+
+from bettersocial.models import Follower, Following, Friendship
+
+
+class Command(BaseCommand):
+    help = 'Backfills the Friendship table from Follower/Following, or with --verify, only reports where the two disagree.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verify', action = 'store_true', help = 'Only check the table against Follower/Following. Exits with an error if they disagree.')
+        parser.add_argument('--batch-size', type = int, default = 1000)
+
+    def handle(self, *args, **options):
+        expected = set(
+            Following.objects.filter(
+                Exists(Follower.objects.filter(author_id = OuterRef('author_id'), follower_uuid = OuterRef('following_uuid')))
+            ).values_list('author_id', 'following_uuid').iterator()
+        )
+
+        actual = set(Friendship.objects.values_list('author_id', 'friend_uuid').iterator())
+
+        missing = expected - actual
+        extra = actual - expected
+
+        self.stdout.write(f'{len(expected)} friendships expected, {len(actual)} stored: {len(missing)} missing, {len(extra)} extra')
+
+        if options['verify']:
+            for author_id, friend_uuid in sorted(missing, key = str):
+                self.stdout.write(f'  missing: {author_id} -> {friend_uuid}')
+
+            for author_id, friend_uuid in sorted(extra, key = str):
+                self.stdout.write(f'  extra: {author_id} -> {friend_uuid}')
+
+            if missing or extra:
+                raise CommandError('The Friendship table does not match Follower/Following! Run this command without --verify to repair it.')
+
+            return
+
+        with transaction.atomic():
+            Friendship.objects.bulk_create(
+                [Friendship(author_id = author_id, friend_uuid = friend_uuid) for author_id, friend_uuid in missing],
+                batch_size = options['batch_size'],
+                ignore_conflicts = True
+            )
+
+            extra = list(extra)
+
+            for i in range(0, len(extra), options['batch_size']):
+                query = Q()
+
+                for author_id, friend_uuid in extra[i:i + options['batch_size']]:
+                    query |= Q(author_id = author_id, friend_uuid = friend_uuid)
+
+                Friendship.objects.filter(query).delete()
+
+        self.stdout.write(self.style.SUCCESS('Friendship table rebuilt.'))
@@ -0,0 +1,49 @@
+from django.contrib.contenttypes.models import ContentType as DjangoContentType
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count, IntegerField, OuterRef, Subquery, F
+from django.db.models.functions import Coalesce
+
+from bettersocial.models import Comment, Like, Post
+
+
+def _count(queryset, field):
+    """A subquery counting the rows of the queryset that match on field"""
+
+    return Coalesce(Subquery(queryset.order_by().values(field).annotate(count = Count('*')).values('count'), output_field = IntegerField()), 0)
+
+
+class Command(BaseCommand):
+    help = 'Recounts like_count and comment_count from the Like and Comment tables and repairs any that drifted, or with --verify, only reports them.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verify', action = 'store_true', help = 'Only check the counters. Exits with an error if any are wrong.')
+
+    def handle(self, *args, **options):
+        counters = [
+            (Post, 'comment_count', _count(Comment.objects.filter(post_id = OuterRef('pk')), 'post_id')),
+            (Post, 'like_count', _count(Like.objects.filter(dj_content_type = DjangoContentType.objects.get_for_model(Post), dj_object_uuid = OuterRef('pk')), 'dj_object_uuid')),
+            (Comment, 'like_count', _count(Like.objects.filter(dj_content_type = DjangoContentType.objects.get_for_model(Comment), dj_object_uuid = OuterRef('pk')), 'dj_object_uuid')),
+        ]
+
+        drifted = 0
+
+        for model, field, expected in counters:
+            with transaction.atomic():
+                wrong = model.objects.annotate(expected = expected).exclude(**{ field: F('expected') })
+
+                if options['verify']:
+                    for pk, stored, actual in wrong.values_list('pk', field, 'expected'):
+                        self.stdout.write(f'  {model.__name__} {pk}: {field} is {stored}, should be {actual}')
+
+                    count = wrong.count()
+                else:
+                    # Recounted in the UPDATE itself, so that likes landing meanwhile aren't lost
+                    count = model.objects.filter(pk__in = list(wrong.values_list('pk', flat = True))).update(**{ field: expected })
+
+            drifted += count
+
+            self.stdout.write(f'{model.__name__}.{field}: {count} {"wrong" if options["verify"] else "repaired"}')
+
+        if options['verify'] and drifted:
+            raise CommandError('Some counters are wrong! Run this command without --verify to repair them.')
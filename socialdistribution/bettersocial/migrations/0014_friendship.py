@@ -0,0 +1,41 @@
+# Generated by Django 3.2.8 on 2026-10-18 08:41
+
+from django.db import migrations, models
+from django.db.models import Exists, OuterRef
+import django.db.models.deletion
+
+
+def backfill_friendships(apps, schema_editor):
+    Follower = apps.get_model('bettersocial', 'Follower')
+    Following = apps.get_model('bettersocial', 'Following')
+    Friendship = apps.get_model('bettersocial', 'Friendship')
+
+    mutual = Following.objects.filter(
+        Exists(Follower.objects.filter(author_id = OuterRef('author_id'), follower_uuid = OuterRef('following_uuid')))
+    ).values_list('author_id', 'following_uuid')
+
+    Friendship.objects.bulk_create([Friendship(author_id = author_id, friend_uuid = friend_uuid) for author_id, friend_uuid in mutual.iterator()], batch_size = 1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bettersocial', '0013_t7_adapter'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Friendship',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('friend_uuid', models.UUIDField()),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='bettersocial.author')),
+            ],
+            options={
+                'verbose_name': 'Friendship',
+                'verbose_name_plural': 'Friendships',
+                'unique_together': {('author', 'friend_uuid')},
+            },
+        ),
+        migrations.RunPython(backfill_friendships, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 3.2.8 on 2026-10-18 08:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bettersocial', '0014_friendship'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='friendship',
+            index=models.Index(fields=['friend_uuid', 'author'], name='bettersocia_friend__739854_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['visibility', '-published'], name='bettersocia_visibil_72ab27_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['author', 'visibility', '-published'], name='bettersocia_author__e38861_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['recipient_uuid'], name='bettersocia_recipie_90fbd8_idx'),
+        ),
+    ]
@@ -0,0 +1,153 @@
+# Generated by Django 3.2.8 on 2026-10-18 08:49
+
+import re
+from uuid import UUID
+
+from django.db import migrations, models
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+import django.utils.timezone
+import yarl
+
+
+# A frozen copy of api.helpers.inbox_helpers.derived_fields (and the uuid_helpers it uses) as of this migration, so that later changes to them can't change what this backfills
+
+UUID_MATCH_STRING = r'[0-9a-fA-F]{8}-?[0-9a-fA-F]{4}-?[0-9a-fA-F]{4}-?[0-9a-fA-F]{4}-?[0-9a-fA-F]{12}'
+
+_ANY_UUID = re.compile(UUID_MATCH_STRING)
+_AUTHOR_ID = re.compile(fr'http.*?authors?/({UUID_MATCH_STRING})/?')
+_POST_ID = re.compile(fr'http.*?authors?/.*?/posts/({UUID_MATCH_STRING})/?')
+
+ITEM_TYPES = ('post', 'comment', 'like', 'follow')
+
+
+def _first_uuid(pattern, id):
+    match = pattern.search(id)
+
+    return UUID(match.group(1)) if match is not None else None
+
+
+def _last_uuid(id):
+    matches = _ANY_UUID.findall(id)
+
+    return UUID(matches[-1]) if matches else None
+
+
+def _origin(url):
+    if not url or not isinstance(url, str):
+        return ''
+
+    try:
+        return yarl.URL(url).origin().human_repr().rstrip('/')
+    except ValueError:
+        return ''
+
+
+def _published(value):
+    try:
+        published = parse_datetime(value) if isinstance(value, str) else None
+    except ValueError:
+        return None
+
+    if published is None:
+        return None
+
+    if timezone.is_naive(published):
+        published = timezone.make_aware(published, timezone.utc)
+
+    return published
+
+
+def _object_uuid(item_type, inbox_object):
+    try:
+        if item_type == 'post':
+            return _first_uuid(_POST_ID, inbox_object['id'])
+
+        if item_type == 'comment':
+            return _last_uuid(inbox_object['id'])
+
+        if item_type == 'like':
+            return _last_uuid(inbox_object['object'])
+
+        if item_type == 'follow':
+            return _first_uuid(_AUTHOR_ID, inbox_object['actor']['id'])
+
+    except (KeyError, TypeError):
+        pass
+
+    return None
+
+
+def derived_fields(inbox_object):
+    if not isinstance(inbox_object, dict):
+        inbox_object = dict()
+
+    item_type = str(inbox_object.get('type', '')).strip().lower()
+
+    if item_type not in ITEM_TYPES:
+        item_type = ''
+
+    sender = inbox_object.get('actor') if item_type == 'follow' else inbox_object.get('author')
+    sender = sender if isinstance(sender, dict) else dict()
+
+    return {
+        'item_type': item_type,
+        'object_uuid': _object_uuid(item_type, inbox_object),
+        'origin_host': _origin(sender.get('host')) or _origin(sender.get('id')) or _origin(inbox_object.get('id')),
+        'published': _published(inbox_object.get('published')),
+    }
+
+
+def backfill_inbox_item_columns(apps, schema_editor):
+    InboxItem = apps.get_model('bettersocial', 'InboxItem')
+
+    fields = ['item_type', 'object_uuid', 'origin_host', 'published']
+    batch = list()
+
+    for inbox_item in InboxItem.objects.iterator():
+        for field, value in derived_fields(inbox_item.inbox_object).items():
+            if field != 'published' or value is not None:
+                setattr(inbox_item, field, value)
+
+        batch.append(inbox_item)
+
+        if len(batch) >= 1000:
+            InboxItem.objects.bulk_update(batch, fields)
+            batch = list()
+
+    InboxItem.objects.bulk_update(batch, fields)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bettersocial', '0015_visibility_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='inboxitem',
+            name='item_type',
+            field=models.CharField(blank=True, choices=[('post', 'Post'), ('comment', 'Comment'), ('like', 'Like'), ('follow', 'Follow')], max_length=16),
+        ),
+        migrations.AddField(
+            model_name='inboxitem',
+            name='object_uuid',
+            field=models.UUIDField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='inboxitem',
+            name='origin_host',
+            field=models.CharField(blank=True, db_index=True, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='inboxitem',
+            name='published',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddIndex(
+            model_name='inboxitem',
+            index=models.Index(fields=['author', 'item_type', '-published'], name='bettersocia_author__77e047_idx'),
+        ),
+        migrations.RunPython(backfill_inbox_item_columns, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 3.2.8 on 2026-10-18 08:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bettersocial', '0016_inbox_item_columns'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['post', '-published'], name='bettersocia_post_id_7090ea_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='inboxitem',
+            index=models.Index(fields=['author', '-published'], name='bettersocia_author__ee4bb2_idx'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 3.2.8 on 2026-10-18 08:54
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bettersocial', '0017_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutboxItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('recipient_uuid', models.UUIDField()),
+                ('post_json', models.JSONField(default=dict)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('failed', 'Failed')], default='pending', max_length=16)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('next_attempt_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('last_error', models.TextField(blank=True)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='bettersocial.post')),
+            ],
+            options={
+                'verbose_name': 'OutboxItem',
+                'verbose_name_plural': 'OutboxItem',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='outboxitem',
+            index=models.Index(fields=['status', 'next_attempt_at'], name='bettersocia_status_9f756e_idx'),
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 3.2.8 on 2026-10-18 08:58
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def _count(queryset, field):
+    """A subquery counting the rows of the queryset that match on field"""
+
+    return Coalesce(Subquery(queryset.order_by().values(field).annotate(count = Count('*')).values('count'), output_field = IntegerField()), 0)
+
+
+def backfill_counts(apps, schema_editor):
+    ContentType = apps.get_model('contenttypes', 'ContentType')
+    Post = apps.get_model('bettersocial', 'Post')
+    Comment = apps.get_model('bettersocial', 'Comment')
+    Like = apps.get_model('bettersocial', 'Like')
+
+    Post.objects.update(comment_count = _count(Comment.objects.filter(post_id = OuterRef('pk')), 'post_id'))
+
+    for model in [Post, Comment]:
+        content_type = ContentType.objects.filter(app_label = 'bettersocial', model = model._meta.model_name).first()
+
+        # No content type yet means nothing has been liked
+        if content_type:
+            model.objects.update(like_count = _count(Like.objects.filter(dj_content_type = content_type, dj_object_uuid = OuterRef('pk')), 'dj_object_uuid'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('bettersocial', '0018_outbox_item'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='like_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='comment_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='like_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_counts, migrations.RunPython.noop),
+    ]
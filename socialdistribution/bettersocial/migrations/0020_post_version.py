@@ -0,0 +1,18 @@
+# Generated by Django 3.2.8 on 2026-10-18 09:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bettersocial', '0019_like_and_comment_counts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='version',
+            field=models.PositiveIntegerField(default=1, editable=False),
+        ),
+    ]
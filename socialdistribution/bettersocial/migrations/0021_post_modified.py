@@ -0,0 +1,27 @@
+# Generated by Django 3.2.8 on 2026-10-18 11:20
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def backfill_modified(apps, schema_editor):
+    """Nothing has a better guess for when an existing post last changed than when it was published"""
+
+    Post = apps.get_model('bettersocial', 'Post')
+    Post.objects.update(modified = F('published'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bettersocial', '0020_post_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='modified',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.RunPython(backfill_modified, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 3.2.8 on 2026-10-18 09:12
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bettersocial', '0021_post_modified'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RemoteAuthor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('uuid', models.UUIDField()),
+                ('display_name', models.CharField(blank=True, max_length=255)),
+                ('author_json', models.JSONField(default=dict)),
+                ('fetched_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('node', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='bettersocial.node')),
+            ],
+            options={
+                'verbose_name': 'Remote Author',
+                'verbose_name_plural': 'Remote Authors',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='remoteauthor',
+            index=models.Index(fields=['uuid'], name='bettersocia_uuid_48bdc0_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='remoteauthor',
+            index=models.Index(fields=['node', 'display_name'], name='bettersocia_node_id_5ce581_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='remoteauthor',
+            unique_together={('node', 'uuid')},
+        ),
+    ]
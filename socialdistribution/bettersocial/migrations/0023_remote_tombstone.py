@@ -0,0 +1,28 @@
+# Generated by Django 3.2.8 on 2026-10-18 09:16
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bettersocial', '0022_remote_author'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RemoteTombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('object_uuid', models.UUIDField(unique=True)),
+                ('deleted_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('node', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='bettersocial.node')),
+            ],
+            options={
+                'verbose_name': 'Remote Tombstone',
+                'verbose_name_plural': 'Remote Tombstones',
+            },
+        ),
+    ]
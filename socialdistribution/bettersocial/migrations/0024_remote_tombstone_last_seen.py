@@ -0,0 +1,28 @@
+# Generated by Django 3.2.8 on 2026-10-18 09:30
+
+from django.db import migrations, models
+from django.db.models import F
+import django.utils.timezone
+
+
+def backfill_last_seen_at(apps, schema_editor):
+    """Existing tombstones were written on a single 404, so they start over as unconfirmed"""
+
+    RemoteTombstone = apps.get_model('bettersocial', 'RemoteTombstone')
+    RemoteTombstone.objects.update(last_seen_at = F('deleted_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bettersocial', '0023_remote_tombstone'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='remotetombstone',
+            name='last_seen_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.RunPython(backfill_last_seen_at, migrations.RunPython.noop),
+    ]
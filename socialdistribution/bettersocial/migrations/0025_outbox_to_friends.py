@@ -0,0 +1,23 @@
+# Generated by Django 3.2.8 on 2026-10-18 09:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bettersocial', '0024_remote_tombstone_last_seen'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='outboxitem',
+            name='to_friends',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AlterField(
+            model_name='outboxitem',
+            name='recipient_uuid',
+            field=models.UUIDField(blank=True, null=True),
+        ),
+    ]
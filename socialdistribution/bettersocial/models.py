@@ -1,15 +1,19 @@
 import uuid as uuid
+from datetime import timedelta
 from uuid import UUID
 
+from django.conf import settings
 from django.contrib.auth.base_user import AbstractBaseUser
 from django.contrib.auth.models import User
 from django.contrib.contenttypes.fields import GenericForeignKey, GenericRelation
 from django.contrib.contenttypes.models import ContentType as DjangoContentType
 from django.db import models
+from django.utils import timezone
 from markdownx.models import MarkdownxField
 
 from api import adapters
 from api.adapters import BaseAdapter
+from api.helpers import inbox_helpers
 from .validators import validate_categories
 
 
@@ -71,7 +75,7 @@ class Author(models.Model):
         return f'{self.user.first_name} {self.user.last_name}'
 
     def friends_with(self, author_uuid: UUID) -> bool:
-        return self.following_set.filter(following_uuid = author_uuid).exists() and self.follower_set.filter(follower_uuid = author_uuid).exists()
+        return self.friendship_set.filter(friend_uuid = author_uuid).exists()
 
     def __str__(self):
         return str(self.user.first_name) + ' ' + str(self.user.last_name)
@@ -138,9 +142,25 @@ class Likeable(models.Model):
     # Defines the reverse of the relationship so any likeable model can go .objects.likes.all() or something similar
     like_set = GenericRelation(Like, object_id_field = 'dj_object_uuid', content_type_field = 'dj_content_type')
 
+    # Denormalized like_set.count(), kept up to date by the Like signals (see bettersocial.signals). Repair with the reconcile_counts command.
+    like_count = models.PositiveIntegerField(default = 0, editable = False)
+
+    # Fields only ever changed with UPDATE ... F(). They're reloaded right before the object is saved, so a stale copy doesn't write back old counts.
+    update_only_fields = ('like_count',)
+
     class Meta:
         abstract = True
 
+    def save(self, *args, **kwargs):
+        if not self._state.adding and not kwargs.get('force_insert') and kwargs.get('update_fields') is None:
+            try:
+                self.refresh_from_db(fields = self.update_only_fields)
+            except self.DoesNotExist:
+                # Deleted meanwhile, so it's saved (inserted) as it is, like any other model
+                pass
+
+        super().save(*args, **kwargs)
+
 
 class Post(Likeable):
     """Represents a post made by a user. Can have multiple types and has visibility settings"""
@@ -185,10 +205,28 @@ class Post(Likeable):
     # Automatically sets the time to now on add and does not allow updates to it -- https://docs.djangoproject.com/en/3.2/ref/models/fields/#django.db.models.DateField.auto_now_add
     published = models.DateTimeField(auto_now_add = True)
 
+    # Denormalized comments.count(), kept up to date by the Comment signals, same as like_count
+    comment_count = models.PositiveIntegerField(default = 0, editable = False)
+
+    # Bumped whenever anything in the post's JSON changes (see bettersocial.signals), which is what keys its cached JSON (see api.helpers.cache_helpers)
+    version = models.PositiveIntegerField(default = 1, editable = False)
+
+    # When the post's JSON last changed. Set on every save, and by the same updates that bump the version.
+    modified = models.DateTimeField(auto_now = True)
+
+    update_only_fields = ('like_count', 'comment_count', 'version')
+
     class Meta:
         verbose_name = 'Post'
         verbose_name_plural = 'Posts'
 
+        # Each branch of the visibility query (see api.helpers.post_helpers.visible_posts) gets its own index
+        indexes = [
+            models.Index(fields = ['visibility', '-published']),
+            models.Index(fields = ['author', 'visibility', '-published']),
+            models.Index(fields = ['recipient_uuid']),
+        ]
+
     def get_content_type(self) -> ContentType:
         """Gets the ContentType object of the current type (includes both value and label). This exists because the content_type field would only return the value, and you might want the label."""
 
@@ -228,6 +266,10 @@ class Comment(Likeable, LocalAuthorMixin):
         verbose_name = 'Comment'
         verbose_name_plural = 'Comments'
 
+        indexes = [
+            models.Index(fields = ['post', '-published']),
+        ]
+
     def get_content_type(self) -> ContentType:
         """Gets the ContentType object of the current type (includes both value and label). This exists because the content_type field would only return the value, and you might want the label."""
 
@@ -272,9 +314,55 @@ class Following(models.Model, LocalAuthorMixin):
         unique_together = ['author', 'following_uuid']
 
 
+class Friendship(models.Model):
+    """Denormalized friendship: a row exists IFF the author both follows and is followed by `friend_uuid`, i.e. there is a matching Following AND Follower row. Never written directly -- it is kept up to date by signals on Follower/Following, and can be rebuilt with the `rebuild_friendships` command."""
+
+    author = models.ForeignKey(Author, on_delete = models.CASCADE)
+
+    # Soft-FK via uuid, for the same reason as Follower/Following: the friend may be remote
+    friend_uuid = models.UUIDField()
+
+    class Meta:
+        verbose_name = 'Friendship'
+        verbose_name_plural = 'Friendships'
+
+        # Also serves as the index for both "is A a friend of B" and "list friends of A"
+        unique_together = ['author', 'friend_uuid']
+
+        # For the other direction, "who counts B as a friend", which post visibility needs
+        indexes = [
+            models.Index(fields = ['friend_uuid', 'author']),
+        ]
+
+    @classmethod
+    def refresh(cls, author_id: UUID, friend_uuid: UUID):
+        """Brings the row for this pair in line with Follower/Following"""
+
+        if Following.objects.filter(author_id = author_id, following_uuid = friend_uuid).exists() and Follower.objects.filter(author_id = author_id, follower_uuid = friend_uuid).exists():
+            # Two follow/accept signals can race to write the same row, so the second insert is simply ignored rather than failing on the unique pair
+            cls.objects.bulk_create([cls(author_id = author_id, friend_uuid = friend_uuid)], ignore_conflicts = True)
+        else:
+            cls.objects.filter(author_id = author_id, friend_uuid = friend_uuid).delete()
+
+
+class InboxItemQuerySet(models.QuerySet):
+    def exclude_tombstoned(self):
+        """Leaves out posts that have since been deleted on their node for good (see RemoteTombstone). An anti-join on the indexed object_uuid, so it's cheap enough for every inbox read."""
+
+        return self.exclude(
+            models.Q(item_type = InboxItem.ItemType.POST) & models.Exists(RemoteTombstone.objects.confirmed().filter(object_uuid = models.OuterRef('object_uuid')))
+        )
+
+
 class InboxItem(models.Model):
     """Each row represents an object that is SENT to the user's inbox. This is a light model, as it only references rows"""
 
+    class ItemType(models.TextChoices):
+        POST = 'post', 'Post'
+        COMMENT = 'comment', 'Comment'
+        LIKE = 'like', 'Like'
+        FOLLOW = 'follow', 'Follow'
+
     author = models.ForeignKey(Author, on_delete = models.CASCADE)
 
     # Used for determining which object this row stores. We don't need a GenericForeignKey relationship, because it would not actually resolve to an object, but we still want to know the type.
@@ -288,10 +376,66 @@ class InboxItem(models.Model):
     # A minimal or full representation of the object. This object always exists elsewhere, this is effectively a reference to it, as the various fields in here would allow it to point to the right object.
     inbox_object = models.JSONField(default = dict)
 
+    # Denormalized from inbox_object (see api.helpers.inbox_helpers.derived_fields) so that readers can filter on indexes rather than searching the JSON. Kept in sync on save; anything that skips save(), like bulk_create, must call fill_derived_fields() itself.
+    item_type = models.CharField(max_length = 16, choices = ItemType.choices, blank = True)
+    object_uuid = models.UUIDField(null = True, blank = True, db_index = True)
+    origin_host = models.CharField(max_length = 255, blank = True, db_index = True)
+    published = models.DateTimeField(default = timezone.now)
+
+    objects = InboxItemQuerySet.as_manager()
+
     class Meta:
         verbose_name = 'InboxItem'
         verbose_name_plural = 'InboxItem'
 
+        indexes = [
+            models.Index(fields = ['author', 'item_type', '-published']),
+            models.Index(fields = ['author', '-published']),
+        ]
+
+    def fill_derived_fields(self):
+        for field, value in inbox_helpers.derived_fields(self.inbox_object).items():
+            if field != 'published' or value is not None:
+                setattr(self, field, value)
+
+    def save(self, *args, **kwargs):
+        self.fill_derived_fields()
+        super().save(*args, **kwargs)
+
+
+class OutboxItem(models.Model):
+    """A post waiting to be delivered to one recipient's inbox, local or remote. Posting only writes these rows; the deliver_outbox command drains them in the background (see api.helpers.outbox_helpers). Rows are deleted once delivered, so anything left is either pending a (re)try or has failed for good."""
+
+    class Status(models.TextChoices):
+        PENDING = 'pending', 'Pending'
+        FAILED = 'failed', 'Failed'
+
+    post = models.ForeignKey(Post, on_delete = models.CASCADE)
+
+    # Soft-FK, since the recipient may be remote
+    recipient_uuid = models.UUIDField(null = True, blank = True)
+
+    # Instead of a recipient, stands for every friend of the post's author. Working out remote friends takes requests to other nodes, so the worker does it, turning this row into one per friend.
+    to_friends = models.BooleanField(default = False)
+
+    # The post as it was serialized when queued. Serializing needs the request (for the host), which the worker doesn't have.
+    post_json = models.JSONField(default = dict)
+
+    status = models.CharField(max_length = 16, choices = Status.choices, default = Status.PENDING)
+    attempts = models.PositiveIntegerField(default = 0)
+    next_attempt_at = models.DateTimeField(default = timezone.now)
+    last_error = models.TextField(blank = True)
+
+    created = models.DateTimeField(auto_now_add = True)
+
+    class Meta:
+        verbose_name = 'OutboxItem'
+        verbose_name_plural = 'OutboxItem'
+
+        indexes = [
+            models.Index(fields = ['status', 'next_attempt_at']),
+        ]
+
 
 # -- Utility -- #
 
@@ -378,3 +522,65 @@ class UUIDRemoteCache(models.Model):
         verbose_name_plural = 'UUID Remote Cache'
 
         unique_together = ['uuid', 'node']
+
+
+class RemoteAuthor(models.Model):
+    """A local copy of an author on another node, so that pages listing remote authors don't have to ask every node for every one of them on every render. Kept up to date by the sync_remote_authors command (see api.helpers.replica_helpers)."""
+
+    uuid = models.UUIDField()
+
+    node = models.ForeignKey(Node, on_delete = models.CASCADE)
+
+    display_name = models.CharField(max_length = 255, blank = True)
+
+    # Shaped by the node's adapter, so it's in our format
+    author_json = models.JSONField(default = dict)
+
+    fetched_at = models.DateTimeField(default = timezone.now)
+
+    class Meta:
+        verbose_name = 'Remote Author'
+        verbose_name_plural = 'Remote Authors'
+
+        unique_together = ['node', 'uuid']
+
+        indexes = [
+            models.Index(fields = ['uuid']),
+            models.Index(fields = ['node', 'display_name']),
+        ]
+
+    def __str__(self):
+        return f'{self.display_name} ({self.node.host})'
+
+
+class RemoteTombstoneQuerySet(models.QuerySet):
+    def confirmed(self):
+        """Tombstones of posts that were still gone TOMBSTONE_GRACE_PERIOD after they were first found gone"""
+        return self.filter(last_seen_at__gte = models.F('deleted_at') + timedelta(seconds = settings.TOMBSTONE_GRACE_PERIOD))
+
+
+class RemoteTombstone(models.Model):
+    """
+    A remote post that its node says is gone (404). A single 404 isn't proof: our own nodes 404 a post that just stopped being public, and nodes have bad moments. So it's only confirmed once the node still says so TOMBSTONE_GRACE_PERIOD later, and it's dropped if the post turns up again meanwhile.
+
+    Inboxes stop showing confirmed tombstones (see InboxItem.objects.exclude_tombstoned), and the purge_tombstoned_inbox command deletes the inbox rows that still point at them.
+    """
+
+    object_uuid = models.UUIDField(unique = True)
+
+    node = models.ForeignKey(Node, on_delete = models.CASCADE)
+
+    # When the node first said it's gone...
+    deleted_at = models.DateTimeField(default = timezone.now)
+
+    # ...and most recently
+    last_seen_at = models.DateTimeField(default = timezone.now)
+
+    objects = RemoteTombstoneQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = 'Remote Tombstone'
+        verbose_name_plural = 'Remote Tombstones'
+
+    def __str__(self):
+        return f'{self.object_uuid} ({self.node.host})'
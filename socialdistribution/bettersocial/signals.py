@@ -1,8 +1,12 @@
 from django.contrib.auth.models import User
-from django.db.models.signals import post_save, pre_save
+from django.contrib.contenttypes.models import ContentType as DjangoContentType
+from django.db.models import F, Q
+from django.db.models.functions import Greatest
+from django.db.models.signals import post_save, pre_save, post_delete
 from django.dispatch import receiver
+from django.utils import timezone
 
-from .models import Author
+from .models import Author, Comment, Follower, Following, Friendship, Like, Post
 
 
 @receiver(signal = post_save, sender = User)
@@ -20,3 +24,95 @@ def user_to_inactive(sender, instance, **kwargs):
     if instance._state.adding is True:
         print("Creating Inactive User")
         instance.is_active = False
+
+
+@receiver(signal = post_save, sender = Follower)
+@receiver(signal = post_delete, sender = Follower)
+def refresh_follower_friendship(sender, instance: Follower, **kwargs):
+    """Keeps the Friendship table in sync with Follower writes"""
+
+    Friendship.refresh(instance.author_id, instance.follower_uuid)
+
+
+@receiver(signal = post_save, sender = Following)
+@receiver(signal = post_delete, sender = Following)
+def refresh_following_friendship(sender, instance: Following, **kwargs):
+    """Keeps the Friendship table in sync with Following writes"""
+
+    Friendship.refresh(instance.author_id, instance.following_uuid)
+
+
+# Counters are bumped with a single UPDATE ... SET x = x + 1, so concurrent writes can't overwrite each other's counts. Anything that skips signals, like bulk_create, needs the reconcile_counts command afterwards.
+
+def _adjust_like_count(like: Like, delta: int):
+    likeable_model = DjangoContentType.objects.get_for_id(like.dj_content_type_id).model_class()
+
+    likeable_model.objects.filter(pk = like.dj_object_uuid).update(like_count = Greatest(F('like_count') + delta, 0))
+
+
+def _adjust_comment_count(comment: Comment, delta: int):
+    # The newest comments are part of the post's JSON
+    Post.objects.filter(pk = comment.post_id).update(comment_count = Greatest(F('comment_count') + delta, 0), version = F('version') + 1, modified = timezone.now())
+
+
+@receiver(signal = post_save, sender = Like)
+def count_like(sender, instance: Like, created: bool, **kwargs):
+    """Counts a new like on the post or comment it likes"""
+
+    if created:
+        _adjust_like_count(instance, 1)
+
+
+@receiver(signal = post_delete, sender = Like)
+def uncount_like(sender, instance: Like, **kwargs):
+    _adjust_like_count(instance, -1)
+
+
+@receiver(signal = post_save, sender = Comment)
+def count_comment(sender, instance: Comment, created: bool, **kwargs):
+    """Counts a new comment on its post"""
+
+    if created:
+        _adjust_comment_count(instance, 1)
+
+
+@receiver(signal = post_delete, sender = Comment)
+def uncount_comment(sender, instance: Comment, **kwargs):
+    _adjust_comment_count(instance, -1)
+
+
+# Anything that changes a post's JSON bumps its version, which retires its cached JSON and its ETag (see api.conditional), and moves its modified time along
+
+@receiver(signal = post_save, sender = Post)
+def bump_post_version(sender, instance: Post, created: bool, **kwargs):
+    """An edited post gets a new version"""
+
+    if not created:
+        Post.objects.filter(pk = instance.pk).update(version = F('version') + 1)
+
+        # So that serializing the instance that was just saved doesn't get the cached JSON of the version before
+        instance.refresh_from_db(fields = ['version', 'modified'])
+
+
+def _bump_posts_showing(authors):
+    """Bumps every post that embeds one of the authors: the ones they wrote, and the ones they commented on (the comments, and so the post's comments list, embed their author)"""
+
+    Post.objects.filter(
+        Q(author__in = authors) | Q(pk__in = Comment.objects.filter(author_uuid__in = authors.values('uuid')).values('post_id'))
+    ).update(version = F('version') + 1, modified = timezone.now())
+
+
+@receiver(signal = post_save, sender = Author)
+def bump_author_post_versions(sender, instance: Author, created: bool, **kwargs):
+    """The author is embedded in each of their posts, and in their comments on others'"""
+
+    if not created:
+        _bump_posts_showing(Author.objects.filter(pk = instance.pk))
+
+
+@receiver(signal = post_save, sender = User)
+def bump_user_post_versions(sender, instance: User, created: bool, update_fields = None, **kwargs):
+    """The author's display name comes from their user. Logging in only touches last_login, which isn't shown."""
+
+    if not created and set(update_fields or ['*']) != {'last_login'}:
+        _bump_posts_showing(Author.objects.filter(user = instance))
@@ -16,12 +16,19 @@ function showAuthorsPage() {
     document.getElementById('author-list-page').hidden = false;
 }
 
-// To fix some weirdness with the back button
+// To fix some weirdness with the back button. Paging through the authors stays on the authors tab.
 setTimeout(() => {
-    showFriendListPage();
+    const onAuthors = new URLSearchParams(window.location.search).has('authors_page');
+
+    if (onAuthors) {
+        showAuthorsPage();
+    } else {
+        showFriendListPage();
+    }
+
     document.getElementById('page-friend-requests').checked = false;
-    document.getElementById('page-friends').checked = true;
-    document.getElementById('page-authors').checked = false;
+    document.getElementById('page-friends').checked = !onAuthors;
+    document.getElementById('page-authors').checked = onAuthors;
 }, 100);
 
 
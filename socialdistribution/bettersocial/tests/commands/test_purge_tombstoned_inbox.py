@@ -0,0 +1,46 @@
+from datetime import timedelta
+from io import StringIO
+from uuid import uuid4
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType as DjangoContentType
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from bettersocial.models import InboxItem, Node, Post, RemoteTombstone
+from bettersocial.tests import utils
+
+
+class PurgeTombstonedInboxTests(TestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+
+        self.node = Node.objects.create(host = 'http://purge.example.com/', adapter_id = 'default')
+        post_content_type = DjangoContentType.objects.get_for_model(Post)
+
+        self.dead_uuid, self.live_uuid = uuid4(), uuid4()
+
+        for i in range(5):
+            author = utils.create_test_user(username = f'reader-{i}').author
+
+            for post_uuid in [self.dead_uuid, self.live_uuid]:
+                utils.create_test_inbox_entry(author, post_content_type, { 'type': 'post', 'id': f'http://purge.example.com/author/{uuid4()}/posts/{post_uuid}' })
+
+        # Still gone a day after it first was, so it's confirmed. The live post only 404'd once, just now.
+        RemoteTombstone.objects.create(object_uuid = self.dead_uuid, node = self.node, deleted_at = timezone.now() - timedelta(seconds = settings.TOMBSTONE_GRACE_PERIOD))
+        RemoteTombstone.objects.create(object_uuid = self.live_uuid, node = self.node)
+
+    def test_purge(self):
+        """Tests that only the rows of posts with confirmed tombstones are deleted, over as many batches as it takes"""
+
+        stdout = StringIO()
+        call_command('purge_tombstoned_inbox', once = True, batch_size = 2, stdout = stdout)
+
+        self.assertIn('Purged 5', stdout.getvalue())
+        self.assertFalse(InboxItem.objects.filter(object_uuid = self.dead_uuid).exists())
+        self.assertEqual(InboxItem.objects.filter(object_uuid = self.live_uuid).count(), 5)
+
+        # The tombstone stays, so the post is still left out if it's sent again
+        self.assertTrue(RemoteTombstone.objects.filter(object_uuid = self.dead_uuid).exists())
@@ -0,0 +1,44 @@
+from io import StringIO
+
+from django.core.management import call_command, CommandError
+from django.test import TestCase
+
+from bettersocial.models import Comment, Post
+from bettersocial.tests import utils
+
+
+class ReconcileCountsTests(TestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+
+        self.author = utils.create_test_user().author
+        self.post = utils.create_test_post(self.author)
+        self.comment = utils.create_test_comment(self.author.uuid, self.post)
+
+        utils.create_test_like(self.author.uuid, self.post)
+        utils.create_test_like(self.author.uuid, self.comment)
+
+        # Drift, as if from writes that skipped the signals
+        Post.objects.update(like_count = 7, comment_count = 0)
+        Comment.objects.update(like_count = 0)
+
+    def test_verify(self):
+        """Tests that --verify reports drift without repairing it"""
+
+        with self.assertRaises(CommandError):
+            call_command('reconcile_counts', verify = True, stdout = StringIO())
+
+        self.assertEqual(Post.objects.get().like_count, 7)
+
+    def test_repair(self):
+        """Tests that the counters are recounted from the Like and Comment tables"""
+
+        call_command('reconcile_counts', stdout = StringIO())
+
+        post = Post.objects.get()
+
+        self.assertEqual((post.like_count, post.comment_count), (1, 1))
+        self.assertEqual(Comment.objects.get().like_count, 1)
+
+        call_command('reconcile_counts', verify = True, stdout = StringIO())
@@ -32,3 +32,17 @@ class CommentModelTests(TestCase):
         """Tests that the relationship accessor refers to the same post that we set up"""
 
         self.assertEquals(self.comment.post, self.post)
+
+    def test_comment_count(self):
+        """Tests that comment_count follows comments being added and removed"""
+
+        second_comment = utils.create_test_comment(author_uuid = self.author.uuid, post = self.post)
+
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 2)
+
+        second_comment.delete()
+        self.comment.delete()
+
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 0)
@@ -0,0 +1,82 @@
+from io import StringIO
+from uuid import uuid4
+
+from django.core.management import call_command, CommandError
+from django.test import TestCase
+
+from bettersocial.models import Friendship, Following, Follower
+from bettersocial.tests import utils
+
+
+class FriendshipModelTests(TestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+
+        self.author = utils.create_test_user(username = 'author').author
+        self.other = utils.create_test_user(username = 'other').author
+
+    def test_follow_back_creates_friendship(self):
+        """Tests that the row only shows up once both the Following and Follower rows exist"""
+
+        utils.add_local_following(self.author, self.other)
+
+        self.assertFalse(Friendship.objects.exists())
+
+        utils.add_local_following(self.other, self.author)
+
+        self.assertTrue(Friendship.objects.filter(author = self.author, friend_uuid = self.other.uuid).exists())
+        self.assertTrue(Friendship.objects.filter(author = self.other, friend_uuid = self.author.uuid).exists())
+
+    def test_unfollow_removes_friendship(self):
+        """Tests that deleting either side of the relation removes the row"""
+
+        utils.add_local_following(self.author, self.other)
+        utils.add_local_following(self.other, self.author)
+
+        Following.objects.filter(author = self.author, following_uuid = self.other.uuid).delete()
+
+        self.assertFalse(Friendship.objects.filter(author = self.author).exists())
+        self.assertTrue(Friendship.objects.filter(author = self.other).exists())
+
+        Follower.objects.filter(author = self.other, follower_uuid = self.author.uuid).delete()
+
+        self.assertFalse(Friendship.objects.exists())
+
+    def test_remote_friend(self):
+        """Tests that remote UUIDs are tracked the same way"""
+
+        remote_uuid = uuid4()
+
+        utils.create_test_following(self.author, remote_uuid)
+        utils.create_test_follower(self.author, remote_uuid)
+
+        self.assertTrue(self.author.friends_with(remote_uuid))
+
+    def test_refresh_again(self):
+        """Tests that refreshing a pair whose row was already written (by a concurrent signal, say) leaves the one row"""
+
+        utils.add_local_following(self.author, self.other)
+        utils.add_local_following(self.other, self.author)
+
+        Friendship.refresh(self.author.uuid, self.other.uuid)
+
+        self.assertEqual(Friendship.objects.filter(author = self.author, friend_uuid = self.other.uuid).count(), 1)
+
+    def test_rebuild_command(self):
+        """Tests that the command finds and repairs drift"""
+
+        utils.add_local_following(self.author, self.other)
+        utils.add_local_following(self.other, self.author)
+
+        # Simulate drift
+        Friendship.objects.filter(author = self.author).delete()
+        Friendship.objects.create(author = self.author, friend_uuid = uuid4())
+
+        with self.assertRaises(CommandError):
+            call_command('rebuild_friendships', verify = True, stdout = StringIO())
+
+        call_command('rebuild_friendships', stdout = StringIO())
+        call_command('rebuild_friendships', verify = True, stdout = StringIO())
+
+        self.assertCountEqual(Friendship.objects.filter(author = self.author).values_list('friend_uuid', flat = True), [self.other.uuid])
@@ -0,0 +1,49 @@
+from datetime import datetime, timezone
+from uuid import uuid4
+
+from django.contrib.contenttypes.models import ContentType as DjangoContentType
+from django.test import TestCase
+
+from bettersocial.models import InboxItem, Post, Follower
+from bettersocial.tests import utils
+
+
+class InboxItemModelTests(TestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+
+        self.author = utils.create_test_user().author
+
+    def test_post_columns(self):
+        """Tests that the indexed columns are filled in from a post's JSON on save"""
+
+        author_uuid, post_uuid = uuid4(), uuid4()
+
+        inbox_item = utils.create_test_inbox_entry(self.author, DjangoContentType.objects.get_for_model(Post), {
+            'type': 'Post',
+            'id': f'http://remote.example.com/service/author/{author_uuid.hex}/posts/{post_uuid.hex}',
+            'author': { 'id': f'http://remote.example.com/service/author/{author_uuid.hex}', 'host': 'http://remote.example.com/service/' },
+            'published': '2021-12-06T06:38:00+00:00',
+        })
+
+        self.assertEqual(inbox_item.item_type, InboxItem.ItemType.POST)
+        self.assertEqual(inbox_item.object_uuid, post_uuid)
+        self.assertEqual(inbox_item.origin_host, 'http://remote.example.com')
+        self.assertEqual(inbox_item.published, datetime(2021, 12, 6, 6, 38, tzinfo = timezone.utc))
+
+    def test_follow_columns(self):
+        """Tests that follows are keyed on the actor, and that a missing published falls back to when it was received"""
+
+        actor_uuid = uuid4()
+
+        inbox_item = utils.create_test_inbox_entry(self.author, DjangoContentType.objects.get_for_model(Follower), {
+            'type': 'follow',
+            'actor': { 'id': f'http://remote.example.com/service/author/{actor_uuid}', 'host': 'http://remote.example.com/' },
+            'object': { 'id': f'http://testserver/api/author/{self.author.uuid.hex}' },
+        })
+
+        self.assertEqual(inbox_item.item_type, InboxItem.ItemType.FOLLOW)
+        self.assertEqual(inbox_item.object_uuid, actor_uuid)
+        self.assertEqual(inbox_item.origin_host, 'http://remote.example.com')
+        self.assertIsNotNone(inbox_item.published)
@@ -1,3 +1,5 @@
+from uuid import uuid4
+
 from django.test import TestCase
 
 from bettersocial.models import Like, Author, Post, Comment
@@ -44,3 +46,21 @@ class LikeModelTests(TestCase):
 
         self.assertEquals(self.comment_like.object, self.comment)
         self.assertEquals(self.post_like.object, self.post)
+
+    def test_like_count(self):
+        """Tests that like_count follows likes being added and removed, on both posts and comments"""
+
+        self.post.refresh_from_db()
+        self.comment.refresh_from_db()
+
+        self.assertEqual(self.post.like_count, 1)
+        self.assertEqual(self.comment.like_count, 1)
+
+        utils.create_test_like(author_uuid = uuid4(), liked_object = self.post)
+        self.comment_like.delete()
+
+        self.post.refresh_from_db()
+        self.comment.refresh_from_db()
+
+        self.assertEqual(self.post.like_count, 2)
+        self.assertEqual(self.comment.like_count, 0)
@@ -0,0 +1,307 @@
+import json
+import time
+from datetime import timedelta
+from unittest import mock
+from uuid import uuid4
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType as DjangoContentType
+from django.core.cache import caches
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from api.helpers import remote_helpers
+from api.tests import utils as api_utils
+from bettersocial.models import Post, RemoteTombstone, Like
+from bettersocial.tests import utils
+
+
+# The manifest is only there once collectstatic has run
+@override_settings(STATICFILES_STORAGE = 'django.contrib.staticfiles.storage.StaticFilesStorage')
+class ProfileViewQueryCountTests(TestCase):
+    """The number of queries to render a profile must not grow with the number of posts or comments"""
+
+    def setUp(self) -> None:
+        super().setUp()
+
+        self.user = utils.create_test_user(username = 'viewer')
+        self.user.is_active = True
+        self.user.save()
+
+        self.client.force_login(self.user)
+
+        self.author = utils.create_test_user(username = 'poster').author
+        self.commenter = utils.create_test_user(username = 'commenter').author
+
+    def _add_posts(self, author, count: int):
+        for _ in range(count):
+            post = utils.create_test_post(author, visibility = Post.Visibility.PUBLIC)
+
+            for _ in range(6):
+                utils.create_test_comment(self.commenter.uuid, post)
+
+    def _assert_constant(self, author, expected: int):
+        for posts in [1, 4]:
+            self._add_posts(author, posts)
+
+            with self.assertNumQueries(expected):
+                response = self.client.get(f'/profile/{author.uuid}')
+
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.context['posts']), Post.objects.filter(author = author).count())
+
+    def test_own_profile(self):
+        """Tests that your own posts are serialized once, in bulk"""
+
+        self._assert_constant(self.user.author, 7)
+
+    def test_other_profile(self):
+        """Tests someone else's profile, which also checks both follow directions"""
+
+        self._assert_constant(self.author, 9)
+
+
+@override_settings(STATICFILES_STORAGE = 'django.contrib.staticfiles.storage.StaticFilesStorage')
+class FollowersViewTests(TestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+
+        self.user = utils.create_test_user(username = 'viewer')
+        self.user.is_active = True
+        self.user.save()
+
+        self.client.force_login(self.user)
+
+        self.followed = utils.create_test_user(username = 'followed').author
+        self.other = utils.create_test_user(username = 'other').author
+
+        utils.add_local_following(self.user.author, self.followed)
+        # Someone else following doesn't make the viewer a follower
+        utils.add_local_following(self.followed, self.other)
+
+    def test_authors(self):
+        """Tests that local and remote authors are listed, with whether the viewer follows each of them"""
+
+        recording = api_utils.load_recording('paged')
+        node = api_utils.create_test_node(recording['host'], adapter_id = recording['adapter_id'], prefix = recording['prefix'], display_name = 'Paged')
+
+        with api_utils.Replay(node.adapter, recording), mock.patch.object(node.adapter, 'authors_page_size', 2):
+            response = self.client.get('/friends/')
+
+        self.assertEqual(response.status_code, 200)
+
+        (local_label, local_authors), (remote_label, remote_authors) = response.context['author_nodes']
+
+        self.assertEqual({ author_uuid: following for _, author_uuid, following in local_authors }, { self.followed.uuid: True, self.other.uuid: False })
+        self.assertEqual([author['displayName'] for author, _, _ in remote_authors], [f'Author {i}' for i in range(1, 6)])
+        self.assertFalse(response.context['authors_has_next'])
+
+    @override_settings(AUTHOR_LIST_PAGE_SIZE = 2)
+    def test_authors_paged(self):
+        """Tests that each list of authors is shown a page at a time, and that a node is only read as far as the page"""
+
+        recording = api_utils.load_recording('paged')
+        node = api_utils.create_test_node(recording['host'], adapter_id = recording['adapter_id'], prefix = recording['prefix'], display_name = 'Paged')
+
+        with api_utils.Replay(node.adapter, recording) as replay, mock.patch.object(node.adapter, 'authors_page_size', 2):
+            response = self.client.get('/friends/', { 'authors_page': 2 })
+
+        (_, local_authors), (_, remote_authors) = response.context['author_nodes']
+
+        self.assertEqual(local_authors, [])
+        self.assertEqual([author['displayName'] for author, _, _ in remote_authors], ['Author 3', 'Author 4'])
+        self.assertTrue(response.context['authors_has_next'])
+        # Pages 1 and 2, plus the first author of page 3 to know there's more
+        self.assertEqual(len(replay.requests), 3)
+
+        with api_utils.Replay(node.adapter, recording), mock.patch.object(node.adapter, 'authors_page_size', 2):
+            response = self.client.get('/friends/', { 'authors_page': 3 })
+
+        self.assertEqual([author['displayName'] for author, _, _ in response.context['author_nodes'][1][1]], ['Author 5'])
+        self.assertFalse(response.context['authors_has_next'])
+
+
+@override_settings(STATICFILES_STORAGE = 'django.contrib.staticfiles.storage.StaticFilesStorage')
+class ArticleDetailViewTests(TestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+
+        caches['default'].clear()
+
+        self.adapter = api_utils.register_stub_adapter()
+        self.node = api_utils.create_test_node('http://articles.example.com/')
+        self.adapter.nodes[self.node.host] = (0.05, dict())
+
+        self.user = utils.create_test_user(username = 'reader')
+        self.user.is_active = True
+        self.user.save()
+
+        self.client.force_login(self.user)
+
+        author_json = api_utils.create_test_remote_author_json('http://articles.example.com', uuid4())
+
+        self.post_uuid = uuid4()
+        self.post_json = {
+            'type': 'post',
+            'id': f'{author_json["id"]}/posts/{self.post_uuid}',
+            'title': 'As sent',
+            'visibility': Post.Visibility.PUBLIC,
+            'author': author_json,
+            'comments': f'{author_json["id"]}/posts/{self.post_uuid}/comments',
+        }
+
+        utils.create_test_inbox_entry(self.user.author, DjangoContentType.objects.get_for_model(Post), self.post_json)
+
+    def tearDown(self) -> None:
+        api_utils.unregister_stub_adapter()
+
+        super().tearDown()
+
+    def test_remote_post(self):
+        """Tests that the latest version of a public remote post and its comments are fetched at the same time, and then kept for a while"""
+
+        self.adapter.posts[self.post_json['id']] = { **self.post_json, 'title': 'Edited' }
+        self.adapter.comments[self.post_json['comments']] = [{ 'type': 'comment', 'comment': 'Nice' }]
+
+        for _ in range(2):
+            response = self.client.get(f'/article/{self.post_uuid}/')
+
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(json.loads(response.context['post'])['title'], 'Edited')
+            self.assertEqual(json.loads(response.context['comments']), [{ 'type': 'comment', 'comment': 'Nice' }])
+
+        self.assertEqual(self.adapter.calls, 2)
+        self.assertEqual(self.adapter.max_in_flight[self.node.host], 2)
+
+    def test_comments_failed(self):
+        """Tests that a post whose comments couldn't be fetched isn't kept, so the comments are tried again next time"""
+
+        self.adapter.posts[self.post_json['id']] = self.post_json
+        self.adapter.post_statuses[self.post_json['comments']] = 503
+
+        response = self.client.get(f'/article/{self.post_uuid}/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.context['comments']), [])
+
+        del self.adapter.post_statuses[self.post_json['comments']]
+        self.adapter.comments[self.post_json['comments']] = [{ 'type': 'comment', 'comment': 'Nice' }]
+
+        response = self.client.get(f'/article/{self.post_uuid}/')
+
+        self.assertEqual(json.loads(response.context['comments']), [{ 'type': 'comment', 'comment': 'Nice' }])
+        self.assertEqual(self.adapter.calls, 4)
+
+    def test_deleted_remote_post(self):
+        """Tests that a public remote post that its node says is gone is tombstoned, but still shown until it's been gone for the grace period"""
+
+        response = self.client.get(f'/article/{self.post_uuid}/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.context['post'])['title'], 'As sent')
+        self.assertTrue(RemoteTombstone.objects.filter(object_uuid = self.post_uuid, node = self.node).exists())
+
+        a_day_ago = timezone.now() - timedelta(seconds = settings.TOMBSTONE_GRACE_PERIOD)
+        RemoteTombstone.objects.update(deleted_at = a_day_ago, last_seen_at = a_day_ago)
+
+        response = self.client.get(f'/article/{self.post_uuid}/')
+
+        self.assertEqual(response.status_code, 404)
+        self.assertTrue(RemoteTombstone.objects.confirmed().exists())
+
+    def test_tombstoned_node_down(self):
+        """Tests that the copy we were sent is still shown when the post has an unconfirmed tombstone and its node can't be reached"""
+
+        RemoteTombstone.objects.create(object_uuid = self.post_uuid, node = self.node)
+
+        self.adapter.posts[self.post_json['id']] = self.post_json
+        self.adapter.post_statuses[self.post_json['id']] = 503
+
+        response = self.client.get(f'/article/{self.post_uuid}/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.context['post'])['title'], 'As sent')
+
+    def test_unreachable_node(self):
+        """Tests that the copy we were sent is shown when the post's node can't be reached"""
+
+        self.adapter.posts[self.post_json['id']] = self.post_json
+        self.adapter.post_statuses[self.post_json['id']] = 503
+
+        response = self.client.get(f'/article/{self.post_uuid}/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.context['post'])['title'], 'As sent')
+        self.assertEqual(json.loads(response.context['comments']), [])
+
+
+@override_settings(STATICFILES_STORAGE = 'django.contrib.staticfiles.storage.StaticFilesStorage')
+class PostLikesViewTests(TestCase):
+
+    DELAY = 0.1
+
+    def setUp(self) -> None:
+        super().setUp()
+
+        caches['remote_authors'].clear()
+
+        self.adapter = api_utils.register_stub_adapter()
+        self.node = api_utils.create_test_node('http://likers.example.com')
+        self.other_node = api_utils.create_test_node('http://other-likers.example.com')
+
+        self.remote_likers = { node: [uuid4() for _ in range(3)] for node in [self.node, self.other_node] }
+
+        for node, liker_uuids in self.remote_likers.items():
+            self.adapter.nodes[node.host] = (self.DELAY, { liker_uuid: api_utils.create_test_remote_author_json(node.host, liker_uuid) for liker_uuid in liker_uuids })
+            remote_helpers.cache_hosts_of_uuids({ liker_uuid: node for liker_uuid in liker_uuids })
+
+        self.user = utils.create_test_user(username = 'poster')
+        self.user.is_active = True
+        self.user.save()
+
+        self.client.force_login(self.user)
+
+        self.post = utils.create_test_post(self.user.author)
+        self.local_liker = utils.create_test_user(username = 'liker').author
+
+        utils.create_test_like(self.local_liker.uuid, self.post)
+
+        for liker_uuids in self.remote_likers.values():
+            for liker_uuid in liker_uuids:
+                utils.create_test_like(liker_uuid, self.post)
+
+    def tearDown(self) -> None:
+        api_utils.unregister_stub_adapter()
+
+        super().tearDown()
+
+    def test_likers(self):
+        """Tests that local and remote likers are listed, with the remote ones fetched from their nodes concurrently"""
+
+        start = time.monotonic()
+        response = self.client.get(f'/article/{self.post.uuid}/likes/')
+
+        # 3 likers per node, the nodes at once, against 6 one after the other
+        self.assertLess(time.monotonic() - start, self.DELAY * 5)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['like_count'], 7)
+        self.assertEqual(
+            dict(response.context['likers']),
+            {
+                self.local_liker.uuid: self.local_liker.display_name,
+                **{ liker_uuid: self.adapter.nodes[node.host][1][liker_uuid]['displayName'] for node, liker_uuids in self.remote_likers.items() for liker_uuid in liker_uuids },
+            }
+        )
+        self.assertEqual(self.adapter.calls, 6)
+
+    def test_counter_behind(self):
+        """Tests that the likes are listed even when like_count hasn't caught up with them"""
+
+        Post.objects.filter(pk = self.post.pk).update(like_count = 0)
+
+        response = self.client.get(f'/article/{self.post.uuid}/likes/')
+
+        self.assertEqual(len(response.context['likers']), Like.objects.count())
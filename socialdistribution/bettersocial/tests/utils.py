@@ -154,7 +154,7 @@ def create_test_inbox_entry(
     return InboxItem.objects.create(
         author = author,
         dj_content_type = dj_content_type,
-        object = inbox_object
+        inbox_object = inbox_object
     )
 
 
@@ -4,13 +4,14 @@ from uuid import UUID
 
 import requests
 import yarl
+from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.forms import PasswordChangeForm
 from django.contrib.auth.views import PasswordChangeView
 from django.contrib.messages.views import SuccessMessageMixin
 from django.core.exceptions import PermissionDenied
-from django.db.models import Q
+from django.db import transaction
 from django.http import HttpResponseNotFound, HttpRequest, HttpResponseBadRequest, HttpResponseServerError
 from django.http.response import HttpResponseRedirect
 from django.shortcuts import redirect
@@ -19,9 +20,9 @@ from django.utils.decorators import method_decorator
 from django.views import generic
 from requests.auth import HTTPBasicAuth
 
-from api.helpers import author_helpers, uuid_helpers, remote_helpers
+from api.helpers import author_helpers, uuid_helpers, remote_helpers, post_helpers, outbox_helpers, node_helpers
 from api.serializers import PostSerializer, CommentSerializer, AuthorSerializer
-from bettersocial.models import Author, Follower, Following, InboxItem, Post, Comment, Node
+from bettersocial.models import Author, Follower, Following, InboxItem, Post, Comment, RemoteTombstone
 from .forms import CommentCreationForm, PostCreationForm, EditProfileForm
 
 
@@ -39,7 +40,7 @@ class ArticleDetailView(generic.TemplateView):
             return self.render_to_response(context)
 
     def _find_post(self, context, **kwargs):
-        """Returns the JSON of the post, if found, and its comments, if applicable"""
+        """Returns the JSON of the post and of its comments, or (None, None) if it's nowhere to be found"""
 
         # First try to find the post locally
         post_qs = Post.objects.filter(pk = self.kwargs['pk'])
@@ -52,46 +53,29 @@ class ArticleDetailView(generic.TemplateView):
                    CommentSerializer(comments, context = { 'request': self.request }, many = True).data
 
         # If that fails, try to find it in the author's inbox (maybe it's private but on here)
-        inbox_items = InboxItem.objects.filter(author = self.request.user.author, inbox_object__iregex = '"type": "post"').all()
+        inbox_items = InboxItem.objects.filter(author = self.request.user.author, item_type = InboxItem.ItemType.POST, object_uuid = self.kwargs['pk']).exclude_tombstoned()
 
         for item in inbox_items:
-            if uuid_helpers.extract_post_uuid_from_id(item.inbox_object['id']) == self.kwargs['pk']:
 
-                # IF the post is public, we should get the most recent version
-                if item.inbox_object['visibility'].upper() == Post.Visibility.PUBLIC.value.upper():
-                    node = Node.objects.filter(host__contains = yarl.URL(item.inbox_object['author']['host']).origin().human_repr()).get()
+            # IF the post is public, we should get the most recent version
+            if item.inbox_object['visibility'].upper() == Post.Visibility.PUBLIC.value.upper():
+                node = node_helpers.node_for_url(item.inbox_object['author']['host'])
 
-                    try:
-                        url = item.inbox_object['url']
-                    except KeyError:
-                        url = item.inbox_object['id']
+                found = remote_helpers.fetch_remote_post(node, item.inbox_object) if node is not None else None
 
-                    post_response = requests.get(
-                        url,
-                        headers = { 'Accept': 'application/json' },
-                        auth = HTTPBasicAuth(node.node_username, node.node_password)
-                    )
+                if found is not None:
+                    return found
 
-                    post_response.raise_for_status()
+                # The node has said it's gone for long enough (see RemoteTombstone). A first 404, or a node that's down, still shows what we were sent.
+                if RemoteTombstone.objects.confirmed().filter(object_uuid = self.kwargs['pk']).exists():
+                    return None, None
 
-                    comments_response = requests.get(
-                        item.inbox_object['comments'],
-                        params = { 'size': 100 },
-                        headers = { 'Accept': 'application/json' },
-                        auth = HTTPBasicAuth(node.node_username, node.node_password)
-                    )
-
-                    comments_response.raise_for_status()
-
-                    if post_response.ok:
-                        return post_response.json(), comments_response.json()['comments'] if comments_response.ok else []
-
-                else:
-                    return item.inbox_object
+            # Otherwise, what we were sent is all we have
+            return item.inbox_object, list()
 
         # All else fails, try to find it remotely (this must be a public post)
 
-        pass
+        return None, None
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -174,18 +158,18 @@ class ProfileView(generic.base.TemplateView):
         author_uuid = context['uuid']
         user_uuid = self.request.user.author.uuid
 
-        author_qs = Author.objects.filter(uuid = author_uuid)
-        if author_qs.exists():
-            context['author'] = AuthorSerializer(author_qs.get(), context = { 'request': self.request }).data
+        author = Author.objects.filter(uuid = author_uuid).select_related('user').first()
+        if author:
+            context['author'] = AuthorSerializer(author, context = { 'request': self.request }).data
 
-            # TODO: Might only need to have Public posts to be queried or publick and friends posts?
-            context['posts'] = Post.objects.filter(
-                (Q(visibility = Post.Visibility.PUBLIC) & Q(author__uuid = author_uuid)) |
-                (Q(visibility = Post.Visibility.FRIENDS) & Q(author__follower__follower_uuid = user_uuid) & Q(author__following__following_uuid = user_uuid)) |
-                (Q(visibility = Post.Visibility.PRIVATE) & Q(recipient_uuid = user_uuid))).distinct().order_by('-published')
+            # You see all of your own posts, but only the ones you're allowed to on anyone else's profile
+            if author_uuid == user_uuid:
+                posts = author.post_set.order_by('-published')
+            else:
+                posts = post_helpers.visible_posts(user_uuid, author_uuid = author_uuid)
 
             # Coerce into JSON, when local
-            context['posts'] = PostSerializer(context['posts'], many = True, context = { 'request': self.request }).data
+            context['posts'] = PostSerializer(posts.select_related('author__user'), many = True, context = { 'request': self.request }).data
         else:
             context['author'] = remote_helpers.find_remote_author(author_uuid)
 
@@ -207,12 +191,9 @@ class ProfileView(generic.base.TemplateView):
         context['author']['uuid'] = author_uuid
 
         # Get follow button actions
-        if author_uuid == user_uuid:
-            author = Author.objects.filter(uuid = author_uuid).prefetch_related('post_set').get()
-            context['posts'] = PostSerializer(author.post_set.all().order_by('-published'), many = True, context = { 'request': self.request }).data
-        else:
-            context['author_following_user'] = bool(Following.objects.filter(author = author_uuid, following_uuid = user_uuid))
-            context['user_following_author'] = bool(Following.objects.filter(author = user_uuid, following_uuid = author_uuid))
+        if author_uuid != user_uuid:
+            context['author_following_user'] = Following.objects.filter(author = author_uuid, following_uuid = user_uuid).exists()
+            context['user_following_author'] = Following.objects.filter(author = user_uuid, following_uuid = author_uuid).exists()
 
         for post in context['posts']:
             # Make post UUID available in _uuid
@@ -298,16 +279,6 @@ class AddPostView(generic.CreateView):
             url = reverse_lazy('bettersocial:index')
         return url
 
-    def _send_post_to_authors(self, request, post: Post, author_uuids: List[UUID]):
-        return requests.post(
-            (yarl.URL(request._current_scheme_host) / 'api' / 'send-post' / '').human_repr(),
-            headers = { 'Accept': 'application/json' },
-            json = {
-                'post_uuid': str(post.uuid),
-                'author_uuids': [str(u) for u in author_uuids]
-            }
-        )
-
     # Changes require in the future
     # The form itself has error message for the user if he / she does it incorrectly.
     def post(self, request, **kwargs):
@@ -315,19 +286,26 @@ class AddPostView(generic.CreateView):
 
         obj = form.save(commit = False)
         obj.author = Author(self.request.user.author.uuid, self.request.user)  # Automatically Put the current user as the author
-        obj.save()
 
         # Could include unlisted
         if obj.visibility == Post.Visibility.PRIVATE:
-            self._send_post_to_authors(request, obj, [obj.recipient_uuid])
-
-        elif obj.visibility == Post.Visibility.FRIENDS:
-            friends: List[UUID] = author_helpers.get_author_friends_as_uuid(obj.author)
-            self._send_post_to_authors(request, obj, friends)
+            recipients: List[UUID] = [obj.recipient_uuid]
 
         elif obj.visibility == Post.Visibility.PUBLIC:
-            followers: List[UUID] = [f.follower_uuid for f in obj.author.follower_set.all()]
-            self._send_post_to_authors(request, obj, followers)
+            recipients: List[UUID] = [f.follower_uuid for f in obj.author.follower_set.all()]
+
+        else:
+            recipients: List[UUID] = []
+
+        # The post and its deliveries are committed together; the deliver_outbox worker sends them out from there. Friends are worked out by the worker too, since remote ones take requests to their nodes.
+        with transaction.atomic():
+            obj.save()
+            post_json = PostSerializer(obj, context = { 'request': request }).data
+
+            if obj.visibility == Post.Visibility.FRIENDS:
+                outbox_helpers.enqueue_post_to_friends(obj, post_json)
+            else:
+                outbox_helpers.enqueue_post(obj, post_json, recipients)
 
         return redirect('bettersocial:index')
 
@@ -364,7 +342,10 @@ class AddCommentView(generic.CreateView):
                 return super().post(request, *args, **kwargs)
             else:
                 # Post must be remote, sending to url
-                node = Node.objects.filter(host__contains = yarl.URL(self.request.GET['host']).origin().human_repr()).get()
+                node = node_helpers.node_for_url(self.request.GET['host'])
+
+                if node is None:
+                    return HttpResponseBadRequest('The post is not on this server or any node it is connected to!')
 
                 form_comment: Comment = form.instance
 
@@ -433,7 +414,7 @@ class InboxView(generic.ListView, generic.DeleteView):
 
     def get_queryset(self):
         """Return all inbox items."""
-        return InboxItem.objects.filter(author = self.request.user.author)
+        return InboxItem.objects.filter(author = self.request.user.author).exclude_tombstoned()
 
 
 @method_decorator(login_required, name = 'dispatch')
@@ -447,7 +428,7 @@ class StreamView(generic.ListView):
 
         data = list()
 
-        queryset = InboxItem.objects.filter(author = self.request.user.author, inbox_object__iregex = '"type": "post"').all()
+        queryset = InboxItem.objects.filter(author = self.request.user.author, item_type = InboxItem.ItemType.POST).exclude_tombstoned()
 
         for item in queryset:
             data.append(item.inbox_object)
@@ -477,8 +458,18 @@ class PostLikesView(generic.ListView):
 
         if post.author == current_author or current_author.friends_with(post_author.uuid):
             context['permitted'] = True
-            context['likes'] = post.like_set.all()
             context['post'] = post
+
+            # Likes from other nodes are stored here too, so their authors may be remote. Queried regardless of like_count, which is only a counter and may lag behind.
+            liker_uuids = [like.author_uuid for like in post.like_set.all()]
+            local_authors = Author.objects.select_related('user').in_bulk(liker_uuids)
+            remote_authors = remote_helpers.find_remote_authors(uuid for uuid in liker_uuids if uuid not in local_authors)
+
+            context['likers'] = [
+                (liker_uuid, local_authors[liker_uuid].display_name if liker_uuid in local_authors else remote_authors.get(liker_uuid, dict()).get('displayName', 'Remote Author'))
+                for liker_uuid in liker_uuids
+            ]
+            context['like_count'] = len(liker_uuids)
         else:
             context['permitted'] = False
 
@@ -492,16 +483,13 @@ class FollowersView(generic.TemplateView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
 
-        # Different way to get author than normal. This is because we want to utilize the prefetch_related optimization. This ensures that the queries following_set.all() and follower_set.all() are preloaded.
-        author: Author = Author.objects.filter(user_id = self.request.user.id).prefetch_related('following_set', 'follower_set').get()
-
-        friends_list = author_helpers.get_author_friends(self.request, author)
+        friends_list = author_helpers.get_author_friends(self.request, self.request.user.author)
         friend_request_list = list()
 
         # map the uuids of all the friends to here
         friends_list_uuid_pool = { uuid_helpers.extract_author_uuid_from_id(a['id']) for a in friends_list }
 
-        for inbox_item in InboxItem.objects.filter(author = self.request.user.author, inbox_object__iregex = '"type": "follow"').all():
+        for inbox_item in InboxItem.objects.filter(author = self.request.user.author, item_type = InboxItem.ItemType.FOLLOW).all():
 
             # Do not include the request if the author is already a friend
             if uuid_helpers.extract_author_uuid_from_id(inbox_item.inbox_object['object']['id']) in friends_list_uuid_pool:
@@ -510,24 +498,37 @@ class FollowersView(generic.TemplateView):
 
             friend_request_list.append(inbox_item.inbox_object)
 
-        # Start with local authors. Forgive my long ass code, no time to make sexy
-        author_nodes = [(
-            'Local Authors',
-            [
-                (author_json, uuid_helpers.extract_author_uuid_from_id(author_json['id']), Following.objects.filter(following_uuid = uuid_helpers.extract_author_uuid_from_id(author_json['id'])).exists())
-                for author_json in AuthorSerializer(Author.objects.exclude(uuid = self.request.user.author.uuid).all(), many = True, context = { 'request': self.request }).data
-            ]
-        )]
-
-        # For every node, add all of its authors in the same fashion as above, using its display name as the key
-        for node in Node.objects.all():
-            author_nodes.append((
-                node.display_name,
-                [
-                    (author_json, uuid_helpers.extract_author_uuid_from_id(author_json['id']), Following.objects.filter(following_uuid = uuid_helpers.extract_author_uuid_from_id(author_json['id'])).exists())
-                    for author_json in remote_helpers.get_all_authors(node)
-                ]
-            ))
+        following_uuids = set(Following.objects.filter(author = self.request.user.author).values_list('following_uuid', flat = True))
+
+        # Each list of authors is shown a page at a time, so a node with a huge directory is never read in whole. One extra is read of each, to know whether there's a next page.
+        try:
+            authors_page = max(int(self.request.GET.get('authors_page', 1)), 1)
+        except ValueError:
+            authors_page = 1
+
+        page_size = settings.AUTHOR_LIST_PAGE_SIZE
+        start, stop = (authors_page - 1) * page_size, authors_page * page_size + 1
+
+        def author_entries(author_jsons):
+            # Only what the template shows is kept of each author
+            for author_json in author_jsons:
+                author_uuid = uuid_helpers.extract_author_uuid_from_id(author_json['id'])
+
+                yield { 'displayName': author_json.get('displayName') }, author_uuid, author_uuid in following_uuids
+
+        # Start with local authors
+        local_authors = Author.objects.exclude(uuid = self.request.user.author.uuid).select_related('user').order_by('user__first_name', 'user__last_name', 'pk')[start:stop]
+
+        author_nodes = [('Local Authors', list(author_entries(AuthorSerializer(local_authors, many = True, context = { 'request': self.request }).data)))]
+
+        # For every node, add its page of authors in the same fashion as above, using its display name as the key. They come from the replica, unless the node hasn't been synced lately.
+        for node in node_helpers.all_nodes():
+            author_nodes.append((node.display_name, list(author_entries(remote_helpers.iter_node_authors(node, start, stop)))))
+
+        context['authors_page'] = authors_page
+        context['authors_has_next'] = any(len(author_list) > page_size for _, author_list in author_nodes)
+
+        author_nodes = [(label, author_list[:page_size]) for label, author_list in author_nodes]
 
         context['friend_request_list'] = [
             (follow_json['actor'], uuid_helpers.extract_author_uuid_from_id(follow_json['actor']['id'])) for follow_json in friend_request_list
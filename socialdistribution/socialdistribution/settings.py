@@ -104,6 +104,108 @@ DATABASES = {
     }
 }
 
+# Caches
+# https://docs.djangoproject.com/en/3.2/topics/cache/
+
+# Remote author JSON is served from the cache for this many seconds before it's refreshed...
+REMOTE_AUTHOR_CACHE_TTL = 5 * 60
+
+# ...and after that, it is still served for this many more seconds while it gets refreshed in the background
+REMOTE_AUTHOR_CACHE_STALE_TTL = 60 * 60
+
+# How long we trust a remote node's answer to whether one of its authors has approved a follow
+FOLLOW_APPROVAL_CACHE_TTL = 60
+
+# How long we trust a check that a remote post still exists...
+POST_LIVENESS_CACHE_TTL = 5 * 60
+
+# ...how many of those checks go to one node at a time...
+NODE_PROBE_CONCURRENCY = 4
+
+# ...and how long, in seconds, a page waits for all of them. Posts that weren't checked by then are shown.
+POST_PROBE_TIMEOUT = 5
+
+# How long a remote post and its comments are shown as they were fetched, so that everyone opening a popular post doesn't each ask its node again
+REMOTE_POST_CACHE_TTL = 30
+
+# How long a remote post has to keep answering 404 before we believe it's gone for good (see bettersocial.models.RemoteTombstone)
+TOMBSTONE_GRACE_PERIOD = 24 * 60 * 60
+
+# Inbox rows of remote posts that turned out to be deleted (see bettersocial.models.RemoteTombstone) are purged by the purge_tombstoned_inbox worker this often...
+TOMBSTONE_PURGE_INTERVAL = 60 * 60
+
+# ...deleting this many rows at a time, so the table is never locked for long
+TOMBSTONE_PURGE_BATCH_SIZE = 1000
+
+# Serialized local posts are cached by version, so edits never serve stale JSON. This only bounds how long the names of people who commented can lag behind.
+SERIALIZED_POST_CACHE_TTL = 10 * 60
+
+# Node credentials are cached in each process and dropped whenever a node is saved. This only bounds how long other processes keep accepting a node's old credentials.
+NODE_AUTH_CACHE_TTL = 60
+
+# Likewise the node registry (see api.helpers.node_helpers), which resolves URLs to nodes
+NODE_REGISTRY_TTL = 60
+
+# How many uuid -> node answers each process remembers from the UUIDRemoteCache table. Check api.helpers.cache_helpers.node_id_memo_stats() before changing it.
+UUID_NODE_MEMO_SIZE = 16_384
+
+# ...and for how many seconds, since the sync worker and other web workers rewrite that table too
+UUID_NODE_MEMO_TTL = 60
+
+# The remote author replica (see api.helpers.replica_helpers) is refreshed by the sync_remote_authors worker this often...
+REMOTE_AUTHOR_SYNC_INTERVAL = 15 * 60
+
+# ...writing this many authors at a time
+REMOTE_AUTHOR_SYNC_BATCH_SIZE = 500
+
+# Replicated authors that haven't been synced for this long aren't trusted anymore, and are fetched live instead
+REMOTE_AUTHOR_REPLICA_MAX_AGE = 24 * 60 * 60
+
+# Authors listed per node on each page of the friends page's author list
+AUTHOR_LIST_PAGE_SIZE = 50
+
+# Each adapter keeps GET responses from other nodes (see api.helpers.cache_helpers.ResponseCache), up to this many bytes of them
+NODE_RESPONSE_CACHE_BYTES = 32 * 1024 * 1024
+
+# Connections each adapter keeps open to each node, so that concurrent requests to a node (from views and background threads alike) don't each open their own
+NODE_POOL_MAXSIZE = 16
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # LocMemCache evicts the least recently used entries once MAX_ENTRIES is reached
+    'remote_authors': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'remote_authors',
+        'TIMEOUT': REMOTE_AUTHOR_CACHE_TTL + REMOTE_AUTHOR_CACHE_STALE_TTL,
+        'OPTIONS': {
+            'MAX_ENTRIES': 5000,
+        },
+    },
+    'serialized_posts': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'serialized_posts',
+        'TIMEOUT': SERIALIZED_POST_CACHE_TTL,
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    },
+}
+
+# Outbox delivery (see api.helpers.outbox_helpers)
+
+# How many outbox rows the worker claims at a time
+OUTBOX_BATCH_SIZE = 500
+
+# A claimed row is left alone by other workers for this many seconds, after which it's assumed its worker died
+OUTBOX_LEASE = 5 * 60
+
+# Failed deliveries are retried after OUTBOX_RETRY_BASE seconds, doubling each attempt up to OUTBOX_RETRY_MAX, and given up on after OUTBOX_MAX_ATTEMPTS
+OUTBOX_RETRY_BASE = 30
+OUTBOX_RETRY_MAX = 6 * 60 * 60
+OUTBOX_MAX_ATTEMPTS = 10
+
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
 